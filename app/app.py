@@ -1,12 +1,27 @@
 from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer
 from .gui import MainWindow
+from .tracing import get_tracer
 import sys
+import time
 
 
 def main():
+	tracer = get_tracer()
+	start = time.perf_counter()
 	app = QApplication(sys.argv)
-	window = MainWindow()
-	window.show()
+	with tracer.span("startup.window"):
+		window = MainWindow()
+		window.show()
+
+	def first_tick():
+		tracer.write({"kind": "span", "name": "startup.first_show",
+		              "ms": round((time.perf_counter() - start) * 1000, 3)})
+		with tracer.span("startup.finish"):
+			window.finish_startup()
+
+	# Deferred until the event loop has painted the window once
+	QTimer.singleShot(0, first_tick)
 	sys.exit(app.exec())
 
 
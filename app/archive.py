@@ -0,0 +1,97 @@
+"""
+Download archive for Download App.
+Remembers finished downloads across sessions, keyed by (extractor, video_id, format).
+"""
+import threading
+from pathlib import Path
+from typing import Optional, Set, Tuple
+
+from .logger import get_logger
+
+
+ArchiveKey = Tuple[str, str, str]
+
+
+def resolve_url_key(url: str) -> Optional[Tuple[str, str]]:
+    """Resolve (extractor, video_id) for a URL from extractor regexes only.
+
+    No network I/O: this only matches ``_VALID_URL`` patterns, the same
+    way yt-dlp computes its archive id before extracting.
+
+    Returns:
+        (lowercase extractor key, video id), or None if no specific
+        extractor claims the URL.
+    """
+    # Imported lazily: the router imports yt_dlp
+    from .extractor_routes import get_router
+
+    ie = get_router().resolve(url)
+    if ie is None:
+        return None
+    try:
+        video_id = ie.get_temp_id(url)
+    except Exception:
+        video_id = None
+    if video_id:
+        return ie.ie_key().lower(), str(video_id)
+    return None
+
+
+class DownloadArchive:
+    """Append-only archive file plus an in-memory hash set for O(1) lookups.
+
+    The file has one ``<extractor> <video_id> <format>`` entry per line,
+    like yt-dlp's ``download_archive`` with an extra format column so
+    the same video can be archived once per quality preset.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._keys: Set[ArchiveKey] = set()
+        self._lock = threading.Lock()
+        self.logger = get_logger("DownloadArchive")
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 3:
+                        self._keys.add((parts[0], parts[1], parts[2]))
+        except IOError as e:
+            self.logger.warning(f"Could not read download archive {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def contains(self, extractor: str, video_id: str, fmt: str) -> bool:
+        return (extractor.lower(), str(video_id), fmt) in self._keys
+
+    def contains_url(self, url: str, fmt: str) -> bool:
+        """Check a URL without extracting it (see resolve_url_key)."""
+        if not self._keys:
+            return False
+        key = resolve_url_key(url)
+        if key is None:
+            return False
+        return self.contains(key[0], key[1], fmt)
+
+    def add(self, extractor: str, video_id: str, fmt: str):
+        """Record a finished download (no-op if already archived)."""
+        key = (extractor.lower(), str(video_id), fmt)
+        if any(" " in part or not part for part in key):
+            return
+        with self._lock:
+            if key in self._keys:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(" ".join(key) + "\n")
+            except IOError as e:
+                self.logger.warning(f"Could not write download archive {self.path}: {e}")
+                return
+            self._keys.add(key)
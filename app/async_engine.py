@@ -0,0 +1,357 @@
+"""
+asyncio download engine for Download App.
+Runs many downloads as asyncio Tasks: yt-dlp in a bounded thread pool,
+ffmpeg through asyncio subprocesses, with per-job cancellation.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from PySide6.QtCore import QObject, Signal
+
+from .archive import DownloadArchive
+from .dedup import ContentIndex
+from .cancellation import CancelToken, CANCELLED_MESSAGE
+from .ffmpeg_tools import CREATE_NO_WINDOW, find_ffmpeg, probe_command, output_is_hevc, transcode_command
+from .logger import get_logger, log_context
+from .rate_control import AdaptiveConcurrency
+from .disk_space import DiskSpaceGuard
+from .format_select import FormatPreferences
+from .worker import DownloadJob, TRANSCODE_STATUS, TRANSCODES_TOTAL, ACTIVE_JOBS
+
+
+ProgressCallback = Callable[[int, str], None]
+FinishedCallback = Callable[[bool, str], None]
+
+
+class AsyncDownloadEngine:
+    """Schedule download jobs as asyncio Tasks on the running loop.
+
+    Jobs report through the same ``progress(int, str)`` / ``finished(bool, str)``
+    contract as DownloadWorker. Every method except ``run_job`` and
+    ``shutdown`` must be called from the loop thread.
+    """
+
+    def __init__(self, max_workers: int = 4, max_transcodes: int = 1,
+                 archive: Optional[DownloadArchive] = None, content_index: Optional[ContentIndex] = None,
+                 limiter: Optional[AdaptiveConcurrency] = None, disk_guard: Optional[DiskSpaceGuard] = None,
+                 format_prefs: Optional[FormatPreferences] = None):
+        """Initialize the engine.
+
+        Args:
+            max_workers: Threads available for blocking yt-dlp extraction/download.
+            max_transcodes: Concurrent ffmpeg transcodes (CPU bound).
+            archive: Optional archive that finished downloads are recorded in.
+            content_index: Optional content index for dedup and the transcode cache.
+            limiter: Optional per-site concurrency controller.
+            disk_guard: Optional disk-space admission control.
+            format_prefs: Optional format ranking preferences (codecs to avoid).
+        """
+        self.archive = archive
+        self.content_index = content_index
+        self.limiter = limiter
+        self.disk_guard = disk_guard
+        self.format_prefs = format_prefs
+        self.max_workers = max_workers
+        self.max_transcodes = max_transcodes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self._transcode_slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._next_id = 0
+        self.logger = get_logger("AsyncDownloadEngine")
+
+    def submit(
+        self,
+        url: str,
+        outdir: str,
+        quality: str = "auto",
+        on_progress: Optional[ProgressCallback] = None,
+        on_finished: Optional[FinishedCallback] = None,
+    ) -> int:
+        """Start a job and return its id."""
+        job_id = self._next_id
+        self._next_id += 1
+        task = asyncio.get_running_loop().create_task(
+            self._run(url, outdir, quality, on_progress, on_finished),
+            name=f"download-{job_id}",
+        )
+        self._tasks[job_id] = task
+
+        def on_done(t: asyncio.Task):
+            self._tasks.pop(job_id, None)
+            # Reported here so jobs cancelled before their first step still finish
+            if t.cancelled() and on_finished:
+                on_finished(False, CANCELLED_MESSAGE)
+
+        task.add_done_callback(on_done)
+        return job_id
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a running job. Returns False if the job is unknown or done."""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def active_jobs(self) -> int:
+        return len(self._tasks)
+
+    async def shutdown(self):
+        """Cancel every job, wait for them to unwind and stop the thread pool."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    async def run_job(self, url: str, outdir: str, quality: str = "auto",
+                      on_progress: Optional[ProgressCallback] = None) -> str:
+        """Download and post-process one URL.
+
+        Returns:
+            Path of the final file (or the output directory if unknown).
+        """
+        loop = asyncio.get_running_loop()
+
+        def progress_from_thread(percent: int, text: str):
+            # yt-dlp hooks fire on the executor thread; hop back onto the loop
+            if on_progress:
+                loop.call_soon_threadsafe(on_progress, percent, text)
+
+        token = CancelToken()
+        job = DownloadJob(url, outdir, quality, on_progress=progress_from_thread,
+                          cancel_token=token, archive=self.archive, content_index=self.content_index,
+                          limiter=self.limiter, disk_guard=self.disk_guard, format_prefs=self.format_prefs)
+        status = "failed"
+        error = None
+        ACTIVE_JOBS.inc()
+        # Set on the Task's own context; executor steps get a copy (see _in_executor)
+        with log_context(job.trace.item_id):
+            try:
+                final_path = await self._run_phases(loop, job, outdir, on_progress)
+                status = "ok"
+                return final_path
+            except asyncio.CancelledError:
+                # Stop the executor thread too, not just the awaiting Task (_step waited for it)
+                token.cancel()
+                status = "cancelled"
+                raise
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                # Jobs cancelled before their download step ran still hold the slot;
+                # a running step's thread has returned by now (see _step)
+                job.release_slot()
+                job.release_space()
+                ACTIVE_JOBS.dec()
+                job.trace.finish(status, quality=quality, engine="asyncio", error=error, format=job.format_id)
+
+    async def _run_phases(self, loop, job: DownloadJob, outdir: str,
+                          on_progress: Optional[ProgressCallback]) -> str:
+        if self.limiter is not None:
+            # Wait on the loop, not on an executor thread
+            with job.trace.span("queue_wait"):
+                await self.limiter.acquire_async(job.site)
+            job.slot_acquired = True
+        src = await self._step(loop, job, job.download)
+        if src is None or not src.exists():
+            return str(Path(outdir))
+
+        if job.audio_only:
+            # Stream copy + tags: one short ffmpeg run, no probe
+            final_path = await self._step(loop, job, job.tag_audio, src)
+            job.index_output(final_path)
+            return final_path
+
+        with job.trace.span("probe"):
+            is_hevc = await self._probe_hevc(str(src))
+        if not is_hevc:
+            self.logger.info(f"Video is not HEVC; keeping original: {src}")
+            final_path = str(src)
+        else:
+            # Hashing the source is far cheaper than re-encoding an identical one
+            final_path = await self._step(loop, job, job.cached_transcode, src)
+            if not final_path:
+                if self._transcode_slots is None:
+                    self._transcode_slots = asyncio.Semaphore(self.max_transcodes)
+                async with self._transcode_slots:
+                    with job.trace.span("transcode"):
+                        final_path = await self._transcode(job, src, on_progress)
+        job.index_output(final_path)
+        return final_path
+
+    def _in_executor(self, loop, func, *args):
+        """run_in_executor that keeps the caller's context (log correlation id)."""
+        ctx = contextvars.copy_context()
+        return loop.run_in_executor(self._executor, ctx.run, func, *args)
+
+    async def _step(self, loop, job: DownloadJob, func, *args):
+        """Run a blocking job step on the executor.
+
+        If the Task is cancelled, the thread is told to stop and awaited
+        before the CancelledError propagates: until it returns it still
+        holds the job's site slot and disk reservation, which run_job's
+        finally releases.
+        """
+        future = self._in_executor(loop, func, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            job.cancel_token.cancel()
+            while not future.done():
+                try:
+                    await asyncio.wait({future})
+                except asyncio.CancelledError:
+                    continue
+            if not future.cancelled():
+                future.exception()  # retrieved: DownloadCancelled is expected here
+            raise
+
+    async def _run(self, url, outdir, quality, on_progress, on_finished):
+        try:
+            final_path = await self.run_job(url, outdir, quality, on_progress)
+        except asyncio.CancelledError:
+            self.logger.info(f"Download cancelled: {url}")
+            raise
+        except Exception as e:
+            self.logger.error(f"Download failed: {e}", exc_info=True)
+            if on_finished:
+                on_finished(False, str(e))
+            return
+        if on_finished:
+            on_finished(True, final_path)
+
+    async def _exec(self, cmd, capture: bool) -> Tuple[int, bytes]:
+        """Run a command, killing it if the awaiting task is cancelled."""
+        pipe = asyncio.subprocess.PIPE if capture else asyncio.subprocess.DEVNULL
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=pipe, stderr=pipe, creationflags=CREATE_NO_WINDOW,
+        )
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        return proc.returncode, (stdout or b"") + (stderr or b"")
+
+    async def _probe_hevc(self, video_path: str) -> bool:
+        ffmpeg_cmd = find_ffmpeg()
+        if not ffmpeg_cmd:
+            self.logger.warning("ffmpeg not found; cannot detect HEVC codec")
+            return False
+        try:
+            _, output = await asyncio.wait_for(self._exec(probe_command(ffmpeg_cmd, video_path), capture=True), timeout=10)
+        except asyncio.TimeoutError:
+            self.logger.warning("Timeout detecting HEVC codec")
+            return False
+        except Exception as e:
+            # Same as the threaded engine: a broken ffmpeg must not fail the download
+            self.logger.warning(f"Error detecting HEVC codec: {e}")
+            return False
+        is_hevc = output_is_hevc(output)
+        self.logger.info(f"Video codec check: HEVC={is_hevc}")
+        return is_hevc
+
+    async def _transcode(self, job: DownloadJob, src: Path, on_progress: Optional[ProgressCallback]) -> str:
+        ffmpeg_cmd = find_ffmpeg()
+        if not ffmpeg_cmd:
+            self.logger.warning("ffmpeg not found; skipping HEVC transcode and keeping original file.")
+            return str(src)
+        if on_progress:
+            on_progress(0, TRANSCODE_STATUS)
+        tmp = src.with_suffix('.tmp.mp4')
+        self.logger.info(f"Transcoding HEVC to H.264: {src.name}")
+        try:
+            returncode, _ = await self._exec(transcode_command(ffmpeg_cmd, str(src), str(tmp)), capture=False)
+        except asyncio.CancelledError:
+            tmp.unlink(missing_ok=True)
+            raise
+        except Exception as e:
+            # e.g. OSError from a bad ffmpeg path: keep the original, like DownloadJob.transcode
+            self.logger.error(f"Unexpected error during HEVC transcode: {e}")
+            tmp.unlink(missing_ok=True)
+            return str(src)
+        if returncode != 0:
+            # ffmpeg failed — keep original
+            self.logger.error(f"FFmpeg HEVC transcode failed with exit code {returncode}")
+            TRANSCODES_TOTAL.inc(result="failed")
+            tmp.unlink(missing_ok=True)
+            return str(src)
+        TRANSCODES_TOTAL.inc(result="ok")
+        final_path = job.replace_with_transcoded(tmp, src)
+        job.remember_transcode(final_path)
+        return final_path
+
+
+class AsyncJobHandle(QObject):
+    """Qt-side handle for a job running on an AsyncEngineBridge.
+
+    Exposes the same signals as DownloadWorker so MainWindow can connect
+    to either one.
+    """
+    progress = Signal(int, str)  # percent, status text
+    finished = Signal(bool, str)  # success, message/path
+
+    def __init__(self, bridge: "AsyncEngineBridge"):
+        super().__init__()
+        self._bridge = bridge
+        self.job_id: Optional[int] = None
+
+    def cancel(self):
+        self._bridge.cancel(self)
+
+
+class AsyncEngineBridge:
+    """Run an AsyncDownloadEngine on a private event loop thread.
+
+    Signals on the returned handles are emitted from the loop thread and
+    delivered to GUI-thread slots as queued connections, so the Qt event
+    loop and the asyncio loop never block each other.
+    """
+
+    def __init__(self, max_workers: int = 4, max_transcodes: int = 1,
+                 archive: Optional[DownloadArchive] = None, content_index: Optional[ContentIndex] = None,
+                 limiter: Optional[AdaptiveConcurrency] = None, disk_guard: Optional[DiskSpaceGuard] = None,
+                 format_prefs: Optional[FormatPreferences] = None):
+        self.loop = asyncio.new_event_loop()
+        self.engine = AsyncDownloadEngine(max_workers, max_transcodes, archive, content_index, limiter, disk_guard,
+                                          format_prefs)
+        self._thread = threading.Thread(target=self._run_loop, name="asyncio-engine", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, url: str, outdir: str, quality: str = "auto") -> AsyncJobHandle:
+        handle = AsyncJobHandle(self)
+
+        def start():
+            handle.job_id = self.engine.submit(url, outdir, quality, handle.progress.emit, handle.finished.emit)
+
+        self.loop.call_soon_threadsafe(start)
+        return handle
+
+    def cancel(self, handle: AsyncJobHandle):
+        def cancel_job():
+            if handle.job_id is not None:
+                self.engine.cancel(handle.job_id)
+
+        self.loop.call_soon_threadsafe(cancel_job)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Cancel all jobs and stop the loop thread."""
+        future = asyncio.run_coroutine_threadsafe(self.engine.shutdown(), self.loop)
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
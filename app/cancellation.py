@@ -0,0 +1,68 @@
+"""
+Cooperative cancellation for Download App.
+A CancelToken is checked by yt-dlp hooks and kills registered ffmpeg processes.
+"""
+import subprocess
+import threading
+from typing import Callable, List, Set
+
+
+CANCELLED_MESSAGE = "Đã huỷ tải xuống."
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a job once its CancelToken has been cancelled."""
+
+    def __init__(self, message: str = CANCELLED_MESSAGE):
+        super().__init__(message)
+
+
+class CancelToken:
+    """Thread-safe cancellation flag shared between a job and its owner."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: Set[subprocess.Popen] = set()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """Request cancellation and kill any registered child process."""
+        self._event.set()
+        with self._lock:
+            processes = list(self._processes)
+            callbacks, self._callbacks = self._callbacks, []
+        for proc in processes:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Call callback on cancel (right away if already cancelled), e.g. to signal a child process."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise DownloadCancelled()
+
+    def register_process(self, proc: subprocess.Popen):
+        """Track a child process; kill it immediately if already cancelled."""
+        with self._lock:
+            self._processes.add(proc)
+        if self._event.is_set():
+            proc.kill()
+
+    def unregister_process(self, proc: subprocess.Popen):
+        with self._lock:
+            self._processes.discard(proc)
@@ -0,0 +1,647 @@
+"""
+Headless daemon mode for Download App.
+Exposes the download queue over a local HTTP/JSON API with Server-Sent Events.
+
+Endpoints:
+    GET  /api/queue              -> {"stats": {...}, "items": [...]}
+    POST /api/queue              -> enqueue {"urls": [...], "quality": "auto", "expand": null, "priority": 0}
+    POST /api/pause              -> pause queue processing
+    POST /api/resume             -> resume queue processing
+    POST /api/items/<id>/cancel   -> cancel the item with that id (stops a running job)
+    POST /api/items/<id>/retry    -> requeue a cancelled/failed item (resumes .part)
+    POST /api/items/<id>/priority -> reprioritize a pending item {"priority": 5} (higher runs first)
+    GET  /api/events             -> text/event-stream of queue events
+    GET  /metrics                -> Prometheus text format (throughput, queue depth, latencies)
+
+Every request needs ``Authorization: Bearer <token>`` with the session token
+written to ``daemon.token`` in the config dir, and a localhost Host/Origin
+(--allow-host adds names). POST bodies must be application/json objects.
+"""
+import argparse
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from .logger import setup_logging, get_logger, default_log_dir
+from .tracing import get_tracer
+from .metrics import get_metrics
+from .queue_manager import QueueManager, DownloadState
+from .url_filter import UrlPrefilter, FilteredURL
+from .settings import SettingsManager
+from .archive import DownloadArchive
+from .dedup import ContentIndex
+from .cancellation import CancelToken, DownloadCancelled
+from .playlist import PlaylistExpander, looks_like_playlist
+from .rate_control import AdaptiveConcurrency, limiter_from_settings, save_limits
+from .disk_space import DiskSpaceGuard, InsufficientDiskSpace
+from .worker import DownloadJob, warm_up
+from .extractor_routes import get_router
+from .format_select import FormatPreferences, QUALITY_HEIGHTS
+from .pipeline import PipelineExecutor
+from .process_pool import ProcessPoolEngine
+from .prefetch import ItemMetadata, MetadataCache, MetadataPrefetcher
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SSE_KEEPALIVE_SECONDS = 15
+TOKEN_FILE = "daemon.token"
+# Host/Origin names always accepted; anything else is a DNS-rebinding or cross-site request
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+WILDCARD_HOSTS = {"", "0.0.0.0", "::"}
+
+
+def write_token(path: Path) -> str:
+    """Generate a session token and write it to ``path`` readable by the owner only.
+
+    Returns:
+        The token clients must send as ``Authorization: Bearer <token>``.
+    """
+    token = secrets.token_urlsafe(32)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def _host_name(value: str) -> str:
+    """Strip the port from a Host header value ("[::1]:8765" -> "::1")."""
+    value = value.strip().lower()
+    if value.startswith("["):
+        return value[1:value.find("]")]
+    if value.count(":") == 1:
+        return value.split(":", 1)[0]
+    return value
+
+
+class DownloadDaemon:
+    """Own a QueueManager and drain it on a background thread."""
+
+    def __init__(self, downloads_dir: Path, archive: Optional[DownloadArchive] = None,
+                 content_index: Optional[ContentIndex] = None, limiter: Optional[AdaptiveConcurrency] = None,
+                 disk_guard: Optional[DiskSpaceGuard] = None,
+                 pipeline: Optional[Union[PipelineExecutor, ProcessPoolEngine]] = None,
+                 format_prefs: Optional[FormatPreferences] = None,
+                 prefetcher: Optional[MetadataPrefetcher] = None):
+        self.downloads_dir = Path(downloads_dir)
+        self.archive = archive
+        self.content_index = content_index
+        # Backs off sites that throttle us (jobs wait for the site's slot)
+        self.limiter = limiter
+        # Jobs that would fill the disk pause the queue instead of failing late
+        self.disk_guard = disk_guard
+        # Staged executor or process pool: several items in flight (None = one at a time)
+        self.pipeline = pipeline
+        self.format_prefs = format_prefs
+        # Fetches title/duration/size of queued items so short jobs can be scheduled first
+        self.prefetcher = prefetcher
+        self.queue = QueueManager(archive)
+        self.logger = get_logger("DownloadDaemon")
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._subscribers: List[queue.Queue] = []
+        self._stopped = False
+        # id(item) -> token of every item in flight
+        self._tokens: Dict[int, CancelToken] = {}
+        # Shared by all playlist expansions so stop() interrupts them
+        self._expand_token = CancelToken()
+        self._runner: Optional[threading.Thread] = None
+        # The daemon's queue is the one the queue depth gauge reports
+        get_metrics().add_collector(self._collect_queue_metrics)
+
+    # ---- public API (called from HTTP handler threads) ----
+
+    def enqueue(self, urls: List[str], quality: str = "auto", expand: Optional[bool] = None,
+                priority: int = 0) -> Dict[str, Any]:
+        """Validate and add URLs to the queue.
+
+        Args:
+            urls: URLs to add.
+            quality: Quality preset for every URL.
+            expand: Expand playlist/channel URLs into their entries. None
+                means "guess from the URL" (see looks_like_playlist).
+            priority: User priority for every URL (higher runs first).
+
+        Returns:
+            Dict with the number added, URLs being expanded in the
+            background and the rejected URLs.
+        """
+        added = 0
+        expanding = []
+        rejected = []
+        # Validation, normalization, non-video rejection and in-batch dedup in one pass
+        prefilter = UrlPrefilter()
+        if self.queue.archive is not None:
+            # Archive checks resolve extractors: build the router (yt_dlp import) before taking the lock
+            get_router()
+        with self._wakeup:
+            for url in urls:
+                outcome = prefilter.check(url or "")
+                if not isinstance(outcome, FilteredURL):
+                    rejected.append({"url": (url or "").strip(), "reason": outcome})
+                    continue
+                url = outcome.url
+                if expand or (expand is None and looks_like_playlist(url)):
+                    self._start_expansion(url, quality, priority)
+                    expanding.append(url)
+                    continue
+                reason = self.queue.try_add_url(url, quality, priority)
+                if reason is not None:
+                    rejected.append({"url": url, "reason": reason})
+                    continue
+                added += 1
+                item = self.queue.items[-1]
+                self._publish("added", {"id": item.id, "item": item.to_dict()})
+                self._prefetch(item)
+            self._wakeup.notify_all()
+        return {"added": added, "expanding": expanding, "rejected": rejected}
+
+    def _start_expansion(self, url: str, quality: str, priority: int = 0):
+        """Stream a playlist's entries into the queue on a background thread."""
+        def on_added(index: int):
+            # Called with the lock held: wake the runner for the first entry
+            item = self.queue.items[index]
+            self._publish("added", {"id": item.id, "item": item.to_dict()})
+            self._prefetch(item)
+            self._wakeup.notify_all()
+
+        def expand():
+            try:
+                PlaylistExpander(self._expand_token).expand_into(
+                    self.queue, url, quality, on_added=on_added, lock=self._wakeup, priority=priority,
+                )
+            except DownloadCancelled:
+                pass
+            except Exception as e:
+                self.logger.error(f"Playlist expansion failed for {url}: {e}")
+                with self._lock:
+                    self._publish("expand_failed", {"url": url, "error": str(e)})
+
+        threading.Thread(target=expand, name="playlist-expand", daemon=True).start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return queue stats plus every item."""
+        with self._lock:
+            return {
+                "stats": self.queue.get_stats(),
+                "items": [item.to_dict() for item in self.queue.items],
+            }
+
+    def metrics_text(self) -> str:
+        """Prometheus exposition of the process metrics."""
+        return get_metrics().render_prometheus()
+
+    def _collect_queue_metrics(self):
+        with self._lock:
+            # Refresh queue gauges while the queue cannot change under us
+            self.queue.collect_metrics()
+
+    def pause(self):
+        with self._wakeup:
+            self.queue.pause()
+            self._publish("paused", self.queue.get_stats())
+
+    def resume(self):
+        with self._wakeup:
+            self.queue.resume()
+            self._publish("resumed", self.queue.get_stats())
+            self._wakeup.notify_all()
+
+    def cancel(self, item_id: int) -> bool:
+        """Cancel a queued or running item.
+
+        A running job is interrupted through its CancelToken, which aborts
+        the yt-dlp transfer and kills any ffmpeg child.
+        """
+        with self._lock:
+            item = self.queue.get_item(item_id)
+            if item is None:
+                return False
+            token = self._tokens.get(id(item))
+            if not self.queue.cancel_item(self.queue.index_of(item)):
+                return False
+            if token is not None:
+                token.cancel()
+            self._publish("state", {"id": item.id, "item": item.to_dict()})
+            return True
+
+    def retry(self, item_id: int) -> bool:
+        """Requeue a cancelled or failed item at the end of the queue."""
+        with self._wakeup:
+            item = self.queue.get_item(item_id)
+            if item is None or id(item) in self._tokens:
+                # Unknown, or still unwinding after cancel (retry once the runner lets go of it)
+                return False
+            if not self.queue.requeue_item(self.queue.index_of(item)):
+                return False
+            self._publish("added", {"id": item.id, "item": item.to_dict()})
+            self._wakeup.notify_all()
+            return True
+
+    def set_priority(self, item_id: int, priority: int) -> bool:
+        """Change the priority of a queued item; pending items are rescheduled."""
+        with self._wakeup:
+            item = self.queue.get_item(item_id)
+            if item is None or not self.queue.set_priority(self.queue.index_of(item), priority):
+                return False
+            self._publish("state", {"id": item.id, "item": item.to_dict()})
+            return True
+
+    def subscribe(self) -> queue.Queue:
+        """Register an event listener and return its queue."""
+        q: queue.Queue = queue.Queue(maxsize=1000)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    # ---- processing loop ----
+
+    def start(self):
+        """Start the background queue runner."""
+        self._runner = threading.Thread(target=self._run_loop, name="daemon-runner", daemon=True)
+        self._runner.start()
+
+    def stop(self):
+        self._expand_token.cancel()
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify_all()
+        if self.pipeline is not None:
+            self.pipeline.shutdown()
+
+    def _publish(self, event: str, data: Dict[str, Any]):
+        """Fan an event out to every subscriber (caller holds the lock)."""
+        for q in self._subscribers:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                # Slow consumer; drop rather than block the runner
+                pass
+
+    def _prefetch(self, item):
+        """Ask for item's metadata; entries in the memory cache apply at once (lock held)."""
+        if self.prefetcher is None:
+            return
+        meta = self.prefetcher.request(
+            item.url, item.quality, on_ready=lambda url, meta, item=item: self._apply_metadata(item, meta))
+        if meta is not None:
+            self._apply_metadata(item, meta)
+
+    def _apply_metadata(self, item, meta: ItemMetadata):
+        """Copy fetched metadata onto item and reschedule it (any thread)."""
+        if meta.error:
+            return
+        with self._lock:
+            index = self.queue.index_of(item)
+            if index < 0:
+                return
+            item.title = meta.title or item.title
+            self.queue.set_estimate(index, meta.duration, meta.filesize)
+            self._publish("metadata", {"id": item.id, "item": item.to_dict()})
+
+    def _next_pending(self):
+        item = self.queue.get_current()
+        if item is None or item.state != DownloadState.PENDING:
+            # Scheduler picks the highest-priority, shortest pending item
+            item = self.queue.next()
+        return item
+
+    def _hold_for_space(self, item, reason: str):
+        """Put item back as pending and pause the queue until space is freed (lock held)."""
+        self.queue.mark_failed(item, reason)
+        if self.queue.requeue_item(self.queue.index_of(item)):
+            item.status_text = reason
+            self._publish("added", {"id": item.id, "item": item.to_dict()})
+        self.queue.pause()
+        self._publish("paused", dict(self.queue.get_stats(), reason=reason))
+
+    def _run_loop(self):
+        while True:
+            with self._wakeup:
+                item = self._next_pending()
+                while not self._stopped and (self.queue.is_paused or item is None):
+                    self._wakeup.wait()
+                    item = self._next_pending()
+                if self._stopped:
+                    return
+                job = self._start_item(item)
+
+            if self.pipeline is not None:
+                # Blocks while the extract stage (or every pool process) is busy
+                self.pipeline.submit(job, on_done=lambda path, error, item=item: self._finish_item(item, path, error))
+                continue
+            try:
+                final_path = job.run()
+                error = None
+            except Exception as e:
+                final_path = None
+                error = e
+            self._finish_item(item, final_path, error)
+
+    def _start_item(self, item) -> DownloadJob:
+        """Mark item as downloading and build its job (lock held)."""
+        self.queue.update_item(item, 0, "Bắt đầu tải...")
+        token = CancelToken()
+        self._tokens[id(item)] = token
+        self._publish("state", {"id": item.id, "item": item.to_dict()})
+
+        def on_progress(percent: int, text: str):
+            with self._lock:
+                if item.state == DownloadState.DOWNLOADING:
+                    self.queue.update_item(item, percent, text)
+                    self._publish("progress", {"id": item.id, "progress": percent, "status_text": text})
+
+        return DownloadJob(item.url, str(self.downloads_dir), item.quality,
+                           on_progress=on_progress, cancel_token=token, archive=self.archive,
+                           content_index=self.content_index, limiter=self.limiter, disk_guard=self.disk_guard,
+                           format_prefs=self.format_prefs)
+
+    def _finish_item(self, item, final_path: Optional[str], error: Optional[BaseException]):
+        """Record a job's outcome (runner thread, or a pipeline/pool callback thread)."""
+        if isinstance(error, DownloadCancelled):
+            self.logger.info(f"Download cancelled: {item.url}")
+        elif isinstance(error, InsufficientDiskSpace):
+            self.logger.warning(f"Pausing queue: {error}")
+        elif error is not None:
+            self.logger.error(f"Download failed: {error}", exc_info=error)
+        with self._lock:
+            self._tokens.pop(id(item), None)
+            if item.state == DownloadState.CANCELLED:
+                item.status_text = "Đã huỷ (giữ file tạm để tải tiếp)"
+            elif isinstance(error, InsufficientDiskSpace):
+                self._hold_for_space(item, str(error))
+                return
+            elif isinstance(error, DownloadCancelled):
+                # Stopped with the daemon rather than by the user
+                self.queue.cancel_item(self.queue.index_of(item))
+            elif error is None:
+                self.queue.update_item(item, 100, final_path)
+                self.queue.mark_completed(item)
+            else:
+                self.queue.mark_failed(item, str(error))
+            self._publish("state", {"id": item.id, "item": item.to_dict()})
+
+
+class _DaemonRequestHandler(BaseHTTPRequestHandler):
+    """Route HTTP requests to the DownloadDaemon attached to the server."""
+
+    server_version = "DownloadAppDaemon/1.0"
+
+    @property
+    def daemon(self) -> DownloadDaemon:
+        return self.server.download_daemon
+
+    def log_message(self, format, *args):
+        get_logger("DownloadDaemon").debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, payload: Any):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorize(self) -> bool:
+        """Reject foreign Host/Origin headers and requests without the session token."""
+        allowed = self.server.allowed_hosts
+        if _host_name(self.headers.get("Host", "")) not in allowed:
+            self._send_json(403, {"error": "host not allowed"})
+            return False
+        origin = self.headers.get("Origin")
+        if origin is not None and (urllib.parse.urlsplit(origin).hostname or "") not in allowed:
+            self._send_json(403, {"error": "origin not allowed"})
+            return False
+        token = self.server.auth_token
+        if token is not None:
+            scheme, _, supplied = self.headers.get("Authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(supplied.strip().encode(), token.encode()):
+                self._send_json(401, {"error": "missing or invalid token"})
+                return False
+        return True
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        body = json.loads(raw.decode("utf-8"))
+        if not isinstance(body, dict):
+            raise ValueError("expected a JSON object")
+        return body
+
+    def do_GET(self):
+        if not self._authorize():
+            return
+        if self.path == "/api/queue":
+            self._send_json(200, self.daemon.snapshot())
+        elif self.path == "/api/events":
+            self._stream_events()
+        elif self.path == "/metrics":
+            body = self.daemon.metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorize():
+            return
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.split(";", 1)[0].strip().lower() != "application/json":
+            self._send_json(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            body = self._read_body()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send_json(400, {"error": f"invalid body: {e}"})
+            return
+
+        parts = [p for p in self.path.split("/") if p]
+        if self.path == "/api/queue":
+            urls = body.get("urls")
+            if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+                self._send_json(400, {"error": "'urls' must be a list of strings"})
+                return
+            quality = body.get("quality", "auto")
+            if quality not in QUALITY_HEIGHTS:
+                self._send_json(400, {"error": f"'quality' must be one of {sorted(QUALITY_HEIGHTS)}"})
+                return
+            expand = body.get("expand")
+            if expand is not None and not isinstance(expand, bool):
+                self._send_json(400, {"error": "'expand' must be true, false or null"})
+                return
+            try:
+                priority = int(body.get("priority", 0))
+            except (TypeError, ValueError):
+                self._send_json(400, {"error": "'priority' must be an integer"})
+                return
+            self._send_json(200, self.daemon.enqueue(urls, quality, expand, priority))
+        elif self.path == "/api/pause":
+            self.daemon.pause()
+            self._send_json(200, {"ok": True})
+        elif self.path == "/api/resume":
+            self.daemon.resume()
+            self._send_json(200, {"ok": True})
+        elif len(parts) == 4 and parts[:2] == ["api", "items"] and parts[3] == "cancel":
+            try:
+                item_id = int(parts[2])
+            except ValueError:
+                self._send_json(400, {"error": "invalid item id"})
+                return
+            if self.daemon.cancel(item_id):
+                self._send_json(200, {"ok": True})
+            else:
+                self._send_json(404, {"error": "no cancellable item with that id"})
+        elif len(parts) == 4 and parts[:2] == ["api", "items"] and parts[3] == "retry":
+            try:
+                item_id = int(parts[2])
+            except ValueError:
+                self._send_json(400, {"error": "invalid item id"})
+                return
+            if self.daemon.retry(item_id):
+                self._send_json(200, {"ok": True})
+            else:
+                self._send_json(404, {"error": "no retryable item with that id"})
+        elif len(parts) == 4 and parts[:2] == ["api", "items"] and parts[3] == "priority":
+            try:
+                item_id = int(parts[2])
+                priority = int(body.get("priority"))
+            except (TypeError, ValueError):
+                self._send_json(400, {"error": "invalid item id or priority"})
+                return
+            if self.daemon.set_priority(item_id, priority):
+                self._send_json(200, {"ok": True})
+            else:
+                self._send_json(404, {"error": "no item with that id"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        events = self.daemon.subscribe()
+        try:
+            while True:
+                try:
+                    event, data = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                    payload = json.dumps(data, ensure_ascii=False)
+                    self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.daemon.unsubscribe(events)
+
+
+def create_server(daemon: DownloadDaemon, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  token: Optional[str] = None, allow_hosts: Optional[List[str]] = None) -> ThreadingHTTPServer:
+    """Create the HTTP server bound to the given daemon.
+
+    Args:
+        daemon: Daemon the requests are routed to.
+        host: Interface to bind.
+        port: Port to listen on (0 picks a free one).
+        token: Session token every request must carry; None disables the check.
+        allow_hosts: Extra Host/Origin names accepted besides localhost.
+    """
+    server = ThreadingHTTPServer((host, port), _DaemonRequestHandler)
+    server.daemon_threads = True
+    server.download_daemon = daemon
+    server.auth_token = token
+    allowed = set(LOCAL_HOSTS)
+    if host not in WILDCARD_HOSTS:
+        allowed.add(host.lower())
+    allowed.update(name.lower() for name in allow_hosts or ())
+    server.allowed_hosts = allowed
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Download App headless daemon")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--allow-host", action="append", default=[], metavar="NAME",
+                        help="Also accept this Host/Origin name (repeatable; localhost is always accepted)")
+    parser.add_argument("--outdir", help="Downloads directory (default: from settings)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run items through the staged pipeline (several in flight) instead of one at a time")
+    parser.add_argument("--processes", type=int, metavar="N",
+                        help="Run each item in one of N worker processes (uses several CPU cores)")
+    args = parser.parse_args(argv)
+
+    settings = SettingsManager()
+    logger = setup_logging(json_format=settings.get("log_format") == "json")
+    get_tracer().configure(default_log_dir(), bool(settings.get("profile_jobs", False)))
+    downloads_dir = args.outdir or settings.get("downloads_dir")
+    if not downloads_dir:
+        downloads_dir = Path(__file__).resolve().parents[1] / "downloads"
+    downloads_dir = Path(downloads_dir)
+    downloads_dir.mkdir(parents=True, exist_ok=True)
+
+    content_index = ContentIndex(settings.config_dir / "content_index.json")
+    content_index.scan(downloads_dir)
+    # Load (or build and cache) the extractor routing table before the first request
+    threading.Thread(target=warm_up, args=(settings.config_dir,), name="warm-up", daemon=True).start()
+    limiter = limiter_from_settings(settings)
+    disk_guard = DiskSpaceGuard.from_settings(settings, downloads_dir)
+    format_prefs = FormatPreferences.from_settings(settings)
+    prefetcher = None
+    prefetch_workers = int(settings.get("prefetch_workers", 2))
+    if prefetch_workers > 0:
+        cache = MetadataCache(settings.config_dir / "metadata_cache",
+                              max_bytes=int(float(settings.get("metadata_cache_mb", 200)) * 2**20))
+        prefetcher = MetadataPrefetcher(cache, prefetch_workers, format_prefs=format_prefs, limiter=limiter)
+    pipeline = None
+    processes = args.processes or int(settings.get("daemon_processes", 0))
+    if processes > 0:
+        pipeline = ProcessPoolEngine(processes, int(settings.get("pipeline_queue_size", 4)), settings.config_dir)
+    elif args.pipeline or settings.get("daemon_pipeline", False):
+        # "pipeline_workers": {"download": 4, "transcode": 2, ...} overrides the per-stage pool sizes
+        pipeline = PipelineExecutor(settings.get("pipeline_workers"), int(settings.get("pipeline_queue_size", 4)))
+    daemon = DownloadDaemon(downloads_dir, DownloadArchive(settings.config_dir / "archive.txt"), content_index,
+                            limiter, disk_guard, pipeline, format_prefs, prefetcher)
+    token_path = settings.config_dir / TOKEN_FILE
+    token = write_token(token_path)
+    daemon.start()
+    server = create_server(daemon, args.host, args.port, token, args.allow_host)
+    logger.info(f"Daemon listening on http://{args.host}:{args.port} (downloads: {downloads_dir})")
+    print(f"Download App daemon on http://{args.host}:{args.port}")
+    print(f"Token (Authorization: Bearer ...): {token_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        server.server_close()
+        content_index.shutdown()
+        save_limits(settings, limiter)
+        token_path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
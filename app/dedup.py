@@ -0,0 +1,276 @@
+"""
+Content-hash dedup store for Download App.
+Finds identical files in the downloads folder, replaces copies with
+reflinks/hardlinks and caches transcode outputs by source hash.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .logger import get_logger
+
+
+PARTIAL_CHUNK = 4 * 1024 * 1024  # bytes read from each end for the cheap hash
+HASH_BLOCK = 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl: share extents copy-on-write (btrfs, xfs)
+SAVE_DELAY = 2.0  # seconds; index changes within this window are written once
+# Finished downloads; anything else in the folder (.part, .ytdl, .claim,
+# thumbnails, the naming journal) is never indexed or linked
+MEDIA_EXTENSIONS = frozenset((
+    ".mp4", ".mkv", ".webm", ".mov", ".m4v", ".avi", ".flv", ".3gp",
+    ".m4a", ".mp3", ".opus", ".ogg", ".oga", ".flac", ".wav", ".aac",
+))
+# Inner suffix of scratch files that end in a media extension: ".tmp.mp4"
+# (transcode/tag output) and ".f137.mp4" (yt-dlp streams before the merge)
+SCRATCH_SUFFIX = re.compile(r"\.(tmp|f\d+)$", re.IGNORECASE)
+
+
+def partial_hash(path: Path, chunk: int = PARTIAL_CHUNK) -> str:
+    """Hash file size plus the first and last `chunk` bytes."""
+    size = path.stat().st_size
+    h = hashlib.sha256(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        h.update(f.read(chunk))
+        if size > chunk:
+            f.seek(max(chunk, size - chunk))
+            h.update(f.read(chunk))
+    return h.hexdigest()
+
+
+def full_hash(path: Path) -> str:
+    """SHA-256 of the whole file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def is_media_file(path: Path) -> bool:
+    """True if path looks like a finished download rather than a work file."""
+    name = path.name
+    stem, ext = os.path.splitext(name)
+    if name.startswith(".") or ext.lower() not in MEDIA_EXTENSIONS:
+        return False
+    return SCRATCH_SUFFIX.search(stem) is None
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """Clone src to dst copy-on-write. Returns False if unsupported."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except (OSError, ImportError):
+        try:
+            dst.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def link_duplicate(original: Path, duplicate: Path) -> bool:
+    """Replace duplicate with a reflink (preferred) or hardlink to original.
+
+    The swap goes through a temp name and os.replace so the duplicate
+    path never disappears if linking fails midway.
+    """
+    tmp = duplicate.with_name(duplicate.name + ".dedup")
+    try:
+        if not _reflink(original, tmp):
+            os.link(original, tmp)
+        os.replace(tmp, duplicate)
+        return True
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return False
+
+
+class ContentIndex:
+    """Content-addressed index over downloaded files.
+
+    New files get a cheap partial hash immediately; a full hash is
+    computed on a background thread only when another file shares the
+    same size and partial hash. Confirmed duplicates are replaced with
+    links to the first copy. The index is persisted as JSON, at most once
+    per SAVE_DELAY (and on shutdown).
+    """
+
+    def __init__(self, index_file: Path):
+        self.index_file = Path(index_file)
+        self.logger = get_logger("ContentIndex")
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="content-hash")
+        # path -> {"size", "mtime", "partial", "full"}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        # (size, partial hash) -> paths: duplicate candidates without scanning _files
+        self._groups: Dict[Tuple[int, str], Set[str]] = {}
+        # full hash of an HEVC source -> path of its H.264 output
+        self._transcodes: Dict[str, str] = {}
+        self._save_timer: Optional[threading.Timer] = None
+        self._load()
+
+    def _load(self):
+        if not self.index_file.exists():
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            files = data.get("files", {})
+            self._transcodes = data.get("transcodes", {})
+        except (json.JSONDecodeError, IOError) as e:
+            self.logger.warning(f"Could not read content index {self.index_file}: {e}")
+            return
+        for path, entry in files.items():
+            # Older indexes also hold work files; forget them
+            if is_media_file(Path(path)):
+                self._set_entry(path, entry)
+
+    def _set_entry(self, path: str, entry: Dict[str, Any]):
+        self._drop_entry(path)
+        self._files[path] = entry
+        self._groups.setdefault((entry["size"], entry["partial"]), set()).add(path)
+
+    def _drop_entry(self, path: str):
+        entry = self._files.pop(path, None)
+        if entry is None:
+            return
+        key = (entry["size"], entry["partial"])
+        group = self._groups.get(key)
+        if group is not None:
+            group.discard(path)
+            if not group:
+                del self._groups[key]
+
+    def save_later(self):
+        """Save once SAVE_DELAY has passed, folding in every change made meanwhile."""
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            data = json.dumps({"files": self._files, "transcodes": self._transcodes}, ensure_ascii=False)
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_file.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.index_file)
+        except IOError as e:
+            self.logger.warning(f"Could not save content index: {e}")
+
+    def _entry(self, path: Path) -> Optional[Dict[str, Any]]:
+        """Return an up-to-date entry for path (partial hash recomputed if the file changed)."""
+        try:
+            stat = path.stat()
+        except OSError:
+            self._drop_entry(str(path))
+            return None
+        entry = self._files.get(str(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "partial": partial_hash(path), "full": None}
+        self._set_entry(str(path), entry)
+        return entry
+
+    def _ensure_full(self, path: Path, entry: Dict[str, Any]) -> str:
+        if not entry.get("full"):
+            entry["full"] = full_hash(path)
+        return entry["full"]
+
+    def add_file(self, path: Path):
+        """Index a new file and dedup it against existing ones in the background."""
+        self._executor.submit(self._add_and_dedup, Path(path))
+
+    def scan(self, directory: Path):
+        """Index every file in a directory in the background."""
+        def run():
+            for child in Path(directory).iterdir():
+                if is_media_file(child) and child.is_file():
+                    self._add_and_dedup(child, save=False)
+            self.save()
+        self._executor.submit(run)
+
+    def _add_and_dedup(self, path: Path, save: bool = True):
+        try:
+            with self._lock:
+                entry = self._entry(path)
+                if entry is None:
+                    return
+                candidates = [
+                    Path(p) for p in self._groups.get((entry["size"], entry["partial"]), ())
+                    if p != str(path)
+                ]
+            if not candidates:
+                return
+            digest = self._ensure_full(path, entry)
+            for other in candidates:
+                with self._lock:
+                    other_entry = self._entry(other)
+                if other_entry is None:
+                    continue
+                if os.path.samefile(other, path):
+                    return  # already linked
+                if self._ensure_full(other, other_entry) != digest:
+                    continue
+                if link_duplicate(other, path):
+                    self.logger.info(f"Deduplicated {path.name} -> {other.name}")
+                    with self._lock:
+                        self._entry(path)["full"] = digest
+                return
+        except OSError as e:
+            self.logger.warning(f"Content indexing failed for {path}: {e}")
+        finally:
+            if save:
+                self.save_later()
+
+    def source_hash(self, path: Path) -> Optional[str]:
+        """Full hash of a file, via the index when it is already known."""
+        try:
+            with self._lock:
+                entry = self._entry(Path(path))
+            if entry is None:
+                return None
+            return self._ensure_full(Path(path), entry)
+        except OSError:
+            return None
+
+    def lookup_transcode(self, source_digest: str) -> Optional[Path]:
+        """Return a still-present H.264 output previously made from this source."""
+        with self._lock:
+            output = self._transcodes.get(source_digest)
+        if output and Path(output).exists():
+            return Path(output)
+        return None
+
+    def record_transcode(self, source_digest: str, output: Path):
+        with self._lock:
+            self._transcodes[source_digest] = str(output)
+        self.save_later()
+
+    def shutdown(self):
+        """Drop queued hashing work (a file being hashed finishes in the background) and save pending changes."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            pending = self._save_timer is not None
+        if pending:
+            self.save()
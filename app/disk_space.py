@@ -0,0 +1,140 @@
+"""
+Disk-space admission control for Download App.
+Jobs reserve their estimated size (plus transcode headroom) before the
+transfer starts, so a full disk is caught up front instead of minutes in.
+"""
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .logger import get_logger
+
+
+FREE_FLOOR_SETTING = "disk_free_floor_mb"
+DEFAULT_FREE_FLOOR_MB = 1024
+# HEVC -> H.264 writes a second file of about the same size before replacing the source
+TRANSCODE_HEADROOM = 1.0
+HEVC_CODECS = ("hev1", "hvc1", "hevc", "h265")
+
+
+class InsufficientDiskSpace(Exception):
+    """Raised when a job's reservation would eat into the free-space floor."""
+
+    def __init__(self, needed: int, available: int, path: Path):
+        self.needed = needed
+        self.available = available
+        self.path = path
+        super().__init__(
+            f"Không đủ dung lượng trống trong {path}: cần ~{needed / 2**20:.0f} MB, "
+            f"còn {max(0, available) / 2**20:.0f} MB"
+        )
+
+    def __reduce__(self):
+        # Picklable, so process-pool workers can send it back to the parent
+        return (InsufficientDiskSpace, (self.needed, self.available, self.path))
+
+
+def estimate_bytes(info: Dict[str, Any]) -> Optional[int]:
+    """Estimated download size of a processed info dict (selected formats), or None."""
+    formats = info.get("requested_formats") or [info]
+    total = 0
+    for fmt in formats:
+        size = fmt.get("filesize") or fmt.get("filesize_approx")
+        if not size:
+            return None
+        total += int(size)
+    return total
+
+
+def may_need_transcode(info: Dict[str, Any]) -> bool:
+    """True if the selected video stream is (or may be) HEVC."""
+    formats = info.get("requested_formats") or [info]
+    for fmt in formats:
+        vcodec = (fmt.get("vcodec") or "").lower()
+        if vcodec == "none":
+            continue
+        # Unknown codec: assume the worst
+        if not vcodec or vcodec.startswith(HEVC_CODECS):
+            return True
+    return False
+
+
+class Reservation:
+    """Space held for one job; ``written`` counts bytes already on disk."""
+
+    def __init__(self, guard: "DiskSpaceGuard", nbytes: int):
+        self.guard = guard
+        self.nbytes = nbytes
+        self.written = 0
+
+    @property
+    def outstanding(self) -> int:
+        """Bytes reserved but not yet reflected in the disk's free space."""
+        return max(0, self.nbytes - self.written)
+
+    def release(self):
+        self.guard.release(self)
+
+
+class DiskSpaceGuard:
+    """Admit jobs only while reservations fit above a free-space floor.
+
+    Free space is read from the filesystem on every reservation; bytes a
+    job has already written are subtracted from its reservation so they
+    are not counted twice.
+    """
+
+    def __init__(self, path: Path, floor_bytes: int = DEFAULT_FREE_FLOOR_MB * 2**20):
+        """Initialize the guard.
+
+        Args:
+            path: Directory downloads are written to.
+            floor_bytes: Free space that must remain after every reservation.
+        """
+        self.path = Path(path)
+        self.floor_bytes = floor_bytes
+        self._reservations = set()
+        self._lock = threading.Lock()
+        self.logger = get_logger("DiskSpaceGuard")
+
+    @classmethod
+    def from_settings(cls, settings, path: Path) -> "DiskSpaceGuard":
+        """Guard for path with the floor from ``disk_free_floor_mb``."""
+        floor_mb = settings.get(FREE_FLOOR_SETTING, DEFAULT_FREE_FLOOR_MB)
+        return cls(path, int(float(floor_mb) * 2**20))
+
+    def free_bytes(self) -> int:
+        try:
+            return shutil.disk_usage(self.path).free
+        except OSError:
+            # Directory missing or unreadable: let the download report the real error
+            return 2**62
+
+    def available(self) -> int:
+        """Bytes that can still be reserved."""
+        with self._lock:
+            outstanding = sum(r.outstanding for r in self._reservations)
+        return self.free_bytes() - self.floor_bytes - outstanding
+
+    def check(self, nbytes: int = 0):
+        """Raise InsufficientDiskSpace if nbytes do not fit (reserves nothing)."""
+        available = self.available()
+        if nbytes > available or available < 0:
+            raise InsufficientDiskSpace(nbytes, available, self.path)
+
+    def reserve(self, nbytes: int) -> Reservation:
+        """Reserve nbytes or raise InsufficientDiskSpace."""
+        free = self.free_bytes()
+        with self._lock:
+            available = free - self.floor_bytes - sum(r.outstanding for r in self._reservations)
+            if nbytes > available:
+                raise InsufficientDiskSpace(nbytes, available, self.path)
+            reservation = Reservation(self, nbytes)
+            self._reservations.add(reservation)
+        self.logger.debug(f"Reserved {nbytes / 2**20:.0f} MB ({(available - nbytes) / 2**20:.0f} MB left)")
+        return reservation
+
+    def release(self, reservation: Reservation):
+        with self._lock:
+            self._reservations.discard(reservation)
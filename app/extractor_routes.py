@@ -0,0 +1,219 @@
+"""
+Offline host -> extractor routing for Download App.
+Maps a URL's domain to the few yt-dlp extractors that can handle it, so
+resolving a URL checks a handful of ``_VALID_URL`` patterns instead of
+all of them. The table is generated by build.py or on first run and cached.
+"""
+import json
+import re
+import threading
+import urllib.parse
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from .logger import get_logger
+
+
+ROUTES_FILE = "extractor_routes.json"
+# Written by build.py next to this module (and bundled with the executable)
+BUNDLED_ROUTES = Path(__file__).resolve().with_name(ROUTES_FILE)
+GENERIC = "Generic"
+# yt-dlp errors meaning "the ie_key we passed cannot take this URL"
+ROUTING_ERRORS = ("no suitable infoextractor", "no suitable extractor", "unsupported url")
+
+# "(?:a|b)\.com", "pre(?:a|b)\.tv": literal alternatives around a group
+_ALT_RE = re.compile(r"(?<![a-z0-9\\-])([a-z0-9-]*)\(\?:([a-z0-9|.\\-]+)\)((?:\\\.[a-z0-9-]+)*)(?![a-z0-9(\[])")
+# Plain escaped host literals: "youtube\.com", "www\.bbc\.co\.uk"
+_LITERAL_RE = re.compile(r"(?<![a-z0-9\\-])((?:[a-z0-9-]+\\\.)+[a-z]{2,})(?![a-z0-9])")
+# Hosts we cannot enumerate: "youtube(?:kids)?\.com", "\.(?:com|net)", "%(...)s", "\.[a-z]+"
+_NON_LITERAL_RE = re.compile(
+    r"[)\]+*?}]\\\.[a-z]{2,}(?![a-z0-9\-]|\\\.[a-z])|\\\.\(|%\(|\\\.\["
+)
+
+
+def domain_key(host: str) -> str:
+    """Last two labels of a host ("music.youtube.com" -> "youtube.com")."""
+    return ".".join(host.lower().rstrip(".").split(".")[-2:])
+
+
+def pattern_domains(pattern: str) -> Optional[Set[str]]:
+    """Domains a ``_VALID_URL`` pattern can match, or None if they can't be listed."""
+    p = pattern.lower()
+    if _NON_LITERAL_RE.search(_ALT_RE.sub("", p)):
+        return None
+    domains = set()
+    for m in _ALT_RE.finditer(p):
+        for alt in m.group(2).split("|"):
+            domain = (m.group(1) + alt + m.group(3)).replace("\\.", ".").strip(".")
+            if "." in domain:
+                domains.add(domain)
+    for m in _LITERAL_RE.finditer(p):
+        domains.add(m.group(1).replace("\\.", "."))
+    return domains or None
+
+
+def build_routes(ie_classes: Optional[Iterable] = None) -> Dict:
+    """Build the routing table from the extractor classes (no regex compiled, no I/O).
+
+    Returns:
+        JSON-serializable dict: extractor keys in yt-dlp's matching order,
+        domain -> indexes into that list, and the indexes of "wildcard"
+        extractors whose hosts could not be listed (always candidates).
+    """
+    import yt_dlp
+    from yt_dlp.extractor import gen_extractor_classes
+
+    keys: List[str] = []
+    routes: Dict[str, List[int]] = {}
+    wildcard: List[int] = []
+    for ie in ie_classes if ie_classes is not None else gen_extractor_classes():
+        key = ie.ie_key()
+        if key == GENERIC:
+            continue
+        index = len(keys)
+        keys.append(key)
+        valid_url = getattr(ie, "_VALID_URL", None)
+        patterns = [valid_url] if isinstance(valid_url, str) else list(valid_url or ())
+        domains: Set[str] = set()
+        for pattern in patterns:
+            found = pattern_domains(pattern)
+            if found is None:
+                domains = set()
+                break
+            domains |= found
+        if not domains:
+            wildcard.append(index)
+            continue
+        for domain in {domain_key(d) for d in domains}:
+            routes.setdefault(domain, []).append(index)
+    return {"version": yt_dlp.version.__version__, "extractors": keys, "routes": routes, "wildcard": wildcard}
+
+
+class ExtractorRouter:
+    """Resolve the extractor for a URL with one dict lookup plus a few regex checks.
+
+    Candidates for a domain are merged with the wildcard extractors in
+    yt-dlp's own order, so the first suitable one is the extractor yt-dlp
+    would pick. If no candidate matches, a full scan confirms the result
+    (and the domain learns the extractor it found).
+    """
+
+    def __init__(self, data: Dict):
+        self.version = data["version"]
+        self._keys: List[str] = data["extractors"]
+        self._routes: Dict[str, List[int]] = {k: list(v) for k, v in data["routes"].items()}
+        self._wildcard: List[int] = data["wildcard"]
+        self._candidates: Dict[str, List[int]] = {}
+        # Domains no extractor lists and a full scan found nothing for
+        self._generic_domains: Set[str] = set()
+        self._classes: Dict[str, type] = {}
+        self._lock = threading.Lock()
+
+    def _class(self, key: str):
+        cls = self._classes.get(key)
+        if cls is None:
+            from yt_dlp.extractor import get_info_extractor
+            cls = self._classes[key] = get_info_extractor(key)
+        return cls
+
+    def candidates(self, host: str) -> List[str]:
+        """Extractor keys to try for a host, in yt-dlp's order."""
+        domain = domain_key(host)
+        with self._lock:
+            merged = self._candidates.get(domain)
+            if merged is None:
+                merged = self._candidates[domain] = sorted(set(self._routes.get(domain, ())) | set(self._wildcard))
+        return [self._keys[i] for i in merged]
+
+    def resolve(self, url: str):
+        """Return the extractor class yt-dlp would use for url, or None for the generic one."""
+        host = urllib.parse.urlsplit(url).hostname or ""
+        for key in self.candidates(host):
+            cls = self._class(key)
+            if cls.suitable(url):
+                return cls
+        return self._full_scan(url, host)
+
+    def resolve_key(self, url: str) -> str:
+        """ie_key for url ("Generic" if no specific extractor claims it)."""
+        cls = self.resolve(url)
+        return cls.ie_key() if cls is not None else GENERIC
+
+    def _full_scan(self, url: str, host: str):
+        from yt_dlp.extractor import gen_extractor_classes
+
+        domain = domain_key(host)
+        if domain in self._generic_domains:
+            return None
+        for ie in gen_extractor_classes():
+            if ie.ie_key() == GENERIC or not ie.suitable(url):
+                continue
+            key = ie.ie_key()
+            if key in self._keys:
+                with self._lock:
+                    self._routes.setdefault(domain, []).append(self._keys.index(key))
+                    self._candidates.pop(domain, None)
+            return ie
+        if domain not in self._routes:
+            self._generic_domains.add(domain)
+        return None
+
+
+def _load(path: Path, version: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return data if data.get("version") == version else None
+
+
+def save_routes(data: Dict, path: Path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    tmp.replace(path)
+
+
+_router: Optional[ExtractorRouter] = None
+_router_lock = threading.Lock()
+
+
+def is_routing_error(message: str) -> bool:
+    """True if a yt-dlp error says the forced extractor did not match the URL."""
+    message = message.lower()
+    return any(marker in message for marker in ROUTING_ERRORS)
+
+
+def router_ready() -> bool:
+    """True once get_router() is built (calling it no longer imports yt_dlp or blocks)."""
+    return _router is not None
+
+
+def get_router(cache_dir: Optional[Path] = None) -> ExtractorRouter:
+    """Process-wide router for the installed yt-dlp version.
+
+    Uses the table bundled by build.py, else ``<cache_dir>/extractor_routes.json``,
+    else builds one (and caches it in cache_dir when given). A table
+    for a different yt-dlp version is ignored.
+    """
+    global _router
+    with _router_lock:
+        if _router is not None:
+            return _router
+        import yt_dlp
+
+        version = yt_dlp.version.__version__
+        cache_file = Path(cache_dir) / ROUTES_FILE if cache_dir else None
+        data = _load(BUNDLED_ROUTES, version) or (cache_file and _load(cache_file, version))
+        if not data:
+            data = build_routes()
+            if cache_file is not None:
+                try:
+                    save_routes(data, cache_file)
+                except OSError as e:
+                    get_logger("ExtractorRouter").warning(f"Could not cache extractor routes: {e}")
+        _router = ExtractorRouter(data)
+        return _router
@@ -0,0 +1,97 @@
+"""
+FFmpeg helpers for Download App.
+Locates the ffmpeg executable and builds probe/transcode command lines.
+"""
+import shutil
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Windows-specific flag to hide console window
+if sys.platform == 'win32':
+    CREATE_NO_WINDOW = 0x08000000
+else:
+    CREATE_NO_WINDOW = 0
+
+# Codec names that mean HEVC: hevc, h265, hvc1 (standard names) and bytevc1 (TikTok)
+HEVC_MARKERS = ("hevc", "h265", "hvc1", "bytevc1")
+# Audio containers that can carry a cover picture as an attached video stream
+COVER_ART_CONTAINERS = (".m4a", ".mp4", ".mp3", ".flac")
+
+
+@lru_cache(maxsize=None)
+def find_ffmpeg() -> Optional[str]:
+    """Find ffmpeg: PATH first, then the PyInstaller bundle or app/ffmpeg/ffmpeg.exe.
+
+    The result is cached for the life of the process (PATH lookups are
+    slow on Windows and this runs for every probe and transcode).
+
+    Returns:
+        Path to ffmpeg executable, or None if not found.
+    """
+    ffmpeg_cmd = shutil.which("ffmpeg")
+    if ffmpeg_cmd:
+        return ffmpeg_cmd
+    if getattr(sys, "frozen", False):
+        # If running as PyInstaller bundle, look in _MEIPASS
+        base = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parents[1]))
+        candidate = base / "ffmpeg.exe"
+    else:
+        # look for ffmpeg/ffmpeg.exe in source tree
+        candidate = Path(__file__).resolve().parents[1] / "ffmpeg" / "ffmpeg.exe"
+    if candidate.exists():
+        return str(candidate)
+    return None
+
+
+def probe_command(ffmpeg_cmd: str, video_path: str) -> List[str]:
+    """Command that prints stream info for video_path (exits non-zero, no output file)."""
+    return [ffmpeg_cmd, "-i", video_path]
+
+
+def output_is_hevc(output: bytes) -> bool:
+    """Check ffmpeg probe output (stdout + stderr bytes) for an HEVC stream."""
+    # Decode with error handling (ignore non-UTF8 chars)
+    text = output.decode("utf-8", errors="ignore").lower()
+    return any(marker in text for marker in HEVC_MARKERS)
+
+
+def transcode_command(ffmpeg_cmd: str, src: str, dst: str) -> List[str]:
+    """Command that transcodes src to H.264 + AAC for maximum Windows compatibility."""
+    return [
+        ffmpeg_cmd,
+        "-y",
+        "-i",
+        src,
+        "-c:v",
+        "libx264",
+        "-preset",
+        "slow",  # higher quality (slower encoding) - preset: ultrafast, fast, medium, slow, slower
+        "-crf",
+        "16",  # quality (lower = better, 0-51) - 16 = high quality
+        "-c:a",
+        "aac",
+        "-b:a",
+        "256k",  # higher bitrate for better audio quality
+        dst,
+    ]
+
+
+def audio_tag_command(ffmpeg_cmd: str, src: str, dst: str, metadata: Dict[str, str],
+                      cover: Optional[str] = None) -> List[str]:
+    """Command that stream-copies the audio of src into dst, adding tags and an optional cover.
+
+    Audio is never re-encoded; only the cover image is converted to JPEG
+    (YouTube thumbnails are often WebP, which m4a/mp3 cannot carry).
+    """
+    cmd = [ffmpeg_cmd, "-y", "-i", src]
+    if cover:
+        cmd += ["-i", cover]
+    cmd += ["-map", "0:a", "-c:a", "copy"]
+    if cover:
+        cmd += ["-map", "1:v", "-c:v", "mjpeg", "-disposition:v:0", "attached_pic"]
+    for key, value in metadata.items():
+        cmd += ["-metadata", f"{key}={value}"]
+    cmd.append(dst)
+    return cmd
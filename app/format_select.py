@@ -0,0 +1,229 @@
+"""
+Format ranking for Download App.
+Scores the formats yt-dlp extracted (resolution, codec compatibility,
+bitrate, container) and picks a progressive file or a video+audio pair
+that only needs a remux, replacing fixed "best[height<=N]" strings.
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .logger import get_logger
+
+
+AVOID_CODECS_SETTING = "avoid_codecs"
+# HEVC is transcoded afterwards anyway; AV1 needs an extra codec pack on many Windows PCs
+DEFAULT_AVOID_CODECS = ("hevc", "av1")
+
+# Quality preset -> max height (None = no cap, 0 = audio only)
+QUALITY_HEIGHTS = {"auto": None, "1080p": 1080, "720p": 720, "audio": 0}
+
+# Codec-string prefix -> family
+VIDEO_FAMILIES = (
+    ("avc", "h264"), ("h264", "h264"),
+    ("hev", "hevc"), ("hvc", "hevc"), ("h265", "hevc"), ("bytevc1", "hevc"),
+    ("av01", "av1"), ("av1", "av1"),
+    ("vp09", "vp9"), ("vp9", "vp9"), ("vp8", "vp8"),
+)
+AUDIO_FAMILIES = (
+    ("mp4a", "aac"), ("aac", "aac"), ("opus", "opus"), ("vorbis", "vorbis"),
+    ("mp3", "mp3"), ("ac-3", "ac3"), ("ac3", "ac3"), ("ec-3", "eac3"), ("eac3", "eac3"), ("flac", "flac"),
+)
+# Most compatible first (rank = position; unknown codecs rank last)
+VIDEO_RANK = ("h264", "vp9", "av1", "hevc", "vp8")
+AUDIO_RANK = ("aac", "opus", "mp3", "vorbis", "ac3", "eac3", "flac")
+# Codecs ffmpeg can stream-copy into mp4 (the container the app delivers)
+MP4_VIDEO = {"h264", "hevc", "av1", "vp9"}
+MP4_AUDIO = {"aac", "mp3", "opus", "ac3", "eac3", "flac"}
+# Above this, extra audio bitrate is not worth the bytes
+AUDIO_ABR_CAP = 192
+
+
+def codec_family(codec: Optional[str], families: Sequence[Tuple[str, str]]) -> Optional[str]:
+    """Family of a yt-dlp codec string ("avc1.640028" -> "h264"), or None if unknown."""
+    codec = (codec or "").lower()
+    for prefix, family in families:
+        if codec.startswith(prefix):
+            return family
+    return None
+
+
+def _rank(family: Optional[str], order: Sequence[str]) -> int:
+    return -(order.index(family) if family in order else len(order))
+
+
+def has_video(fmt: Dict[str, Any]) -> bool:
+    # yt-dlp uses None for "unknown", which may well contain video
+    return fmt.get("vcodec") != "none"
+
+
+def has_audio(fmt: Dict[str, Any]) -> bool:
+    return fmt.get("acodec") != "none"
+
+
+@dataclass
+class FormatPreferences:
+    """User-tunable parts of the ranking."""
+    avoid_codecs: Tuple[str, ...] = DEFAULT_AVOID_CODECS  # video families used only as a last resort
+    max_fps: int = 60
+
+    @classmethod
+    def from_settings(cls, settings) -> "FormatPreferences":
+        """Preferences from ``avoid_codecs`` (e.g. ["hevc"], [] to allow everything)."""
+        avoid = settings.get(AVOID_CODECS_SETTING, list(DEFAULT_AVOID_CODECS))
+        return cls(tuple(str(codec).lower() for codec in avoid))
+
+
+@dataclass
+class FormatDecision:
+    """The chosen format(s), as yt-dlp expects them from a format selector."""
+    video: Optional[Dict[str, Any]]
+    audio: Optional[Dict[str, Any]]
+    ext: str
+    remux_only: bool = True
+
+    @property
+    def format_id(self) -> str:
+        return "+".join(f["format_id"] for f in self.formats)
+
+    @property
+    def formats(self) -> List[Dict[str, Any]]:
+        return [f for f in (self.video, self.audio) if f is not None]
+
+    def describe(self) -> str:
+        """One line for the log: "137+140 -> mp4: 1080p h264 + aac 128k"."""
+        parts = []
+        if self.video is not None:
+            family = codec_family(self.video.get("vcodec"), VIDEO_FAMILIES) or self.video.get("vcodec") or "?"
+            parts.append(f"{self.video.get('height') or '?'}p {family}")
+        if self.audio is not None:
+            family = codec_family(self.audio.get("acodec"), AUDIO_FAMILIES) or self.audio.get("acodec") or "?"
+            abr = self.audio.get("abr")
+            parts.append(f"{family} {abr:.0f}k" if abr else family)
+        note = "" if self.remux_only else " (needs conversion)"
+        return f"{self.format_id} -> {self.ext}: {' + '.join(parts)}{note}"
+
+    def to_info(self) -> Dict[str, Any]:
+        """Format dict to yield from a yt-dlp format selector."""
+        if len(self.formats) == 1:
+            return self.formats[0]
+        video, audio = self.video, self.audio
+        sizes = [f.get("filesize") or f.get("filesize_approx") for f in self.formats]
+        return {
+            "requested_formats": self.formats,
+            "format": self.describe(),
+            "format_id": self.format_id,
+            "ext": self.ext,
+            "protocol": "+".join(f.get("protocol") or "https" for f in self.formats),
+            "width": video.get("width"),
+            "height": video.get("height"),
+            "fps": video.get("fps"),
+            "vcodec": video.get("vcodec"),
+            "acodec": audio.get("acodec"),
+            "abr": audio.get("abr"),
+            "tbr": sum(f.get("tbr") or 0 for f in self.formats) or None,
+            "filesize_approx": sum(sizes) if all(sizes) else None,
+        }
+
+
+class FormatRanker:
+    """Score formats for one quality preset.
+
+    Video is ranked by (allowed codec, height within the cap, compatible
+    codec, mp4 container, fps, bitrate); audio by (codec that muxes into
+    the video's container, compatible codec, bitrate up to AUDIO_ABR_CAP).
+    A progressive format wins over a pair of the same height: one
+    download, no merge.
+    """
+
+    def __init__(self, quality: str = "auto", prefs: Optional[FormatPreferences] = None):
+        self.quality = quality
+        self.max_height = QUALITY_HEIGHTS.get(quality)
+        self.prefs = prefs or FormatPreferences()
+
+    def video_key(self, fmt: Dict[str, Any]) -> tuple:
+        family = codec_family(fmt.get("vcodec"), VIDEO_FAMILIES)
+        height = fmt.get("height") or 0
+        fps = fmt.get("fps") or 0
+        return (
+            family not in self.prefs.avoid_codecs,
+            self.max_height is None or height <= self.max_height,
+            # Over the cap: the smallest one is the closest
+            height if self.max_height is None or height <= self.max_height else -height,
+            fps <= self.prefs.max_fps,
+            _rank(family, VIDEO_RANK),
+            fmt.get("ext") == "mp4",
+            has_audio(fmt),
+            fps,
+            fmt.get("tbr") or fmt.get("vbr") or 0,
+        )
+
+    def audio_key(self, fmt: Dict[str, Any], video: Optional[Dict[str, Any]] = None) -> tuple:
+        family = codec_family(fmt.get("acodec"), AUDIO_FAMILIES)
+        abr = fmt.get("abr") or fmt.get("tbr") or 0
+        return (
+            video is None or family in MP4_AUDIO,
+            _rank(family, AUDIO_RANK),
+            min(abr, AUDIO_ABR_CAP),
+            -abr,  # past the cap, the smaller file
+        )
+
+    def choose(self, formats: List[Dict[str, Any]]) -> Optional[FormatDecision]:
+        """Best format or video+audio pair among formats, or None if there is nothing usable."""
+        formats = [
+            f for f in formats
+            if f.get("format_id") and (has_video(f) or has_audio(f))
+            and f.get("ext") != "mhtml" and not f.get("has_drm")
+        ]
+        if not formats:
+            return None
+        audio_only = [f for f in formats if has_audio(f) and not has_video(f)]
+
+        if self.max_height == 0:
+            if audio_only:
+                best = max(audio_only, key=self.audio_key)
+                return FormatDecision(None, best, best.get("ext") or "m4a")
+            # No separate audio stream: the smallest file that has sound
+            with_audio = [f for f in formats if has_audio(f)] or formats
+            best = min(with_audio, key=lambda f: (f.get("height") or 0, f.get("tbr") or 0))
+            return FormatDecision(best, None, best.get("ext") or "mp4")
+
+        video = max((f for f in formats if has_video(f)), key=self.video_key, default=None)
+        if video is None:
+            best = max(audio_only, key=self.audio_key)
+            return FormatDecision(None, best, best.get("ext") or "m4a")
+        if has_audio(video) or not audio_only:
+            # Progressive (or silent) file: single download
+            return FormatDecision(video, None, video.get("ext") or "mp4")
+
+        audio = max(audio_only, key=lambda f: self.audio_key(f, video))
+        vfamily = codec_family(video.get("vcodec"), VIDEO_FAMILIES)
+        afamily = codec_family(audio.get("acodec"), AUDIO_FAMILIES)
+        if vfamily in MP4_VIDEO and afamily in MP4_AUDIO:
+            return FormatDecision(video, audio, "mp4")
+        # e.g. VP8/Vorbis: mkv takes anything, the mp4 convertor re-encodes afterwards
+        return FormatDecision(video, audio, "mkv", remux_only=False)
+
+
+class FormatSelector:
+    """Callable for yt-dlp's ``format`` option that runs a FormatRanker.
+
+    The last decision is kept on ``decision`` and passed to ``on_decision``.
+    """
+
+    def __init__(self, quality: str = "auto", prefs: Optional[FormatPreferences] = None,
+                 on_decision: Optional[Callable[[FormatDecision], None]] = None):
+        self.ranker = FormatRanker(quality, prefs)
+        self.on_decision = on_decision
+        self.decision: Optional[FormatDecision] = None
+        self.logger = get_logger("FormatSelector")
+
+    def __call__(self, ctx: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        decision = self.ranker.choose(list(ctx.get("formats") or []))
+        if decision is None:
+            # yt-dlp reports "Requested format is not available"
+            return
+        self.decision = decision
+        self.logger.info(f"Selected format {decision.describe()} (quality: {self.ranker.quality})")
+        if self.on_decision:
+            self.on_decision(decision)
+        yield decision.to_info()
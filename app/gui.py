@@ -10,291 +10,43 @@ from PySide6.QtWidgets import (
     QFileDialog,
     QMessageBox,
     QComboBox,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView,
 )
-from PySide6.QtCore import QObject, QThread, Signal, Slot
+from PySide6.QtCore import QThread, QSize, Qt, Signal
 from PySide6.QtGui import QPixmap, QIcon, QPainter, QColor
-import yt_dlp
 from pathlib import Path
-import subprocess
-import os
-import sys
-import shutil
 import re
-
-# Windows-specific flag to hide console window
-if sys.platform == 'win32':
-    CREATE_NO_WINDOW = 0x08000000
-else:
-    CREATE_NO_WINDOW = 0
+import threading
 
 from .settings import SettingsManager
-from .logger import setup_logging, get_logger
-from .security import validate_url, sanitize_filename
-
-
-class DownloadWorker(QObject):
-    progress = Signal(int, str)  # percent, status text
-    finished = Signal(bool, str)  # success, message/path
-
-    def __init__(self, url: str, outdir: str, quality: str = "auto"):
-        super().__init__()
-        self.url = url
-        self.outdir = outdir
-        self.quality = quality  # "auto", "1080p", "720p", "audio"
-        self._last_percent = 0
-        self._last_filename = None
-        self.logger = get_logger("DownloadWorker")
-
-    def _detect_hevc(self, video_path: str) -> bool:
-        """Detect if video uses HEVC codec using ffmpeg output."""
-        try:
-            # Find ffmpeg executable
-            ffmpeg_cmd = shutil.which("ffmpeg")
-            if not ffmpeg_cmd:
-                if getattr(sys, "frozen", False):
-                    base = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parents[1]))
-                    candidate = base / "ffmpeg.exe"
-                    if candidate.exists():
-                        ffmpeg_cmd = str(candidate)
-                else:
-                    candidate = Path(__file__).resolve().parents[1] / "ffmpeg" / "ffmpeg.exe"
-                    if candidate.exists():
-                        ffmpeg_cmd = str(candidate)
-
-            if not ffmpeg_cmd:
-                self.logger.warning("ffmpeg not found; cannot detect HEVC codec")
-                return False
-
-            # Use ffmpeg to probe video (parse output for hevc/h265/hvc1/bytevc1)
-            try:
-                result = subprocess.run(
-                    [ffmpeg_cmd, "-i", video_path],
-                    capture_output=True,
-                    text=False,  # Get bytes, not text (avoid encoding issues)
-                    timeout=10,
-                    creationflags=CREATE_NO_WINDOW,
-                )
-                # Decode with error handling (ignore non-UTF8 chars)
-                try:
-                    output = result.stdout.decode('utf-8', errors='ignore') + result.stderr.decode('utf-8', errors='ignore')
-                except:
-                    output = ""
-                
-                # Check for HEVC codecs: hevc, h265, hvc1 (standard names) and bytevc1 (TikTok)
-                is_hevc = "hevc" in output.lower() or "h265" in output.lower() or "hvc1" in output.lower() or "bytevc1" in output.lower()
-                self.logger.info(f"Video codec check: HEVC={is_hevc}")
-                return is_hevc
-            except subprocess.TimeoutExpired:
-                self.logger.warning("Timeout detecting HEVC codec")
-                return False
-        except Exception as e:
-            self.logger.warning(f"Error detecting HEVC codec: {e}")
-            return False
-
-    def _progress_hook(self, d):
-        status = d.get("status")
-        if status == "downloading":
-            downloaded = d.get("downloaded_bytes", 0)
-            total = d.get("total_bytes") or d.get("total_bytes_estimate")
-            if total:
-                try:
-                    percent = int(downloaded * 100 / total)
-                except Exception:
-                    percent = 0
-            else:
-                percent = 0
-            eta = d.get("eta")
-            text = f"Đang tải... {percent}% (ETA: {eta}s)" if eta is not None else f"Đang tải... {percent}%"
-            # throttle signals if percent hasn't changed to avoid UI spam
-            if percent != self._last_percent:
-                self._last_percent = percent
-                self.progress.emit(percent, text)
-        elif status == "finished":
-            filename = d.get("filename") or ""
-            # remember downloaded filename for post-processing
-            self._last_filename = filename
-            # Do NOT emit a UI progress update here — conversion will run
-            # and the UI will be updated once everything (including conversion) completes.
-
-    @Slot()
-    def run(self):
-        try:
-            # Sanitize output template to prevent path traversal
-            sanitized_title = sanitize_filename("%(title)s")
-            outtmpl = str(Path(self.outdir) / f"{sanitized_title}.%(ext)s")
-            
-            # Set format based on quality setting
-            # Simple & reliable format selection
-            format_map = {
-                "auto": "best",
-                "1080p": "best[height<=1080]",
-                "720p": "best[height<=720]", 
-                "audio": "bestaudio",
-            }
-            
-            ydl_opts = {
-                "outtmpl": outtmpl,
-                "progress_hooks": [self._progress_hook],
-                "format": format_map.get(self.quality, format_map["auto"]),
-                "quiet": False,
-                "no_warnings": False,
-                # Use web client only (most compatible)
-                "extractor_args": {
-                    "youtube": {
-                        "player_client": ["web"],
-                    }
-                },
-                # Auto-merge video and audio when needed
-                "postprocessors": [{
-                    "key": "FFmpegVideoConvertor",
-                    "preferedformat": "mp4"
-                }],
-            }
-            
-            # Check if cookies.txt exists in project root
-            cookies_file = Path(__file__).resolve().parents[1] / "cookies.txt"
-            if cookies_file.exists():
-                ydl_opts["cookiefile"] = str(cookies_file)
-                self.logger.info(f"Using cookies from: {cookies_file}")
-            
-            self.logger.info(f"Starting download: {self.url} (quality: {self.quality})")
-            
-            # Try download with fallback strategies
-            download_success = False
-            last_error = None
-            
-            # Strategy 1: Try with current format settings
-            try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([self.url])
-                download_success = True
-            except Exception as e:
-                last_error = e
-                self.logger.warning(f"Strategy 1 (web client) failed: {e}")
-                
-                # Strategy 2: Try with browser cookies for authentication
-                if ("Sign in" in str(e) or "bot" in str(e).lower() or "age" in str(e).lower()) and not download_success:
-                    self.logger.info("Attempting to use browser cookies...")
-                    for browser in ["edge", "firefox", "chrome"]:
-                        try:
-                            cookie_opts = ydl_opts.copy()
-                            cookie_opts["cookiesfrombrowser"] = (browser,)
-                            with yt_dlp.YoutubeDL(cookie_opts) as ydl:
-                                ydl.download([self.url])
-                            download_success = True
-                            self.logger.info(f"Success with {browser} cookies!")
-                            break
-                        except Exception as browser_error:
-                            self.logger.debug(f"Failed with {browser}: {browser_error}")
-                            continue
-            
-            if not download_success:
-                raise last_error or Exception("Download failed with all strategies")
-            
-            final_path = None
-            if self._last_filename:
-                src = Path(self._last_filename)
-                # ensure absolute path
-                if not src.is_absolute():
-                    src = Path(self.outdir) / src.name
-
-                if src.exists():
-                    final_path = str(src)
-                    
-                    # Check if we should transcode this video
-                    should_transcode = self._detect_hevc(str(src))
-                    
-                    if should_transcode:
-                        # Auto-transcode HEVC to H.264 for Windows compatibility
-                        tmp = src.with_suffix('.tmp.mp4')
-                        try:
-                            self.progress.emit(0, "Chuyển đổi video sang định dạng H.264 (tương thích Windows)...")
-                            self.logger.info(f"Transcoding HEVC to H.264: {src.name}")
-
-                            # Determine ffmpeg executable: prefer bundled ffmpeg in frozen app or project, fallback to PATH
-                            ffmpeg_cmd = shutil.which("ffmpeg")
-                            if not ffmpeg_cmd:
-                                # If running as PyInstaller bundle, look in _MEIPASS
-                                if getattr(sys, "frozen", False):
-                                    base = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parents[1]))
-                                    candidate = base / "ffmpeg.exe"
-                                    if candidate.exists():
-                                        ffmpeg_cmd = str(candidate)
-                                else:
-                                    # look for app/ffmpeg/ffmpeg.exe in source tree
-                                    candidate = Path(__file__).resolve().parents[1] / "ffmpeg" / "ffmpeg.exe"
-                                    if candidate.exists():
-                                        ffmpeg_cmd = str(candidate)
-
-                            if not ffmpeg_cmd:
-                                # If ffmpeg is not found, log and skip transcode (keep original)
-                                self.logger.warning("ffmpeg not found; skipping HEVC transcode and keeping original file.")
-                            else:
-                                # Transcode HEVC to H.264 + AAC for maximum Windows compatibility
-                                self.logger.info(f"FFmpeg found at: {ffmpeg_cmd}")
-                                subprocess.run([
-                                    ffmpeg_cmd,
-                                    "-y",
-                                    "-i",
-                                    str(src),
-                                    "-c:v",
-                                    "libx264",
-                                    "-preset",
-                                    "slow",  # higher quality (slower encoding) - preset: ultrafast, fast, medium, slow, slower
-                                    "-crf",
-                                    "16",  # quality (lower = better, 0-51) - 16 = high quality
-                                    "-c:a",
-                                    "aac",
-                                    "-b:a",
-                                    "256k",  # higher bitrate for better audio quality
-                                    str(tmp),
-                                ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=CREATE_NO_WINDOW)
-                                
-                                self.logger.info(f"HEVC transcode successful, replacing original file")
-                                
-                                # atomically replace original with tmp
-                                try:
-                                    tmp.replace(src)
-                                    final_path = str(src)
-                                    self.logger.info(f"HEVC to H.264 transcode complete: {src}")
-                                except Exception:
-                                    try:
-                                        # fallback to os.replace
-                                        os.replace(str(tmp), str(src))
-                                        final_path = str(src)
-                                        self.logger.info(f"HEVC to H.264 transcode complete (via os.replace): {src}")
-                                    except Exception as e:
-                                        # if replace fails, keep tmp as final
-                                        final_path = str(tmp)
-                                        self.logger.warning(f"Could not replace original, using temp file: {e}")
-                        except subprocess.CalledProcessError as e:
-                            # ffmpeg failed — keep original
-                            self.logger.error(f"FFmpeg HEVC transcode failed: {e}")
-                            final_path = str(src)
-                        except Exception as e:
-                            self.logger.error(f"Unexpected error during HEVC transcode: {e}")
-                            final_path = str(src)
-                    else:
-                        # Video is not HEVC; no transcode needed
-                        final_path = str(src)
-                        self.logger.info(f"Video is not HEVC; keeping original: {src}")
-                else:
-                    final_path = str(Path(self.outdir))
-            else:
-                final_path = str(Path(self.outdir))
-
-            self.finished.emit(True, final_path)
-        except Exception as e:
-            self.logger.error(f"Download failed: {e}", exc_info=True)
-            self.finished.emit(False, str(e))
+from .logger import setup_logging, get_logger, default_log_dir
+from .tracing import get_tracer
+from .metrics import get_metrics
+from .url_filter import UrlPrefilter, FilteredURL, IMAGE, TIKTOK_PHOTO
+from .worker import warm_up
+from .qt_worker import DownloadWorker
+from .extractor_routes import get_router, router_ready
+from .archive import DownloadArchive
+from .dedup import ContentIndex
+from .cancellation import CANCELLED_MESSAGE
+from .async_engine import AsyncEngineBridge
+from .rate_control import limiter_from_settings, save_limits
+from .disk_space import DiskSpaceGuard
+from .format_select import FormatPreferences
+from .queue_manager import QueueManager, DownloadState
+from .queue_model import QueueTableModel, STATE_LABELS, TITLE
+from .prefetch import MetadataCache, MetadataPrefetcher
 
 
 class MainWindow(QMainWindow):
+    # (url, quality) once the extractor router is built on a helper thread
+    _router_warmed = Signal(str, str)
     def __init__(self):
         super().__init__()
-        # Setup logging
-        self.logger = setup_logging()
-        self.logger.info("Starting Download App")
+        # Handlers are attached in finish_startup(), after the first paint
+        self.logger = get_logger()
         
         self.setWindowTitle("📥 Download Video Đa Nền Tảng")
         
@@ -306,7 +58,7 @@ class MainWindow(QMainWindow):
         win_x = settings_data.get("window_x", 100)
         win_y = settings_data.get("window_y", 100)
         win_w = settings_data.get("window_width", 700)
-        win_h = settings_data.get("window_height", 350)
+        win_h = settings_data.get("window_height", 600)
         self.setGeometry(win_x, win_y, win_w, win_h)
         
         # Load dark mode preference
@@ -321,7 +73,14 @@ class MainWindow(QMainWindow):
             self.downloads_dir = Path(downloads_path)
         else:
             self.downloads_dir = Path(__file__).resolve().parents[1] / "downloads"
-        self.downloads_dir.mkdir(parents=True, exist_ok=True)
+
+        # Created in finish_startup()
+        self.archive = None
+        self.content_index = None
+
+        # "thread" = one QThread per download, "asyncio" = shared AsyncEngineBridge
+        self.download_engine = settings_data.get("download_engine", "thread")
+        self._async_bridge = None
 
         main_layout = QVBoxLayout()
         main_layout.setSpacing(15)
@@ -408,6 +167,7 @@ class MainWindow(QMainWindow):
         btn_row = QHBoxLayout()
         self.download_btn = QPushButton("⬇️ TẢI XUỐNG")
         self.download_btn.clicked.connect(self.start_download)
+        self._router_warmed.connect(self._confirm_and_start)
         self.download_btn.setMinimumHeight(50)
         self.download_btn.setStyleSheet("""
             QPushButton {
@@ -430,7 +190,51 @@ class MainWindow(QMainWindow):
             }
         """)
         main_layout.addWidget(self.download_btn)
-        main_layout.addStretch()
+
+        # Cancel button (only visible while a download is running)
+        self.cancel_btn = QPushButton("✖ Huỷ")
+        self.cancel_btn.clicked.connect(self.cancel_download)
+        self.cancel_btn.setMinimumHeight(36)
+        self.cancel_btn.setVisible(False)
+        main_layout.addWidget(self.cancel_btn)
+
+        # Queue of this session's downloads; the model reads QueueManager.items directly
+        self.queue = QueueManager()
+        # This window's queue is the one the queue depth gauge reports
+        get_metrics().add_collector(self.queue.collect_metrics)
+        self._queue_item = None  # item of the running download
+        queue_header = QHBoxLayout()
+        queue_label = QLabel("📋 Danh sách tải:")
+        queue_label.setStyleSheet("font-size: 13px; font-weight: 600;")
+        queue_header.addWidget(queue_label)
+        queue_header.addStretch()
+        self.state_filter = QComboBox()
+        self.state_filter.addItem("Tất cả", None)
+        for state, label in STATE_LABELS.items():
+            self.state_filter.addItem(label, state)
+        self.state_filter.currentIndexChanged.connect(
+            lambda _: self.queue_model.set_state_filter(self.state_filter.currentData()))
+        queue_header.addWidget(self.state_filter)
+        main_layout.addLayout(queue_header)
+
+        self.queue_model = QueueTableModel(self.queue, parent=self)
+        self.queue_view = QTableView()
+        self.queue_view.setModel(self.queue_model)
+        # No sort column until the user clicks a header: rows stay in queue order
+        self.queue_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.queue_view.setSortingEnabled(True)
+        self.queue_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.queue_view.setIconSize(QSize(64, 36))
+        # Fixed row heights and column widths: nothing is measured per row, so 100k rows scroll smoothly
+        rows = self.queue_view.verticalHeader()
+        rows.setSectionResizeMode(QHeaderView.Fixed)
+        rows.setDefaultSectionSize(40)
+        columns = self.queue_view.horizontalHeader()
+        columns.setSectionResizeMode(QHeaderView.Interactive)
+        columns.setSectionResizeMode(TITLE, QHeaderView.Stretch)
+        self.queue_view.setMinimumHeight(160)
+        main_layout.addWidget(self.queue_view, 1)
 
         container = QWidget()
         container.setLayout(main_layout)
@@ -439,6 +243,52 @@ class MainWindow(QMainWindow):
         # worker/thread refs
         self._worker = None
         self._thread = None
+        # cancelled jobs whose thread has not exited yet
+        self._stale_jobs = []
+        self._metrics_stop = None  # set by finish_startup when snapshots are enabled
+        self.limiter = None  # per-site concurrency, created by finish_startup
+        self.disk_guard = None  # free-space admission, created by finish_startup
+        self.format_prefs = None  # codecs to avoid when ranking formats, from finish_startup
+
+    def finish_startup(self):
+        """Run startup work that is not needed to paint the window.
+
+        Called once by app.main() right after show(). yt_dlp, its
+        extractor registry and the ffmpeg lookup are warmed on a
+        background thread so neither the first paint nor the first
+        download pays for them.
+        """
+        # "log_format": "json" writes JSON lines (with per-item ids) instead of text
+        self.logger = setup_logging(json_format=self.settings.get("log_format") == "json")
+        self.logger.info("Starting Download App")
+        # Per-item phase timings go to logs/traces.jsonl; "profile_jobs" adds cProfile dumps
+        get_tracer().configure(default_log_dir(), bool(self.settings.get("profile_jobs", False)))
+        # Periodic metrics snapshot (0 disables)
+        interval = float(self.settings.get("metrics_snapshot_seconds", 60) or 0)
+        if interval > 0:
+            self._metrics_stop = get_metrics().start_snapshots(default_log_dir() / "metrics.json", interval)
+        self.downloads_dir.mkdir(parents=True, exist_ok=True)
+
+        # Record of finished downloads, shared with every worker
+        self.archive = DownloadArchive(self.settings.config_dir / "archive.txt")
+        # Content hashes of downloaded files: dedup + transcode cache
+        self.content_index = ContentIndex(self.settings.config_dir / "content_index.json")
+        self.content_index.scan(self.downloads_dir)
+        # Per-site slots and rate-limit backoff, with limits learned in earlier sessions
+        self.limiter = limiter_from_settings(self.settings)
+        # Refuse downloads that would leave less than "disk_free_floor_mb" free
+        self.disk_guard = DiskSpaceGuard.from_settings(self.settings, self.downloads_dir)
+        # "avoid_codecs": ["hevc", "av1"] ranks those video codecs last
+        self.format_prefs = FormatPreferences.from_settings(self.settings)
+        # Titles, durations and thumbnails for the queue view ("prefetch_workers": 0 disables)
+        prefetch_workers = int(self.settings.get("prefetch_workers", 2))
+        if prefetch_workers > 0:
+            cache = MetadataCache(self.settings.config_dir / "metadata_cache",
+                                  max_bytes=int(float(self.settings.get("metadata_cache_mb", 200)) * 2**20))
+            self.queue_model.prefetcher = MetadataPrefetcher(cache, prefetch_workers, format_prefs=self.format_prefs,
+                                                             limiter=self.limiter)
+
+        threading.Thread(target=warm_up, args=(self.settings.config_dir,), name="warm-up", daemon=True).start()
 
     def _create_icon(self):
         """Create a simple icon for the application window."""
@@ -480,6 +330,10 @@ class MainWindow(QMainWindow):
         if path:
             self.downloads_dir = Path(path)
             self.folder_input.setText(str(self.downloads_dir))
+            if self.content_index is not None:
+                self.content_index.scan(self.downloads_dir)
+            if self.disk_guard is not None:
+                self.disk_guard.path = self.downloads_dir
             # Save to settings
             self.settings.set("downloads_dir", str(self.downloads_dir))
 
@@ -490,8 +344,22 @@ class MainWindow(QMainWindow):
             self.logger.warning("Download attempted with empty URL")
             return
         
-        # Validate URL
-        if not validate_url(url):
+        # Validate, normalize and reject obvious non-video URLs (TikTok photo posts, direct images)
+        outcome = UrlPrefilter().check(url)
+        if outcome == IMAGE:
+            self.result_label.setText("URL trỏ tới hình ảnh chứ không phải video.")
+            QMessageBox.information(self, "Không phải video", "URL này trỏ tới một ảnh (không phải video). Vui lòng dán link video.")
+            self.logger.info(f"Blocked image URL: {url}")
+            return
+
+        # TikTok photo posts: catch them early to avoid yt-dlp errors
+        if outcome == TIKTOK_PHOTO:
+            self.result_label.setText("URL TikTok này là bài ảnh, không phải video.")
+            QMessageBox.information(self, "Không phải video", "Link TikTok này là bài đăng ảnh (photo), không thể tải video từ link này. Vui lòng dán link video.")
+            self.logger.info(f"Blocked TikTok photo URL: {url}")
+            return
+
+        if not isinstance(outcome, FilteredURL):
             self.result_label.setText("URL không hợp lệ. Vui lòng nhập đúng URL.")
             self.logger.warning(f"Invalid URL: {url}")
             QMessageBox.warning(
@@ -501,59 +369,134 @@ class MainWindow(QMainWindow):
                 QMessageBox.Ok
             )
             return
+        url = outcome.url
 
-        # Quick heuristic: detect obvious non-video URLs (TikTok photo posts, direct images)
-        lower = url.lower()
-        # common image file extensions
-        image_exts = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
-        if any(lower.endswith(ext) for ext in image_exts):
-            self.result_label.setText("URL trỏ tới hình ảnh chứ không phải video.")
-            QMessageBox.information(self, "Không phải video", "URL này trỏ tới một ảnh (không phải video). Vui lòng dán link video.")
-            self.logger.info(f"Blocked image URL: {url}")
-            return
+        # Map UI combo text to quality values
+        quality_map = {
+            "Auto (Tốt nhất)": "auto",
+            "1080p": "1080p",
+            "720p": "720p",
+            "Audio Only": "audio"
+        }
+        selected_quality = self.quality_combo.currentText()
+        quality_value = quality_map.get(selected_quality, "auto")
+        # Save quality preference
+        self.settings.set("quality", selected_quality)
 
-        # TikTok photo posts have '/photo/' in path; catch them early to avoid yt-dlp errors
-        if 'tiktok.com' in lower and '/photo/' in lower:
-            self.result_label.setText("URL TikTok này là bài ảnh, không phải video.")
-            QMessageBox.information(self, "Không phải video", "Link TikTok này là bài đăng ảnh (photo), không thể tải video từ link này. Vui lòng dán link video.")
-            self.logger.info(f"Blocked TikTok photo URL: {url}")
+        if len(self.archive) and not router_ready():
+            # The archive check resolves extractors: wait for the warm-up off the GUI thread
+            self.download_btn.setEnabled(False)
+            self.result_label.setText("Đang chuẩn bị...")
+            threading.Thread(target=self._warm_router, args=(url, quality_value), name="router-wait",
+                             daemon=True).start()
             return
+        self._confirm_and_start(url, quality_value)
+
+    def _warm_router(self, url: str, quality_value: str):
+        try:
+            get_router(self.settings.config_dir)
+        except Exception as e:
+            self.logger.warning(f"Extractor router unavailable: {e}")
+        self._router_warmed.emit(url, quality_value)
+
+    def _confirm_and_start(self, url: str, quality_value: str):
+        """Ask before re-downloading an archived video, then start the download."""
+        self.download_btn.setEnabled(True)
+        if router_ready() and self.archive.contains_url(url, quality_value):
+            answer = QMessageBox.question(
+                self,
+                "Đã tải trước đó",
+                "Video này đã được tải với chất lượng này. Tải lại?",
+                QMessageBox.Yes | QMessageBox.No,
+            )
+            if answer != QMessageBox.Yes:
+                self.result_label.setText("Bỏ qua: video đã được tải trước đó.")
+                self.logger.info(f"Skipped archived URL: {url}")
+                return
 
         # disable buttons while downloading
         self.download_btn.setEnabled(False)
         self.choose_btn.setEnabled(False)
+        self.cancel_btn.setVisible(True)
         # Show a busy/indeterminate progress bar to indicate loading (no 0% shown)
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)  # indeterminate (busy) mode
         self.result_label.setText("Bắt đầu tải...")
         self.logger.info(f"Starting download for: {url}")
+        self._queue_item = self._track_download(url, quality_value)
+
+        if self.download_engine == "asyncio":
+            # Job runs as an asyncio Task; the handle has the same signals as DownloadWorker
+            if self._async_bridge is None:
+                self._async_bridge = AsyncEngineBridge(archive=self.archive, content_index=self.content_index,
+                                                       limiter=self.limiter, disk_guard=self.disk_guard,
+                                                       format_prefs=self.format_prefs)
+            self._worker = self._async_bridge.submit(url, str(self.downloads_dir), quality_value)
+            self._worker.progress.connect(self._on_progress)
+            self._worker.finished.connect(self._on_finished)
+            return
 
         # setup worker in a QThread
         self._thread = QThread()
-        # Map UI combo text to quality values
-        quality_map = {
-            "Auto (Tốt nhất)": "auto",
-            "1080p": "1080p",
-            "720p": "720p",
-            "Audio Only": "audio"
-        }
-        selected_quality = self.quality_combo.currentText()
-        quality_value = quality_map.get(selected_quality, "auto")
-        # Save quality preference
-        self.settings.set("quality", selected_quality)
-        self._worker = DownloadWorker(url, str(self.downloads_dir), quality_value)
+        self._worker = DownloadWorker(url, str(self.downloads_dir), quality_value,
+                                      self.archive, self.content_index, self.limiter, self.disk_guard,
+                                      self.format_prefs)
         self._worker.moveToThread(self._thread)
         self._thread.started.connect(self._worker.run)
         self._worker.progress.connect(self._on_progress)
         self._worker.finished.connect(self._on_finished)
         self._thread.start()
 
+    def _track_download(self, url: str, quality: str):
+        """Add url to the queue view as the running item (a repeat replaces its old row)."""
+        if not self.queue.add_url(url, quality):
+            for index in range(len(self.queue.items) - 1, -1, -1):
+                if self.queue.items[index].url == url:
+                    self.queue.remove_item(index)
+                    break
+            self.queue.add_url(url, quality)
+        item = self.queue.items[-1]
+        self.queue.update_item(item, 0, "Bắt đầu tải...")
+        self.queue_model.mark_dirty(item)
+        self.queue_model.prefetch(item)
+        return item
+
+    def _finish_tracked(self, state: DownloadState, message: str):
+        item, self._queue_item = self._queue_item, None
+        if item is None:
+            return
+        if state == DownloadState.COMPLETED:
+            self.queue.update_item(item, 100, message)
+            self.queue.mark_completed(item)
+        elif state == DownloadState.CANCELLED:
+            self.queue.cancel_item(self.queue.index_of(item))
+        else:
+            self.queue.mark_failed(item, message)
+        self.queue_model.mark_dirty(item)
+
     def cancel_download(self):
-        # Terminate thread (not graceful but works)
+        # Trip the worker's cancel token: yt-dlp aborts on its next progress
+        # hook and any running ffmpeg child is killed, so the thread exits fast
+        if self._worker is not None:
+            try:
+                # A cancelled job's late signals must not touch the next download's UI
+                self._worker.progress.disconnect(self._on_progress)
+                self._worker.finished.disconnect(self._on_finished)
+            except (RuntimeError, TypeError):
+                pass
+            if hasattr(self._worker, "cancel"):
+                self._worker.cancel()
         if self._thread and self._thread.isRunning():
             self._thread.requestInterruption()
             self._thread.quit()
-            self._thread.wait(1000)
+            if not self._thread.wait(1000):
+                # Still inside extraction, where yt-dlp has no hook to check;
+                # keep the objects alive until the thread exits on its own
+                thread, worker = self._thread, self._worker
+                self._stale_jobs.append((thread, worker))
+                thread.finished.connect(lambda: self._stale_jobs.remove((thread, worker)))
+        self.logger.info("Download cancelled by user")
+        self._finish_tracked(DownloadState.CANCELLED, CANCELLED_MESSAGE)
         # Call cleanup if available, otherwise perform inline cleanup
         if hasattr(self, "_cleanup_after_cancel"):
             self._cleanup_after_cancel()
@@ -574,8 +517,12 @@ class MainWindow(QMainWindow):
                 self.progress_bar.setVisible(False)
             except Exception:
                 pass
+        self.result_label.setText(CANCELLED_MESSAGE)
 
     def _on_progress(self, percent: int, text: str):
+        if self._queue_item is not None:
+            self.queue.update_item(self._queue_item, max(percent, self._queue_item.progress), text)
+            self.queue_model.mark_dirty(self._queue_item)
         # If percent is 0, keep showing busy indicator (no 0% displayed)
         if percent <= 0:
             # ensure indeterminate mode while initial/convert stages
@@ -594,12 +541,22 @@ class MainWindow(QMainWindow):
         self.result_label.setText(text)
 
     def _on_finished(self, success: bool, message: str):
+        if success:
+            self._finish_tracked(DownloadState.COMPLETED, message)
+        elif message == CANCELLED_MESSAGE:
+            self._finish_tracked(DownloadState.CANCELLED, message)
+        else:
+            self._finish_tracked(DownloadState.FAILED, message)
         if success:
             self.result_label.setText(f"Tải thành công! Lưu tại: {message}")
             self.progress_bar.setRange(0, 100)
             self.progress_bar.setValue(100)
             self.url_input.clear()  # Clear input after successful download
             self.logger.info(f"Download completed: {message}")
+        elif message == CANCELLED_MESSAGE:
+            # User asked for it; partial .part file is kept so a retry resumes
+            self.result_label.setText(CANCELLED_MESSAGE)
+            self.logger.info("Download cancelled by user")
         else:
             # Strip ANSI escape sequences from yt-dlp error output
             try:
@@ -655,6 +612,7 @@ class MainWindow(QMainWindow):
             # Re-enable primary buttons
             self.download_btn.setEnabled(True)
             self.choose_btn.setEnabled(True)
+            self.cancel_btn.setVisible(False)
         except Exception:
             pass
 
@@ -685,6 +643,15 @@ class MainWindow(QMainWindow):
             })
         except Exception:
             pass
+        if self._async_bridge is not None:
+            self._async_bridge.shutdown()
+        if self.content_index is not None:
+            self.content_index.shutdown()
+        self.queue_model.shutdown()
+        save_limits(self.settings, self.limiter)
+        if self._metrics_stop is not None:
+            self._metrics_stop.set()
+            get_metrics().write_snapshot(default_log_dir() / "metrics.json")
         event.accept()
         self.download_btn.setEnabled(True)
         self.choose_btn.setEnabled(True)
@@ -1,54 +1,218 @@
 """
 Logging configuration for Download App.
-Sets up file and console logging.
+Sets up a non-blocking, rotating log pipeline (file + console) with optional
+JSON output and per-item correlation IDs.
 """
+import atexit
+import contextvars
+import json
 import logging
-from pathlib import Path
+import logging.handlers
+import queue
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+ROOT_LOGGER = "download_app"
+LOG_FILE = "app.log"
+MAX_BYTES = 5 * 1024 * 1024  # rotate when the file reaches this size...
+MAX_AGE = 24 * 60 * 60  # ...or when it has been written to for a day
+BACKUP_COUNT = 10
+RETENTION_DAYS = 14
+
+# Correlation ID of the download item the current thread/task is working on
+_item_id = contextvars.ContextVar("item_id", default="-")
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def default_log_dir() -> Path:
+    """Directory used for logs (and traces) when none is given."""
+    return Path.cwd() / "logs"
+
+
+@contextmanager
+def log_context(item_id: str) -> Iterator[None]:
+    """Tag every log record emitted in this block with ``item_id``.
+
+    Context variables follow asyncio tasks but not executor threads, so
+    code running on a pool thread should enter its own block.
+    """
+    token = _item_id.set(item_id)
+    try:
+        yield
+    finally:
+        _item_id.reset(token)
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the current item id (runs on the logging thread's caller)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "item_id"):
+            record.item_id = _item_id.get()
+        return True
 
 
-def setup_logging(log_dir: Path = None) -> logging.Logger:
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, item_id, thread, msg (+ exc)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "item_id": getattr(record, "item_id", "-"),
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RotatingLogFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotate by size or age, and delete backups past the retention period."""
+
+    def __init__(self, filename: Path, max_bytes: int = MAX_BYTES, max_age: float = MAX_AGE,
+                 backup_count: int = BACKUP_COUNT, retention_days: int = RETENTION_DAYS):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding="utf-8", delay=True)
+        self.max_age = max_age
+        self.retention_days = retention_days
+        path = Path(self.baseFilename)
+        self._opened_at = path.stat().st_mtime if path.exists() else time.time()
+        self.purge_old_logs()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.max_age and time.time() - self._opened_at >= self.max_age:
+            return Path(self.baseFilename).exists()
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self._opened_at = time.time()
+        self.purge_old_logs()
+
+    def purge_old_logs(self):
+        """Delete rotated files (and old per-launch ``app_*.log`` files) past retention."""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 24 * 60 * 60
+        base = Path(self.baseFilename)
+        for pattern in (f"{base.name}.*", "app_*.log"):
+            for old in base.parent.glob(pattern):
+                try:
+                    if old.stat().st_mtime < cutoff:
+                        old.unlink()
+                except OSError:
+                    pass
+
+
+def setup_logging(log_dir: Path = None, json_format: bool = False) -> logging.Logger:
     """Configure logging to file and console.
-    
+
+    Log calls only put the record on an in-memory queue; a background
+    QueueListener thread does the formatting and disk I/O.
+
     Args:
         log_dir: Directory to store logs. Defaults to current directory/logs.
-        
+        json_format: Write the log file as JSON lines instead of text.
+
     Returns:
         Configured logger instance.
     """
+    global _listener
+
     if log_dir is None:
-        log_dir = Path.cwd() / "logs"
-    
+        log_dir = default_log_dir()
+
     log_dir.mkdir(parents=True, exist_ok=True)
-    
+
     # Create logger
-    logger = logging.getLogger("download_app")
+    logger = logging.getLogger(ROOT_LOGGER)
     logger.setLevel(logging.DEBUG)
-    
-    # Remove any existing handlers to avoid duplicates
+
+    # Remove any existing handlers (and listener) to avoid duplicates
+    shutdown_logging()
     logger.handlers.clear()
-    
+
     # File handler (debug level, verbose format)
-    log_file = log_dir / f"app_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    file_handler = RotatingLogFileHandler(log_dir / LOG_FILE)
     file_handler.setLevel(logging.DEBUG)
-    file_format = logging.Formatter(
-        "[%(asctime)s] %(levelname)-8s [%(name)s:%(funcName)s:%(lineno)d] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    file_handler.setFormatter(file_format)
-    logger.addHandler(file_handler)
-    
+    if json_format:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(
+            "[%(asctime)s] %(levelname)-8s [%(item_id)s] [%(name)s:%(funcName)s:%(lineno)d] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        ))
+
     # Console handler (warning level, concise format)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.WARNING)
     console_format = logging.Formatter("[%(levelname)s] %(message)s")
     console_handler.setFormatter(console_format)
-    logger.addHandler(console_handler)
-    
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Filters on the QueueHandler run in the caller's thread, where the item id is set
+    queue_handler.addFilter(CorrelationFilter())
+    logger.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+
     return logger
 
 
-def get_logger(name: str = "download_app") -> logging.Logger:
-    """Get logger instance."""
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+class YtDlpLogger:
+    """yt-dlp ``logger`` option that routes its output into our pipeline.
+
+    yt-dlp's screen chatter ("[youtube] ...: Downloading webpage") goes to
+    DEBUG so it only reaches the log file; warnings and errors keep their level.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def debug(self, msg: str):
+        self.logger.debug(msg)
+
+    def info(self, msg: str):
+        self.logger.debug(msg)
+
+    def warning(self, msg: str):
+        self.logger.warning(msg)
+
+    def error(self, msg: str):
+        self.logger.error(msg)
+
+
+def get_logger(name: str = ROOT_LOGGER) -> logging.Logger:
+    """Get logger instance.
+
+    Component names ("DownloadWorker") become children of the app logger
+    ("download_app.DownloadWorker") so they share its handlers.
+    """
+    if name != ROOT_LOGGER and not name.startswith(ROOT_LOGGER + "."):
+        name = f"{ROOT_LOGGER}.{name}"
     return logging.getLogger(name)
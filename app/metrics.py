@@ -0,0 +1,229 @@
+"""
+In-process metrics for Download App.
+Counters, gauges and histograms with labels, rendered in Prometheus text
+format (daemon ``GET /metrics``) or written as periodic JSON snapshots.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds: sub-second probes up to hour-long transcodes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {_format_labels(k) or "": v for k, v in self._values.items()}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {v:g}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down per label set."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (plus sum and count) per label set."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts (+inf last), sum, count]
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                _format_labels(k) or "": {"count": s[2], "sum": round(s[1], 6)}
+                for k, s in self._values.items()
+            }
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics plus collectors that refresh gauges right before a read."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Optional[Callable[[], Any]]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def add_collector(self, callback: Callable[[], Any]):
+        """Call ``callback`` before every render/snapshot.
+
+        Bound methods are held weakly so registering an object (e.g. a
+        QueueManager) does not keep it alive.
+        """
+        if hasattr(callback, "__self__"):
+            ref = weakref.WeakMethod(callback)
+        else:
+            ref = lambda: callback  # noqa: E731
+        with self._lock:
+            self._collectors.append(ref)
+
+    def collect(self):
+        with self._lock:
+            refs = list(self._collectors)
+        for ref in refs:
+            callback = ref()
+            if callback is None:
+                with self._lock:
+                    self._collectors.remove(ref)
+                continue
+            callback()
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        self.collect()
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable view: counters/gauges by label set, histograms as count/sum."""
+        self.collect()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {"ts": time.time(), "metrics": {m.name: m.snapshot() for m in metrics}}
+
+    def write_snapshot(self, path: Path):
+        path = Path(path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp, path)
+        except IOError:
+            pass
+
+    def start_snapshots(self, path: Path, interval: float) -> threading.Event:
+        """Write a snapshot to ``path`` every ``interval`` seconds on a daemon thread.
+
+        Returns:
+            Event that stops the writer when set.
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.write_snapshot(path)
+
+        threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
+        return stop
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get the process-wide metrics registry."""
+    return _registry
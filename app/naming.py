@@ -0,0 +1,372 @@
+"""
+Output naming for Download App.
+Turns resolved video titles into safe file names that are unique within
+their download directory. Names already on disk are listed once per
+directory into an in-memory index, so picking "Title (2)" never probes
+the filesystem candidate by candidate. Processes sharing a directory
+keep their indexes in step through one journal file per directory,
+appended to under an OS file lock.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Set
+
+from .logger import get_logger
+from .security import sanitize_filename, truncate_bytes
+
+
+NAME_MAX_BYTES = 255
+# Room left after the stem for what yt-dlp and ffmpeg append: ".f137.mp4.part", ".tmp.mp4", ".webp"
+SUFFIX_HEADROOM = 24
+STEM_MAX_BYTES = NAME_MAX_BYTES - SUFFIX_HEADROOM
+# Work files of an unfinished download: the scan leaves their stems free so
+# a retry can resume them (the attempt's journal entry still guards the name)
+PARTIAL_SUFFIXES = (".part", ".ytdl", ".temp")
+# Per-name placeholders written by earlier versions; the scan migrates or removes them
+CLAIM_SUFFIX = ".claim"
+# Shared by every process writing to the directory: a generation header, then one JSON entry per line
+JOURNAL_NAME = ".download-app-names"
+GENERATION_WIDTH = 12
+# Rewrite the journal without finished claims once it holds this many lines (and mostly garbage)
+COMPACT_LINES = 10000
+DEFAULT_TITLE = "download"
+
+CLAIMED, FAILED, DONE = "claim", "failed", "done"
+
+
+def name_key(stem: str) -> str:
+    """Index key of a stem: NFC + casefold, since Windows and macOS compare names case-insensitively."""
+    return unicodedata.normalize("NFC", stem).casefold()
+
+
+def stem_of(filename: str) -> str:
+    """Stem a file name occupies: "Title.mp4.part" -> "Title"."""
+    while filename.endswith(PARTIAL_SUFFIXES):
+        filename = filename.rsplit(".", 1)[0]
+    return filename.rsplit(".", 1)[0] if "." in filename else filename
+
+
+def numbered(base: str, number: int) -> str:
+    """base with a " (n)" counter, cut so the result still fits STEM_MAX_BYTES."""
+    suffix = f" ({number})"
+    return truncate_bytes(base, STEM_MAX_BYTES - len(suffix)).rstrip(". ") + suffix
+
+
+if sys.platform == 'win32':
+    import msvcrt
+
+    def _lock_file(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after ~10 s; another process is still claiming
+                continue
+
+    def _unlock_file(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _pid_alive(pid: int) -> bool:
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+else:
+    import fcntl
+
+    def _lock_file(fd: int):
+        # lockf (POSIX record lock) rather than flock: it also holds on NFS shares
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+
+    def _unlock_file(fd: int):
+        fcntl.lockf(fd, fcntl.LOCK_UN)
+
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+
+_HOSTNAME = socket.gethostname()
+
+
+def _holder() -> str:
+    return f"{_HOSTNAME}:{os.getpid()}"
+
+
+def _holder_dead(holder: str) -> bool:
+    """True if holder ("host:pid") is a process on this host that no longer runs."""
+    host, _, pid = holder.rpartition(":")
+    return host == _HOSTNAME and pid.isdigit() and not _pid_alive(int(pid))
+
+
+class OutputNamer:
+    """Assign unique file stems within one directory.
+
+    The index holds the stems of every file present when the directory is
+    first used, plus every stem claimed since, by this process or by any
+    other writing to the same directory (pool children, queue workers on
+    other hosts). Claims are appended to the directory's journal while
+    its file lock is held; each claim first reads the entries appended
+    since its last visit, so the lock and the journal tail are the only
+    I/O per name. A per-title counter remembers the last number used, so
+    even the 1000th "Untitled" gets its name in constant time.
+    """
+
+    def __init__(self, directory: Path, normalize: Optional[Callable[[str], str]] = None):
+        """Index directory.
+
+        Args:
+            directory: Download directory (need not exist yet).
+            normalize: What the downloader does to a name before writing it
+                (yt-dlp's own sanitizer); the index stores the result.
+        """
+        self.directory = Path(directory)
+        self.normalize = normalize
+        self._taken: Set[str] = set()
+        self._next: Dict[str, int] = {}  # base key -> next counter to try
+        self._entries: Dict[str, List[str]] = {}  # stem -> its live journal entry (claimed or failed)
+        self._owners: Dict[str, str] = {}  # claim key -> stem, for resuming a failed download
+        self._fd: Optional[int] = None
+        self._generation = -1
+        self._offset = 0
+        self._lines = 0
+        self._lock = threading.Lock()
+        self.logger = get_logger("OutputNamer")
+        self._scan()
+
+    def _final(self, stem: str) -> str:
+        return self.normalize(stem) if self.normalize else stem
+
+    def _scan(self):
+        on_disk: Set[str] = set()  # stems with any file, partials included
+        placeholders = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name == JOURNAL_NAME:
+                        continue
+                    if name.endswith(CLAIM_SUFFIX):
+                        placeholders.append(name)
+                        continue
+                    stem = name_key(stem_of(name))
+                    on_disk.add(stem)
+                    if not name.endswith(PARTIAL_SUFFIXES):
+                        self._taken.add(stem)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            self.logger.warning(f"Could not list {self.directory} for output names: {e}")
+            return
+        with self._journal():
+            self._migrate(placeholders, on_disk)
+            # Failed attempts that left no file, and claims of processes that died, no longer hold a name
+            changed = False
+            for stem, entry in list(self._entries.items()):
+                if entry[0] != FAILED and not _holder_dead(entry[3]):
+                    continue
+                key = name_key(self._final(stem))
+                if key not in on_disk:
+                    self._drop(stem)
+                    self._taken.discard(key)
+                    changed = True
+                elif entry[0] != FAILED:
+                    self._entries[stem] = [FAILED, stem, entry[2], ""]
+                    changed = True
+            if changed or self._lines > len(self._entries):
+                self._compact()
+
+    def _migrate(self, placeholders: List[str], on_disk: Set[str]):
+        """Turn per-name .claim files into journal entries (resumable) or delete them (orphans)."""
+        for name in placeholders:
+            path = self.directory / name
+            stem = name[:-len(CLAIM_SUFFIX)]
+            if name_key(stem) in on_disk and stem not in self._entries:
+                try:
+                    owner = path.read_text(encoding="utf-8")
+                except (OSError, ValueError):
+                    owner = ""
+                self._append([FAILED, stem, owner, ""])
+            try:
+                path.unlink()
+            except OSError as e:
+                self.logger.warning(f"Could not remove {name}: {e}")
+
+    @contextmanager
+    def _journal(self) -> Iterator[None]:
+        """Hold the directory's file lock with the index brought up to date (self._lock held)."""
+        if self._fd is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            flags = os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+            self._fd = os.open(self.directory / JOURNAL_NAME, flags, 0o644)
+        _lock_file(self._fd)
+        try:
+            self._catch_up()
+            yield
+        finally:
+            _unlock_file(self._fd)
+
+    def _catch_up(self):
+        """Apply the entries other processes appended since this one last held the lock."""
+        fd = self._fd
+        os.lseek(fd, 0, os.SEEK_SET)
+        header = os.read(fd, GENERATION_WIDTH + 1)
+        if not header:
+            header = f"{0:0{GENERATION_WIDTH}d}\n".encode()
+            os.write(fd, header)
+        generation = int(header)
+        if generation != self._generation:
+            # Compacted by another process: re-read from the top (names already taken stay taken)
+            self._generation = generation
+            self._offset = GENERATION_WIDTH + 1
+            self._entries.clear()
+            self._owners.clear()
+            self._lines = 0
+        os.lseek(fd, self._offset, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        if not chunks:
+            return
+        data = b"".join(chunks)
+        end = data.rfind(b"\n") + 1  # a crash mid-write leaves a partial last line
+        self._offset += end
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, TypeError, IndexError):
+                continue
+            self._lines += 1
+
+    def _apply(self, entry: List[str]):
+        op, stem = entry[0], entry[1]
+        if op == DONE:
+            self._drop(stem)
+            return
+        self._taken.add(name_key(self._final(stem)))
+        previous = self._entries.get(stem)
+        if previous is not None and previous[2] and previous[2] != entry[2]:
+            self._owners.pop(previous[2], None)
+        self._entries[stem] = entry
+        if entry[2]:
+            self._owners[entry[2]] = stem
+
+    def _drop(self, stem: str):
+        entry = self._entries.pop(stem, None)
+        if entry is not None and entry[2] and self._owners.get(entry[2]) == stem:
+            del self._owners[entry[2]]
+
+    def _append(self, entry: List[str]):
+        os.write(self._fd, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._offset = os.lseek(self._fd, 0, os.SEEK_END)
+        self._apply(entry)
+        self._lines += 1
+
+    def _compact(self):
+        """Rewrite the journal with only the live entries, under a new generation (file lock held)."""
+        self._generation += 1
+        lines = [f"{self._generation:0{GENERATION_WIDTH}d}\n"]
+        lines += [json.dumps(entry, ensure_ascii=False) + "\n" for entry in self._entries.values()]
+        data = "".join(lines).encode("utf-8")
+        os.ftruncate(self._fd, 0)
+        os.write(self._fd, data)
+        self._offset = len(data)
+        self._lines = len(self._entries)
+
+    def claim(self, title: Optional[str], key: Optional[Hashable] = None) -> str:
+        """Reserve a unique stem for title, for this and every other process using the directory.
+
+        Args:
+            title: Resolved title (anything; it is sanitized here).
+            key: Identity of the download (e.g. extractor and video id). A
+                retry with the same key gets the same stem back, so it can
+                resume its .part file (across processes and restarts too,
+                through the journal entry a failed attempt leaves).
+
+        Returns:
+            The stem to put in the output template (before ``normalize``).
+            Pass it to ``release`` when the download is over.
+        """
+        base = sanitize_filename(title or DEFAULT_TITLE, STEM_MAX_BYTES)
+        base_key = name_key(self._final(base))
+        owner = str(key) if key is not None else ""
+        with self._lock, self._journal():
+            stem = self._owners.get(owner) if owner else None
+            if stem is not None:
+                if self._entries[stem][0] == FAILED:
+                    self._append([CLAIMED, stem, owner, _holder()])
+                return stem
+            stem = base
+            if base_key in self._taken:
+                number = self._next.get(base_key, 1)
+                while True:
+                    stem = numbered(base, number)
+                    number += 1
+                    if name_key(self._final(stem)) not in self._taken:
+                        break
+                self._next[base_key] = number
+            self._append([CLAIMED, stem, owner, _holder()])
+            if self._lines > COMPACT_LINES and self._lines > 4 * len(self._entries):
+                self._compact()
+        return stem
+
+    def release(self, stem: str, key: Optional[Hashable] = None, completed: bool = True):
+        """The download that claimed stem is over.
+
+        A completed download leaves its file, which keeps the name taken.
+        A failed one keeps its claim under its key, so a retry resumes its
+        partial files and nobody else takes the name; the next scan of the
+        directory frees the name if the attempt left no file at all.
+        """
+        with self._lock, self._journal():
+            entry = self._entries.get(stem)
+            if entry is None:
+                return
+            if completed:
+                self._append([DONE, stem])
+            else:
+                self._append([FAILED, stem, entry[2], ""])
+
+    def is_taken(self, stem: str) -> bool:
+        with self._lock:
+            return name_key(self._final(stem)) in self._taken
+
+    def close(self):
+        """Close the journal file; the namer must not be used afterwards."""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+_namers: Dict[Path, OutputNamer] = {}
+_namers_lock = threading.Lock()
+
+
+def get_namer(directory: Path, normalize: Optional[Callable[[str], str]] = None) -> OutputNamer:
+    """Process-wide namer for directory, so concurrent jobs share one index."""
+    path = Path(os.path.abspath(directory))
+    with _namers_lock:
+        namer = _namers.get(path)
+        if namer is None:
+            namer = _namers[path] = OutputNamer(path, normalize)
+        return namer
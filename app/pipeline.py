@@ -0,0 +1,199 @@
+"""
+Staged download pipeline for Download App.
+Extract, download, probe, transcode and publish run on separate thread
+pools joined by bounded queues: the network and the CPU stay busy at the
+same time, and a full transcode queue holds downloads back instead of growing.
+"""
+import queue
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .cancellation import DownloadCancelled
+from .logger import get_logger, log_context
+from .metrics import get_metrics
+from .worker import DownloadJob, ACTIVE_JOBS
+
+
+EXTRACT = "extract"
+DOWNLOAD = "download"
+PROBE = "probe"
+TRANSCODE = "transcode"
+PUBLISH = "publish"
+STAGES = (EXTRACT, DOWNLOAD, PROBE, TRANSCODE, PUBLISH)
+# Extract and download wait on the network, transcode is CPU bound
+DEFAULT_WORKERS = {EXTRACT: 2, DOWNLOAD: 3, PROBE: 1, TRANSCODE: 1, PUBLISH: 1}
+DEFAULT_QUEUE_SIZE = 4
+POLL_SECONDS = 0.5
+
+STAGE_QUEUED = get_metrics().gauge("download_pipeline_queued", "Jobs waiting for each pipeline stage")
+STAGE_BUSY = get_metrics().gauge("download_pipeline_busy", "Pipeline workers busy per stage")
+
+# Called once per job with (final path, None) or (None, exception)
+DoneCallback = Callable[[Optional[str], Optional[BaseException]], None]
+
+
+@dataclass
+class PipelineTask:
+    """A job travelling through the stages."""
+    job: DownloadJob
+    on_done: Optional[DoneCallback] = None
+    src: Optional[Path] = None
+    final_path: Optional[str] = None
+
+
+class PipelineExecutor:
+    """Run DownloadJobs through per-stage thread pools with bounded handoff queues.
+
+    A stage worker hands a job to the next stage with a blocking put, so a
+    slow stage backs up into the ones before it (down to ``submit``).
+    """
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """Start the stage threads.
+
+        Args:
+            workers: Threads per stage (missing stages use DEFAULT_WORKERS).
+            queue_size: Jobs that may wait in front of each stage.
+        """
+        self.workers = dict(DEFAULT_WORKERS, **(workers or {}))
+        self._queues: Dict[str, queue.Queue] = {stage: queue.Queue(maxsize=queue_size) for stage in STAGES}
+        self._busy = {stage: 0 for stage in STAGES}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._steps = {
+            EXTRACT: self._extract,
+            DOWNLOAD: self._download,
+            PROBE: self._probe,
+            TRANSCODE: self._transcode,
+            PUBLISH: self._publish,
+        }
+        self._threads = []
+        for stage in STAGES:
+            for i in range(max(1, int(self.workers[stage]))):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"pipeline-{stage}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self.logger = get_logger("PipelineExecutor")
+        get_metrics().add_collector(self.collect_metrics)
+
+    def submit(self, job: DownloadJob, on_done: Optional[DoneCallback] = None):
+        """Queue a job at the extract stage; blocks while that stage is full."""
+        ACTIVE_JOBS.inc()
+        self._put(EXTRACT, PipelineTask(job, on_done))
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the stage threads; jobs still queued finish as cancelled."""
+        self._stopped.set()
+        for inbox in self._queues.values():
+            while True:
+                try:
+                    task = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                task.job.cancel_token.cancel()
+                self._finish(task, DownloadCancelled())
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def collect_metrics(self):
+        """Publish queue depth and busy workers per stage."""
+        for stage, inbox in self._queues.items():
+            STAGE_QUEUED.set(inbox.qsize(), stage=stage)
+            STAGE_BUSY.set(self._busy[stage], stage=stage)
+
+    def _put(self, stage: str, task: PipelineTask):
+        inbox = self._queues[stage]
+        while True:
+            if self._stopped.is_set():
+                self._finish(task, DownloadCancelled())
+                return
+            try:
+                inbox.put(task, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def _worker(self, stage: str):
+        inbox = self._queues[stage]
+        step = self._steps[stage]
+        while not self._stopped.is_set():
+            try:
+                task = inbox.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._busy[stage] += 1
+            try:
+                with log_context(task.job.trace.item_id):
+                    task.job.cancel_token.raise_if_cancelled()
+                    next_stage = step(task)
+            except Exception as e:
+                self._finish(task, e)
+                continue
+            finally:
+                with self._lock:
+                    self._busy[stage] -= 1
+            if next_stage is None:
+                self._finish(task, None)
+            else:
+                self._put(next_stage, task)
+
+    def _extract(self, task: PipelineTask) -> str:
+        task.job.extract()
+        return DOWNLOAD
+
+    def _download(self, task: PipelineTask) -> str:
+        task.src = task.job.download()
+        if task.src is None or not task.src.exists():
+            task.src = None
+            task.final_path = str(Path(task.job.outdir))
+            return PUBLISH
+        return PROBE
+
+    def _probe(self, task: PipelineTask) -> str:
+        if task.job.audio_only:
+            # No video stream to probe; the transcode stage tags it instead
+            return TRANSCODE
+        if task.job.probe(task.src):
+            return TRANSCODE
+        self.logger.info(f"Video is not HEVC; keeping original: {task.src}")
+        task.final_path = str(task.src)
+        return PUBLISH
+
+    def _transcode(self, task: PipelineTask) -> str:
+        if task.job.audio_only:
+            task.final_path = task.job.tag_audio(task.src)
+            return PUBLISH
+        # Reuses a cached H.264 output of an identical source when there is one
+        task.final_path = task.job.transcode(task.src)
+        return PUBLISH
+
+    def _publish(self, task: PipelineTask) -> None:
+        if task.src is not None:
+            task.job.index_output(task.final_path)
+        return None
+
+    def _finish(self, task: PipelineTask, error: Optional[BaseException]):
+        job = task.job
+        if error is not None and job.cancel_token.cancelled and not isinstance(error, DownloadCancelled):
+            # yt-dlp may wrap the hook exception; the token is authoritative
+            error = DownloadCancelled()
+        if error is None:
+            status = "ok"
+        elif isinstance(error, DownloadCancelled):
+            status = "cancelled"
+        else:
+            status = "failed"
+        job.close()
+        job.release_slot()
+        job.release_space()
+        ACTIVE_JOBS.dec()
+        job.trace.finish(status, quality=job.quality, engine="pipeline", format=job.format_id,
+                         error=type(error).__name__ if status == "failed" else None)
+        if task.on_done:
+            try:
+                task.on_done(task.final_path if error is None else None, error)
+            except Exception:
+                self.logger.exception(f"Completion callback failed for {job.url}")
@@ -0,0 +1,161 @@
+"""
+Playlist and channel expansion for Download App.
+Streams entries into the queue with yt-dlp flat extraction as they are discovered.
+"""
+import urllib.parse
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .cancellation import CancelToken
+from .logger import get_logger
+from .queue_manager import QueueManager
+from .security import validate_url
+from .url_filter import FilteredURL, UrlPrefilter, classify_site
+
+
+# Path fragments that mean "many videos" on the big platforms
+PLAYLIST_PATH_MARKERS = ("/playlist", "/channel/", "/c/", "/user/", "/@")
+# YouTube channel tabs ("/<channel>/videos"); elsewhere "/videos/<id>" is one video
+CHANNEL_TABS = ("/videos", "/shorts", "/streams")
+# Path fragments that mean "one video" even under a channel/user path
+SINGLE_VIDEO_MARKERS = ("/watch", "/video/", "/shorts/", "/reel/", "/p/")
+
+# How many url → url redirects (e.g. channel → /videos tab) to follow
+MAX_REDIRECTS = 3
+
+
+def looks_like_playlist(url: str) -> bool:
+    """Cheap offline guess whether a URL is a playlist/channel rather than one video."""
+    parsed = urllib.parse.urlparse(url.strip())
+    path = parsed.path.lower()
+    query = urllib.parse.parse_qs(parsed.query)
+    if "list" in query and "v" not in query:
+        return True
+    if any(marker in path for marker in SINGLE_VIDEO_MARKERS):
+        return False
+    if path.rstrip("/").endswith(CHANNEL_TABS) and classify_site(parsed.hostname or "") == "youtube":
+        return True
+    return any(marker in path for marker in PLAYLIST_PATH_MARKERS)
+
+
+def _entry_url(entry: Dict[str, Any]) -> Optional[str]:
+    """Return a downloadable URL for a flat playlist entry."""
+    for key in ("webpage_url", "url", "original_url"):
+        value = entry.get(key)
+        if value and validate_url(value):
+            return value
+    return None
+
+
+class PlaylistExpander:
+    """Expand playlist/channel URLs lazily with yt-dlp flat extraction.
+
+    Entries are yielded as yt-dlp pages through the listing, so callers
+    can start downloading the first item long before the last page of a
+    large channel has been fetched.
+    """
+
+    def __init__(self, cancel_token: Optional[CancelToken] = None):
+        self.cancel_token = cancel_token or CancelToken()
+        self.logger = get_logger("PlaylistExpander")
+
+    def _ydl_opts(self) -> Dict[str, Any]:
+        return {
+            # Only list entries; never resolve formats of each video
+            "extract_flat": "in_playlist",
+            # Page through the listing on demand instead of all up front
+            "lazy_playlist": True,
+            "skip_download": True,
+            "quiet": True,
+            "no_warnings": True,
+        }
+
+    def iter_entries(self, url: str) -> Iterator[str]:
+        """Yield video URLs of a playlist/channel as they are discovered.
+
+        A URL that resolves to a single video yields itself.
+        """
+        for entry_url, _ in self._iter_entries(url):
+            yield entry_url
+
+    def _iter_entries(self, url: str) -> Iterator[Tuple[str, Optional[float]]]:
+        """Yield (video URL, duration if the listing has it) per entry."""
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL(self._ydl_opts()) as ydl:
+            yield from self._walk(ydl, url, depth=0)
+
+    def _walk(self, ydl, url: str, depth: int) -> Iterator[Tuple[str, Optional[float]]]:
+        self.cancel_token.raise_if_cancelled()
+        info = ydl.extract_info(url, download=False, process=False)
+        result_type = info.get("_type", "video")
+
+        if result_type in ("url", "url_transparent"):
+            target = info.get("url")
+            if depth < MAX_REDIRECTS and target and target != url:
+                yield from self._walk(ydl, target, depth + 1)
+            else:
+                yield url, None
+            return
+
+        if result_type != "playlist":
+            yield info.get("webpage_url") or url, info.get("duration")
+            return
+
+        # entries is a generator/PagedList here; iterating it fetches pages lazily
+        for entry in info.get("entries") or []:
+            self.cancel_token.raise_if_cancelled()
+            if not entry:
+                continue
+            entry_type = entry.get("_type", "video")
+            entry_url = _entry_url(entry)
+            if entry_type == "playlist" or (entry_type == "url" and (entry.get("ie_key") or "").endswith("Tab")):
+                # Channel tabs / nested playlists: expand in place
+                if entry_url and depth < MAX_REDIRECTS:
+                    yield from self._walk(ydl, entry_url, depth + 1)
+                continue
+            if entry_url:
+                # Flat listings often carry the duration: free input for the scheduler
+                yield entry_url, entry.get("duration")
+
+    def expand_into(
+        self,
+        queue: QueueManager,
+        url: str,
+        quality: str = "auto",
+        on_added: Optional[Callable[[int], None]] = None,
+        lock=None,
+        priority: int = 0,
+    ) -> int:
+        """Stream the entries of url into queue, skipping URLs already queued.
+
+        Entries go through the same UrlPrefilter as pasted URLs (normalized,
+        non-videos and repeats within the listing dropped).
+
+        Args:
+            queue: Queue to add entries to.
+            url: Playlist, channel or single video URL.
+            quality: Quality preset for every entry.
+            on_added: Called with the new item's index after each add.
+            lock: Optional lock held around each queue mutation.
+            priority: User priority for every entry.
+
+        Returns:
+            Number of entries added.
+        """
+        added = 0
+        guard = lock if lock is not None else nullcontext()
+        prefilter = UrlPrefilter()
+        for entry_url, duration in self._iter_entries(url):
+            outcome = prefilter.check(entry_url)
+            if not isinstance(outcome, FilteredURL):
+                self.logger.debug(f"Skipping playlist entry {entry_url}: {outcome}")
+                continue
+            with guard:
+                if not queue.add_url(outcome.url, quality, priority, duration=duration):
+                    continue
+                if on_added:
+                    on_added(len(queue.items) - 1)
+            added += 1
+        self.logger.info(f"Expanded {url}: {added} new entries")
+        return added
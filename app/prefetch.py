@@ -0,0 +1,365 @@
+"""
+Metadata and thumbnail prefetch for Download App.
+Queued items get their title, duration, estimated size and a downscaled
+thumbnail fetched in the background (bounded worker pool) and kept in a
+size-limited LRU cache in memory and on disk, so a queue view can draw
+rows without touching the network and the scheduler can use the estimates.
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .cancellation import CancelToken
+from .disk_space import estimate_bytes
+from .extractor_routes import GENERIC, get_router, is_routing_error
+from .format_select import FormatPreferences, FormatSelector
+from .logger import get_logger, YtDlpLogger
+from .metrics import get_metrics
+from .rate_control import AdaptiveConcurrency, is_throttle_error, site_key
+
+
+DEFAULT_MEMORY_ENTRIES = 5000
+DEFAULT_DISK_BYTES = 200 * 2**20
+DEFAULT_WORKERS = 2
+DEFAULT_PENDING = 1000
+THUMBNAIL_WIDTH = 160  # px; thumbnails are stored as JPEGs this wide
+THUMBNAIL_MAX_BYTES = 4 * 2**20
+FETCH_TIMEOUT = 15
+
+PREFETCH_TOTAL = get_metrics().counter("download_prefetch_total", "Metadata prefetches by result")
+
+# Called with (url, metadata) once an entry is fetched
+ReadyCallback = Callable[[str, "ItemMetadata"], None]
+
+
+@dataclass
+class ItemMetadata:
+    """What a queue row needs to render, plus the scheduler's estimates."""
+    url: str
+    title: Optional[str] = None
+    duration: Optional[float] = None
+    filesize: Optional[int] = None  # estimated bytes for the chosen formats
+    thumbnail: Optional[str] = None  # path of the downscaled JPEG, if any
+    fetched_at: float = 0.0
+    error: Optional[str] = None
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def downscale_thumbnail(data: bytes, dest: Path, width: int = THUMBNAIL_WIDTH) -> bool:
+    """Write a JPEG of data scaled to width (aspect kept). Returns False if it is not an image.
+
+    QImage (not QPixmap) is safe to use off the GUI thread.
+    """
+    from PySide6.QtCore import Qt
+    from PySide6.QtGui import QImage
+
+    image = QImage()
+    if not image.loadFromData(data) or image.isNull():
+        return False
+    if image.width() > width:
+        image = image.scaledToWidth(width, Qt.SmoothTransformation)
+    return image.save(str(dest), "JPG", 80)
+
+
+class MetadataCache:
+    """Two-level LRU cache of ItemMetadata keyed by URL.
+
+    The memory level holds up to ``max_entries``; the disk level keeps one
+    JSON file (and one thumbnail) per URL and evicts the least recently
+    used files once they exceed ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 max_bytes: int = DEFAULT_DISK_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, ItemMetadata]" = OrderedDict()
+        # key -> (last use, bytes on disk); the disk LRU order
+        self._disk: Dict[str, List[float]] = {}
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.logger = get_logger("MetadataCache")
+        self._scan()
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def thumbnail_path(self, url: str) -> Path:
+        return self.cache_dir / f"{cache_key(url)}.jpg"
+
+    def _scan(self):
+        """Rebuild the disk LRU bookkeeping from file times and sizes."""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            entries = list(os.scandir(self.cache_dir))
+        except OSError as e:
+            self.logger.warning(f"Metadata cache disabled on disk ({self.cache_dir}): {e}")
+            return
+        for entry in entries:
+            key, _, ext = entry.name.partition(".")
+            if ext not in ("json", "jpg"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            used, size = self._disk.get(key, (0.0, 0))
+            self._disk[key] = [max(used, stat.st_mtime), size + stat.st_size]
+            self._disk_bytes += stat.st_size
+
+    def get(self, url: str) -> Optional[ItemMetadata]:
+        """Cached metadata for url (memory first, then disk), or None."""
+        key = cache_key(url)
+        with self._lock:
+            meta = self._memory.get(key)
+            if meta is not None:
+                self._memory.move_to_end(key)
+                return meta
+            if key not in self._disk:
+                return None
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                meta = ItemMetadata(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        if meta.thumbnail and not Path(meta.thumbnail).exists():
+            meta.thumbnail = None
+        with self._lock:
+            self._remember(key, meta)
+            if key in self._disk:
+                self._disk[key][0] = time.time()
+        return meta
+
+    def peek(self, url: str) -> Optional[ItemMetadata]:
+        """Metadata for url from the memory level only (never touches the disk; safe on the GUI thread)."""
+        key = cache_key(url)
+        with self._lock:
+            meta = self._memory.get(key)
+            if meta is not None:
+                self._memory.move_to_end(key)
+            return meta
+
+    def put(self, meta: ItemMetadata):
+        """Store meta in memory and on disk (its thumbnail file must already be written)."""
+        key = cache_key(meta.url)
+        if meta.error:
+            # Failures may be transient: remember them for this session only
+            with self._lock:
+                self._remember(key, meta)
+            return
+        size = 0
+        try:
+            data = json.dumps(asdict(meta), ensure_ascii=False).encode("utf-8")
+            with open(self._meta_path(key), "wb") as f:
+                f.write(data)
+            size = len(data)
+            if meta.thumbnail:
+                size += Path(meta.thumbnail).stat().st_size
+        except OSError as e:
+            self.logger.debug(f"Could not write metadata cache entry: {e}")
+        with self._lock:
+            self._remember(key, meta)
+            _, old = self._disk.pop(key, (0.0, 0))
+            self._disk[key] = [time.time(), size]
+            self._disk_bytes += size - old
+            victims = self._evict_disk()
+        for victim in victims:
+            for path in (self._meta_path(victim), self.cache_dir / f"{victim}.jpg"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _remember(self, key: str, meta: ItemMetadata):
+        self._memory[key] = meta
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> List[str]:
+        """Pick least recently used keys until the disk level fits (lock held)."""
+        if self._disk_bytes <= self.max_bytes:
+            return []
+        victims = []
+        for key, (_, size) in sorted(self._disk.items(), key=lambda kv: kv[1][0]):
+            if self._disk_bytes <= self.max_bytes * 0.9:
+                break
+            victims.append(key)
+            self._disk_bytes -= size
+            del self._disk[key]
+            self._memory.pop(key, None)
+        return victims
+
+
+class MetadataPrefetcher:
+    """Fetch metadata for queued URLs on a small pool of daemon threads.
+
+    ``request`` never blocks: URLs in the memory cache are answered at once,
+    others are queued (up to ``max_pending``; beyond that the request is
+    dropped and can simply be made again later). A queued URL is looked up
+    in the disk cache on the prefetch thread before anything is fetched.
+    Extractions take the same per-site slots as downloads, so prefetching
+    a long queue does not hammer a site (or dodge its backoff).
+    """
+
+    def __init__(self, cache: MetadataCache, workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_PENDING,
+                 format_prefs: Optional[FormatPreferences] = None, limiter: Optional[AdaptiveConcurrency] = None):
+        self.cache = cache
+        self.format_prefs = format_prefs
+        self.limiter = limiter
+        self._pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        # url -> callbacks waiting for it (dedups concurrent requests)
+        self._waiting: Dict[str, List[Optional[ReadyCallback]]] = {}
+        self._lock = threading.Lock()
+        self._token = CancelToken()
+        self.logger = get_logger("MetadataPrefetcher")
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"prefetch-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, url: str, quality: str = "auto",
+                on_ready: Optional[ReadyCallback] = None) -> Optional[ItemMetadata]:
+        """Return metadata for url from memory, or schedule a load/fetch and return None.
+
+        on_ready is called on a prefetch thread once the disk cache or the
+        fetch answered (not at all if the request was dropped or the
+        prefetcher stopped).
+        """
+        meta = self.cache.peek(url)
+        if meta is not None:
+            return meta
+        with self._lock:
+            waiting = self._waiting.get(url)
+            if waiting is not None:
+                waiting.append(on_ready)
+                return None
+            try:
+                self._pending.put_nowait((url, quality))
+            except queue.Full:
+                PREFETCH_TOTAL.inc(result="dropped")
+                return None
+            self._waiting[url] = [on_ready]
+        return None
+
+    def shutdown(self):
+        """Stop the workers; fetches in progress are abandoned."""
+        self._token.cancel()
+        for _ in self._threads:
+            try:
+                self._pending.put_nowait(None)
+            except queue.Full:
+                break
+
+    def _worker(self):
+        while not self._token.cancelled:
+            task = self._pending.get()
+            if task is None:
+                return
+            url, quality = task
+            meta = self.cache.get(url)
+            if meta is None:
+                try:
+                    meta = self.fetch(url, quality)
+                    PREFETCH_TOTAL.inc(result="ok" if meta.error is None else "failed")
+                except Exception as e:
+                    meta = ItemMetadata(url, fetched_at=time.time(), error=str(e))
+                    PREFETCH_TOTAL.inc(result="failed")
+                if self._token.cancelled:
+                    return
+                self.cache.put(meta)
+            with self._lock:
+                callbacks = self._waiting.pop(url, [])
+            for callback in callbacks:
+                if callback is None:
+                    continue
+                try:
+                    callback(url, meta)
+                except Exception:
+                    self.logger.exception(f"Prefetch callback failed for {url}")
+
+    def fetch(self, url: str, quality: str = "auto") -> ItemMetadata:
+        """Extract url's metadata (no download) and cache a downscaled thumbnail."""
+        import yt_dlp
+
+        opts = {
+            "quiet": True,
+            "noprogress": True,
+            "noplaylist": True,
+            "skip_download": True,
+            # Same ranking as the download, so the size estimate matches what will be fetched
+            "format": FormatSelector(quality, self.format_prefs),
+            "logger": YtDlpLogger(get_logger("yt_dlp")),
+            "socket_timeout": FETCH_TIMEOUT,
+        }
+        ie_key = get_router().resolve_key(url)
+        site = site_key(url)
+        if self.limiter is not None:
+            self.limiter.acquire(site, self._token)
+        error = None
+        try:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                try:
+                    info = ydl.extract_info(url, download=False, ie_key=ie_key)
+                except Exception as e:
+                    # Stale route: let yt-dlp pick the extractor (see DownloadJob._extract)
+                    if ie_key == GENERIC or not is_routing_error(str(e)):
+                        raise
+                    info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            if self.limiter is not None:
+                # Not a download: only a throttle response feeds back into the site's limit
+                self.limiter.release(site, False, error=error if error and is_throttle_error(error) else None)
+        meta = ItemMetadata(
+            url,
+            title=info.get("title"),
+            duration=info.get("duration"),
+            filesize=estimate_bytes(info),
+            fetched_at=time.time(),
+        )
+        thumb_url = self._pick_thumbnail(info)
+        if thumb_url and thumb_url.startswith(("http://", "https://")) and not self._token.cancelled:
+            dest = self.cache.thumbnail_path(url)
+            try:
+                if downscale_thumbnail(self._download_thumbnail(thumb_url), dest):
+                    meta.thumbnail = str(dest)
+            except Exception as e:
+                self.logger.debug(f"Thumbnail fetch failed for {url}: {e}")
+        return meta
+
+    @staticmethod
+    def _pick_thumbnail(info: Dict[str, Any]) -> Optional[str]:
+        """Smallest thumbnail at least THUMBNAIL_WIDTH wide (else the largest), to save bandwidth."""
+        thumbs = [t for t in info.get("thumbnails") or [] if t.get("url")]
+        if not thumbs:
+            return info.get("thumbnail")
+        wide = [t for t in thumbs if (t.get("width") or 0) >= THUMBNAIL_WIDTH]
+        if wide:
+            return min(wide, key=lambda t: t["width"])["url"]
+        return max(thumbs, key=lambda t: (t.get("width") or 0, t.get("preference") or 0))["url"]
+
+    @staticmethod
+    def _download_thumbnail(thumb_url: str) -> bytes:
+        request = urllib.request.Request(thumb_url, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(THUMBNAIL_MAX_BYTES + 1)
+        if len(data) > THUMBNAIL_MAX_BYTES:
+            raise ValueError("thumbnail too large")
+        return data
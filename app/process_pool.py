@@ -0,0 +1,424 @@
+"""
+Process-pool execution mode for Download App.
+Each job runs in a reused child process with its own YoutubeDL, so
+extraction, manifest parsing and hashing of several jobs use several cores
+instead of contending for one GIL. Progress and log records come back to
+the parent over a multiprocessing queue.
+"""
+import concurrent.futures
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .cancellation import CancelToken, DownloadCancelled
+from .disk_space import InsufficientDiskSpace, Reservation
+from .format_select import FormatPreferences
+from .logger import ROOT_LOGGER, CorrelationFilter, get_logger, log_context
+from .metrics import get_metrics
+from .pipeline import DoneCallback
+from .tracing import PHASE_SECONDS, get_tracer
+from .worker import DownloadJob, ACTIVE_JOBS, BYTES_TOTAL, warm_up
+
+
+DEFAULT_QUEUE_SIZE = 4  # jobs submitted on top of the ones running
+CANCEL_POLL_SECONDS = 0.5
+
+POOL_BUSY = get_metrics().gauge("download_process_pool_busy", "Jobs running in pool processes")
+
+# Child-side state, set by _init_child
+_events = None
+
+
+class _EventQueueHandler(logging.handlers.QueueHandler):
+    """Ship a child's log records to the parent, tagged so they share the events queue."""
+
+    def enqueue(self, record: logging.LogRecord):
+        self.queue.put_nowait(("log", record))
+
+
+def _init_child(events, cache_dir: Optional[str]):
+    """Pool initializer: route logging to the parent and pay the yt-dlp import once per process."""
+    global _events
+    _events = events
+    # Ctrl+C goes to the whole process group; the parent decides what to cancel
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The parent writes the job's trace record from the returned phases
+    get_tracer().enabled = False
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers.clear()
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = _EventQueueHandler(events)
+    handler.addFilter(CorrelationFilter())
+    logger.addHandler(handler)
+    try:
+        warm_up(Path(cache_dir) if cache_dir else None)
+    except Exception as e:
+        get_logger("ProcessPool").warning(f"Warm-up failed in pool process {os.getpid()}: {e}")
+
+
+def _watch_cancel(cancel_event, token: CancelToken, done: threading.Event):
+    while not done.is_set():
+        if cancel_event.wait(CANCEL_POLL_SECONDS):
+            token.cancel()
+            return
+
+
+class _ParentReservation:
+    """Child-side handle on a reservation the parent holds; reports bytes written as they grow."""
+
+    def __init__(self, guard: "_ParentDiskGuard", nbytes: int):
+        self.guard = guard
+        self.nbytes = nbytes
+        self._written = 0
+        self._reported = 0
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    @written.setter
+    def written(self, nbytes: int):
+        self._written = nbytes
+        # Every progress hook sets this: tell the parent every 1% (at least 1 MB) only
+        if nbytes - self._reported >= max(2**20, self.nbytes // 100):
+            self._reported = nbytes
+            _events.put(("disk", self.guard.job_id, "written", nbytes))
+
+    def release(self):
+        # The parent drops the reservation when the job's result comes back
+        pass
+
+
+class _ParentDiskGuard:
+    """Stand-in for the parent's DiskSpaceGuard inside a pool process.
+
+    Checks and reservations go to the parent over the events queue, so
+    every process shares one admission budget; the answer (None or the
+    InsufficientDiskSpace to raise) comes back on the job's reply queue.
+    """
+
+    def __init__(self, job_id: int, replies, token: CancelToken):
+        self.job_id = job_id
+        self.replies = replies
+        self.token = token
+
+    def _ask(self, op: str, nbytes: int):
+        _events.put(("disk", self.job_id, op, nbytes))
+        while True:
+            try:
+                error = self.replies.get(timeout=CANCEL_POLL_SECONDS)
+                break
+            except queue.Empty:
+                self.token.raise_if_cancelled()
+        if error is not None:
+            raise error
+
+    def check(self, nbytes: int = 0):
+        self._ask("check", nbytes)
+
+    def reserve(self, nbytes: int) -> _ParentReservation:
+        self._ask("reserve", nbytes)
+        return _ParentReservation(self, nbytes)
+
+
+def _run_child(job_id: int, url: str, outdir: str, quality: str, item_id: str,
+               disk_replies, format_prefs: Optional[FormatPreferences], cancel_event) -> Dict[str, Any]:
+    """Run one DownloadJob in a pool process.
+
+    Archive, content index and disk-space reservations stay in the parent
+    (they are shared with other processes and jobs); the child only
+    downloads and post-processes.
+
+    Returns:
+        Picklable outcome: final path, archive id, bytes, phase timings
+        and the error, if any.
+    """
+    token = CancelToken()
+    done = threading.Event()
+    watcher = threading.Thread(target=_watch_cancel, args=(cancel_event, token, done), daemon=True)
+    watcher.start()
+
+    def on_progress(percent: int, text: str):
+        _events.put(("progress", job_id, percent, text))
+
+    disk_guard = _ParentDiskGuard(job_id, disk_replies, token) if disk_replies is not None else None
+    job = DownloadJob(url, outdir, quality, on_progress=on_progress, cancel_token=token, disk_guard=disk_guard,
+                      format_prefs=format_prefs)
+    job.trace.item_id = item_id
+    result: Dict[str, Any] = {"final_path": None, "error": None}
+    try:
+        with log_context(item_id):
+            result["final_path"] = job.run()
+    except (DownloadCancelled, InsufficientDiskSpace) as e:
+        result["error"] = e
+    except Exception as e:
+        # yt-dlp errors may not survive pickling; the message is what callers use
+        result["error"] = Exception(str(e))
+    finally:
+        done.set()
+    result.update(
+        archive_id=job.archive_id,
+        nbytes=job.downloaded_bytes,
+        phases=job.trace.phases,
+        throttle_error=job.throttle_error,
+        format_id=job.format_id,
+    )
+    return result
+
+
+class ProcessPoolEngine:
+    """Run DownloadJobs in a pool of reused worker processes.
+
+    The parent keeps everything shared: per-site slots, disk-space
+    reservations, the download archive, the content index, metrics and
+    traces. ``submit`` blocks once
+    ``processes + queue_size`` jobs are in flight. A child that dies (crash,
+    OOM kill) fails the jobs in flight and the pool is started again.
+    """
+
+    def __init__(self, processes: Optional[int] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 cache_dir: Optional[Path] = None):
+        """Start the pool.
+
+        Args:
+            processes: Worker processes (default: CPU count).
+            queue_size: Jobs that may wait for a free process.
+            cache_dir: Where children find the cached extractor routing table.
+        """
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.cache_dir = cache_dir
+        # spawn: no forked copies of the parent's threads, locks or Qt state
+        self._ctx = multiprocessing.get_context("spawn")
+        self._manager = self._ctx.Manager()
+        self._events = None
+        self._pool = None
+        self._reader_stop = threading.Event()
+        self._slots = threading.BoundedSemaphore(self.processes + max(0, queue_size))
+        self._jobs: Dict[int, DownloadJob] = {}
+        self._cancel_events: Dict[int, Any] = {}
+        self._disk_replies: Dict[int, Any] = {}
+        self._reservations: Dict[int, Reservation] = {}
+        self._lock = threading.Lock()
+        # Separate from _lock: the executor runs done-callbacks (which take _lock)
+        # while holding its own lock, which submit() also needs
+        self._pool_lock = threading.Lock()
+        self._next_id = 0
+        self._stopped = False
+        self.logger = get_logger("ProcessPool")
+        self._start_pool()
+        get_metrics().add_collector(self.collect_metrics)
+
+    def submit(self, job: DownloadJob, on_done: Optional[DoneCallback] = None):
+        """Hand a job to the pool; blocks while the pool is full.
+
+        The site slot is taken on a helper thread, so a throttled site does
+        not hold back jobs for other sites.
+        """
+        self._slots.acquire()
+        ACTIVE_JOBS.inc()
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._jobs[job_id] = job
+        threading.Thread(target=self._dispatch, args=(job_id, job, on_done),
+                         name=f"process-pool-dispatch-{job_id}", daemon=True).start()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Cancel running jobs and stop the worker processes."""
+        with self._lock:
+            self._stopped = True
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_token.cancel()
+        with self._pool_lock:
+            pool = self._pool
+        joiner = threading.Thread(target=pool.shutdown, kwargs={"cancel_futures": True}, daemon=True)
+        joiner.start()
+        joiner.join(timeout)
+        if joiner.is_alive():
+            # The executor has no terminate(); stop children stuck in ffmpeg or a socket
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+        self._reader_stop.set()
+        self._reader.join(timeout)
+        self._manager.shutdown()
+
+    def collect_metrics(self):
+        with self._lock:
+            POOL_BUSY.set(len(self._cancel_events))
+
+    def _start_pool(self):
+        """New executor with a new events queue and reader (caller holds _pool_lock, or __init__).
+
+        The queue is replaced too: a child killed in the middle of a put
+        leaves the queue's shared write lock held for good.
+        """
+        events = self._ctx.Queue()
+        # The parent only reads; never wait at exit on a feeder a dead child may have blocked
+        events.cancel_join_thread()
+        self._events = events
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            self.processes, mp_context=self._ctx, initializer=_init_child,
+            initargs=(events, str(self.cache_dir) if self.cache_dir else None))
+        self._reader = threading.Thread(target=self._read_events, args=(events,),
+                                        name="process-pool-events", daemon=True)
+        self._reader.start()
+
+    def _submit_child(self, args: tuple) -> concurrent.futures.Future:
+        """Submit to the pool, starting a new one if a dead child broke it."""
+        with self._pool_lock:
+            try:
+                return self._pool.submit(_run_child, *args)
+            except BrokenProcessPool:
+                if self._stopped:
+                    raise
+                self.logger.warning("A pool process died; starting a new pool")
+                self._pool.shutdown(wait=False)
+                self._start_pool()
+                return self._pool.submit(_run_child, *args)
+
+    def _collect(self, job_id: int, on_done: Optional[DoneCallback], future: concurrent.futures.Future):
+        """Turn a finished future into _finish's result, whatever happened to the child."""
+        try:
+            result = future.result()
+        except concurrent.futures.CancelledError:
+            result = {"final_path": None, "error": DownloadCancelled()}
+        except BrokenProcessPool as e:
+            self.logger.error(f"Pool process died while running job {job_id}: {e}")
+            result = {"final_path": None, "error": Exception(f"Download process died: {e}")}
+        except Exception as e:
+            result = {"final_path": None, "error": e}
+        self._finish(job_id, on_done, result)
+
+    def _dispatch(self, job_id: int, job: DownloadJob, on_done: Optional[DoneCallback]):
+        try:
+            if self._stopped:
+                raise DownloadCancelled()
+            if job.disk_guard is not None:
+                job.disk_guard.check()
+            job.acquire_slot()
+            job.mark_download_started()
+            cancel_event = self._manager.Event()
+            with self._lock:
+                self._cancel_events[job_id] = cancel_event
+            job.cancel_token.add_callback(cancel_event.set)
+            disk_replies = None
+            if job.disk_guard is not None:
+                disk_replies = self._manager.Queue()
+                with self._lock:
+                    self._disk_replies[job_id] = disk_replies
+            args = (job_id, job.url, str(job.outdir), job.quality, job.trace.item_id, disk_replies,
+                    job.format_prefs, cancel_event)
+            future = self._submit_child(args)
+        except Exception as e:
+            self._finish(job_id, on_done, {"final_path": None, "error": e})
+            return
+        future.add_done_callback(lambda f: self._collect(job_id, on_done, f))
+
+    def _read_events(self, events):
+        """Relay child events until shutdown, or until a new pool replaced this queue."""
+        while True:
+            try:
+                event = events.get(timeout=CANCEL_POLL_SECONDS)
+            except queue.Empty:
+                if self._reader_stop.is_set() or events is not self._events:
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+            if event[0] == "log":
+                record = event[1]
+                logging.getLogger(record.name).handle(record)
+            elif event[0] == "progress":
+                _, job_id, percent, text = event
+                with self._lock:
+                    job = self._jobs.get(job_id)
+                if job is not None and job.on_progress:
+                    try:
+                        job.on_progress(percent, text)
+                    except Exception:
+                        self.logger.exception("Progress callback failed")
+            elif event[0] == "disk":
+                self._answer_disk(*event[1:])
+
+    def _answer_disk(self, job_id: int, op: str, nbytes: int):
+        """Run a child's disk-space check or reservation against the parent's guard."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            replies = self._disk_replies.get(job_id)
+            reservation = self._reservations.get(job_id)
+        if job is None or replies is None:
+            return
+        if op == "written":
+            if reservation is not None:
+                reservation.written = nbytes
+            return
+        error = None
+        try:
+            if op == "check":
+                job.disk_guard.check(nbytes)
+            elif reservation is None:
+                reservation = job.disk_guard.reserve(nbytes)
+                with self._lock:
+                    if job_id in self._jobs:
+                        self._reservations[job_id] = reservation
+                        reservation = None
+                if reservation is not None:
+                    # Finished while we were reserving
+                    reservation.release()
+        except InsufficientDiskSpace as e:
+            error = e
+        try:
+            replies.put(error)
+        except Exception as e:
+            self.logger.warning(f"Could not answer disk request of job {job_id}: {e}")
+
+    def _finish(self, job_id: int, on_done: Optional[DoneCallback], result: Dict[str, Any]):
+        """Apply a child's outcome to the parent's shared state (executor callback thread)."""
+        with self._lock:
+            job = self._jobs.pop(job_id)
+            self._cancel_events.pop(job_id, None)
+            self._disk_replies.pop(job_id, None)
+            reservation = self._reservations.pop(job_id, None)
+        if reservation is not None:
+            reservation.release()
+        self._slots.release()
+        error = result.get("error")
+        if error is not None and job.cancel_token.cancelled and not isinstance(error, DownloadCancelled):
+            error = DownloadCancelled()
+        if error is None:
+            status = "ok"
+        elif isinstance(error, DownloadCancelled):
+            status = "cancelled"
+        else:
+            status = "failed"
+        archive_id = result.get("archive_id")
+        if status == "ok" and job.archive is not None and archive_id:
+            job.archive.add(archive_id[0], archive_id[1], job.quality)
+        nbytes = result.get("nbytes") or 0
+        BYTES_TOTAL.inc(nbytes)
+        job.release_slot(status == "ok", result.get("throttle_error") or (str(error) if status == "failed" else None),
+                         nbytes=nbytes)
+        phases = result.get("phases") or {}
+        for phase, ms in phases.items():
+            PHASE_SECONDS.observe(ms / 1000, phase=phase)
+        job.trace.phases = phases
+        final_path = result.get("final_path")
+        if status == "ok" and final_path and Path(final_path).is_file():
+            job.index_output(final_path)
+        ACTIVE_JOBS.dec()
+        job.trace.finish(status, quality=job.quality, engine="process", format=result.get("format_id"),
+                         error=type(error).__name__ if status == "failed" else None)
+        if on_done:
+            try:
+                on_done(final_path if error is None else None, error)
+            except Exception:
+                self.logger.exception(f"Completion callback failed for {job.url}")
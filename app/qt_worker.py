@@ -0,0 +1,56 @@
+"""
+Qt adapter for Download App's download jobs.
+Wraps the Qt-free DownloadJob in a QObject so MainWindow can run it on a QThread.
+"""
+from PySide6.QtCore import QObject, Signal, Slot
+from typing import Optional
+
+from .archive import DownloadArchive
+from .cancellation import CancelToken, DownloadCancelled, CANCELLED_MESSAGE
+from .dedup import ContentIndex
+from .disk_space import DiskSpaceGuard
+from .format_select import FormatPreferences
+from .logger import get_logger
+from .rate_control import AdaptiveConcurrency
+from .worker import DownloadJob
+
+
+class DownloadWorker(QObject):
+    progress = Signal(int, str)  # percent, status text
+    finished = Signal(bool, str)  # success, message/path
+
+    def __init__(self, url: str, outdir: str, quality: str = "auto",
+                 archive: Optional[DownloadArchive] = None, content_index: Optional[ContentIndex] = None,
+                 limiter: Optional[AdaptiveConcurrency] = None, disk_guard: Optional[DiskSpaceGuard] = None,
+                 format_prefs: Optional[FormatPreferences] = None):
+        super().__init__()
+        self.url = url
+        self.outdir = outdir
+        self.quality = quality  # "auto", "1080p", "720p", "audio"
+        self.archive = archive
+        self.content_index = content_index
+        self.limiter = limiter
+        self.disk_guard = disk_guard
+        self.format_prefs = format_prefs
+        self.cancel_token = CancelToken()
+        self.logger = get_logger("DownloadWorker")
+
+    def cancel(self):
+        """Request cancellation; safe to call from the GUI thread."""
+        self.cancel_token.cancel()
+
+    @Slot()
+    def run(self):
+        try:
+            job = DownloadJob(self.url, self.outdir, self.quality,
+                              on_progress=self.progress.emit, cancel_token=self.cancel_token,
+                              archive=self.archive, content_index=self.content_index,
+                              limiter=self.limiter, disk_guard=self.disk_guard, format_prefs=self.format_prefs)
+            final_path = job.run()
+            self.finished.emit(True, final_path)
+        except DownloadCancelled:
+            self.logger.info(f"Download cancelled: {self.url}")
+            self.finished.emit(False, CANCELLED_MESSAGE)
+        except Exception as e:
+            self.logger.error(f"Download failed: {e}", exc_info=True)
+            self.finished.emit(False, str(e))
@@ -1,13 +1,34 @@
 """
 Queue manager for batch downloads.
-Handles multiple URLs in a queue with pause/resume/cancel.
+Handles multiple URLs in a queue with pause/resume/cancel. Pending items
+are dispatched by priority, then shortest estimated job first, with aging.
 """
+import heapq
+import itertools
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
-from typing import List, Optional, Callable
+from typing import Dict, List, Optional, Callable, Set, Tuple
 from pathlib import Path
 
+from .archive import DownloadArchive
+from .metrics import get_metrics
+
+
+QUEUE_ITEMS = get_metrics().gauge("download_queue_items", "Queued items by DownloadState")
+
+# Estimated cost (seconds of media) of an item we know nothing about
+DEFAULT_COST = 600.0
+# Rough bitrate used to turn a known file size into seconds of media
+BYTES_PER_MEDIA_SECOND = 250_000
+# Seconds of estimated cost an item makes up for each second it has waited:
+# a long item is only overtaken by shorter ones queued within cost / AGING_RATE
+# seconds after it, so it cannot starve
+AGING_RATE = 2.0
+# Why try_add_url did not add a URL
+REJECT_DUPLICATE = "duplicate"
+REJECT_ARCHIVED = "archived"
+
 
 class DownloadState(Enum):
     """State of a download item."""
@@ -23,6 +44,7 @@ class DownloadState(Enum):
 class DownloadItem:
     """Single item in download queue."""
     url: str
+    quality: str = "auto"
     state: DownloadState = DownloadState.PENDING
     progress: int = 0
     status_text: str = ""
@@ -30,49 +52,221 @@ class DownloadItem:
     created_at: datetime = field(default_factory=datetime.now)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    priority: int = 0  # higher runs first
+    duration: Optional[float] = None  # seconds, from cached metadata
+    filesize: Optional[int] = None  # bytes, from cached metadata
+    title: Optional[str] = None  # from cached metadata
+    # Stable per-queue id; unlike the index it survives requeues and removals
+    id: int = field(default=0, compare=False)
+    # Sequence number of this item's live heap entry (older entries are stale)
+    heap_seq: int = field(default=-1, repr=False, compare=False)
+
+    def estimated_cost(self) -> float:
+        """Estimated job size in seconds of media (duration, else size, else DEFAULT_COST)."""
+        if self.duration:
+            return float(self.duration)
+        if self.filesize:
+            return self.filesize / BYTES_PER_MEDIA_SECOND
+        return DEFAULT_COST
+
+    def schedule_key(self) -> Tuple[int, float]:
+        """Heap key: user priority first, then aged cost (smaller runs sooner).
+
+        The age term uses the fixed creation time, so keys never change
+        while an item waits and the heap never needs re-sorting.
+        """
+        return (-self.priority, self.estimated_cost() + AGING_RATE * self.created_at.timestamp())
     
     def __str__(self):
         return f"[{self.state.value.upper()}] {self.url} ({self.progress}%)"
 
+    def to_dict(self) -> dict:
+        """Return a JSON-serializable view of this item."""
+        return {
+            "id": self.id,
+            "url": self.url,
+            "quality": self.quality,
+            "state": self.state.value,
+            "progress": self.progress,
+            "status_text": self.status_text,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "priority": self.priority,
+            "duration": self.duration,
+            "filesize": self.filesize,
+            "title": self.title,
+        }
+
 
 class QueueManager:
-    """Manage a queue of downloads."""
+    """Manage a queue of downloads.
+
+    ``items`` keeps insertion order (indexes are what the UI shows); each
+    item also gets a stable ``id``, which the daemon API and events use
+    because requeueing moves an item and shifts the indexes after it.
+    Dispatch order comes from a heap of pending items keyed by
+    DownloadItem.schedule_key; reprioritizing pushes a fresh entry and the
+    old one is skipped when popped (lazy deletion), so both are O(log n).
+    """
     
-    def __init__(self):
+    def __init__(self, archive: Optional[DownloadArchive] = None):
+        """Initialize queue.
+        
+        Args:
+            archive: Optional download archive; archived URLs are not queued again.
+        """
+        self.archive = archive
         self.items: List[DownloadItem] = []
+        # URL index for O(1) duplicate checks on large (playlist-sized) queues
+        self._urls: Set[str] = set()
         self.is_paused = False
-        self.current_index = 0
+        # (schedule key, seq, item); an entry is live while item.heap_seq == seq
+        self._heap: List[Tuple[Tuple[int, float], int, DownloadItem]] = []
+        self._seq = itertools.count()
+        # id(item) -> index in items
+        self._positions: Dict[int, int] = {}
+        # DownloadItem.id -> item
+        self._by_id: Dict[int, DownloadItem] = {}
+        self._ids = itertools.count(1)
+        self._current: Optional[DownloadItem] = None
+        # Bumped whenever rows are removed or reordered (appends do not count),
+        # so views can tell "rows added" from "indexes changed"
+        self.structure_version = 0
     
-    def add_url(self, url: str) -> bool:
+    def add_url(self, url: str, quality: str = "auto", priority: int = 0,
+                duration: Optional[float] = None, filesize: Optional[int] = None) -> bool:
         """Add a URL to the queue.
         
         Args:
             url: URL to add.
+            quality: Quality preset ("auto", "1080p", "720p", "audio").
+            priority: User priority; higher runs first.
+            duration: Known duration in seconds (e.g. from playlist metadata).
+            filesize: Known size in bytes.
             
         Returns:
-            True if added, False if duplicate or invalid.
+            True if added, False if duplicate, already archived or invalid.
+        """
+        return self.try_add_url(url, quality, priority, duration, filesize) is None
+
+    def try_add_url(self, url: str, quality: str = "auto", priority: int = 0,
+                    duration: Optional[float] = None, filesize: Optional[int] = None) -> Optional[str]:
+        """Add a URL to the queue, reporting why it was not added.
+        
+        Returns:
+            None if added, else the reason: REJECT_DUPLICATE or REJECT_ARCHIVED.
         """
         url = url.strip()
         
         # Check for duplicates
-        if any(item.url == url for item in self.items):
+        if url in self._urls:
+            return REJECT_DUPLICATE
+        
+        # Skip anything downloaded in a previous session (no network I/O)
+        if self.is_archived(url, quality):
+            return REJECT_ARCHIVED
+        
+        item = DownloadItem(url=url, quality=quality, priority=priority, duration=duration, filesize=filesize,
+                            id=next(self._ids))
+        self._by_id[item.id] = item
+        self._positions[id(item)] = len(self.items)
+        self.items.append(item)
+        self._urls.add(url)
+        self._push(item)
+        return None
+
+    def _push(self, item: DownloadItem):
+        """(Re)schedule item; any earlier heap entry for it becomes stale."""
+        seq = next(self._seq)
+        item.heap_seq = seq
+        heapq.heappush(self._heap, (item.schedule_key(), seq, item))
+        # Lazy deletion leaves stale entries behind; rebuild once they dominate
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self.items):
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    @staticmethod
+    def _is_live(entry) -> bool:
+        _, seq, item = entry
+        return item.heap_seq == seq and item.state == DownloadState.PENDING
+
+    def _peek(self) -> Optional[DownloadItem]:
+        """Best pending item (drops stale entries from the top)."""
+        heap = self._heap
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def _reindex(self):
+        self._positions = {id(item): i for i, item in enumerate(self.items)}
+
+    def index_of(self, item: DownloadItem) -> int:
+        """Index of item in items, or -1."""
+        return self._positions.get(id(item), -1)
+
+    def get_item(self, item_id: int) -> Optional[DownloadItem]:
+        """Item with the given id, or None if it was never added or is gone."""
+        return self._by_id.get(item_id)
+
+    @property
+    def current_index(self) -> int:
+        """Index of the item being dispatched, or -1 if none."""
+        return self.index_of(self._current) if self._current is not None else -1
+
+    def set_priority(self, index: int, priority: int) -> bool:
+        """Change an item's user priority (O(log n) for pending items).
+        
+        Returns:
+            True if the index is valid.
+        """
+        if not 0 <= index < len(self.items):
             return False
+        item = self.items[index]
+        item.priority = priority
+        if item.state == DownloadState.PENDING:
+            self._push(item)
+        return True
+
+    def set_estimate(self, index: int, duration: Optional[float] = None, filesize: Optional[int] = None) -> bool:
+        """Record metadata (duration/size) for an item and reschedule it.
         
-        self.items.append(DownloadItem(url=url))
+        Returns:
+            True if the index is valid.
+        """
+        if not 0 <= index < len(self.items):
+            return False
+        item = self.items[index]
+        if duration is not None:
+            item.duration = duration
+        if filesize is not None:
+            item.filesize = filesize
+        if item.state == DownloadState.PENDING:
+            self._push(item)
         return True
     
-    def add_urls(self, urls: List[str]) -> int:
+    def is_archived(self, url: str, quality: str = "auto") -> bool:
+        """Check whether a URL was already downloaded with this quality."""
+        return self.archive is not None and self.archive.contains_url(url.strip(), quality)
+    
+    def contains(self, url: str) -> bool:
+        """Check whether a URL is already queued."""
+        return url.strip() in self._urls
+    
+    def add_urls(self, urls: List[str], quality: str = "auto") -> int:
         """Add multiple URLs to the queue.
         
         Args:
             urls: List of URLs to add.
+            quality: Quality preset applied to every URL.
             
         Returns:
             Number of URLs actually added.
         """
         count = 0
         for url in urls:
-            if self.add_url(url):
+            if self.add_url(url, quality):
                 count += 1
         return count
     
@@ -86,52 +280,75 @@ class QueueManager:
             True if removed, False if index invalid.
         """
         if 0 <= index < len(self.items):
+            item = self.items[index]
+            self._urls.discard(item.url)
+            item.heap_seq = -1  # its heap entry is now stale
             del self.items[index]
-            if self.current_index >= len(self.items):
-                self.current_index = max(0, len(self.items) - 1)
+            del self._by_id[item.id]
+            if item is self._current:
+                self._current = None
+            self._reindex()
+            self.structure_version += 1
             return True
         return False
     
     def clear(self):
         """Clear all items from queue."""
         self.items.clear()
-        self.current_index = 0
+        self._urls.clear()
+        self._heap.clear()
+        self._positions.clear()
+        self._by_id.clear()
+        self._current = None
+        self.structure_version += 1
     
     def get_current(self) -> Optional[DownloadItem]:
         """Get current item being downloaded."""
-        if 0 <= self.current_index < len(self.items):
-            return self.items[self.current_index]
-        return None
+        return self._current
     
     def next(self) -> Optional[DownloadItem]:
-        """Move to next item in queue."""
-        self.current_index += 1
-        return self.get_current()
+        """Make the highest-priority pending item current and return it (None if none left)."""
+        item = self._peek()
+        if item is not None:
+            heapq.heappop(self._heap)
+            item.heap_seq = -1
+        self._current = item
+        return item
     
     def update_current(self, progress: int, status: str):
         """Update progress of current item."""
         item = self.get_current()
         if item:
-            item.progress = progress
-            item.status_text = status
-            if item.state == DownloadState.PENDING:
-                item.state = DownloadState.DOWNLOADING
-                item.started_at = datetime.now()
+            self.update_item(item, progress, status)
+    
+    def update_item(self, item: DownloadItem, progress: int, status: str):
+        """Update progress of an item (several run at once in pipeline mode)."""
+        item.progress = progress
+        item.status_text = status
+        if item.state == DownloadState.PENDING:
+            item.state = DownloadState.DOWNLOADING
+            item.started_at = datetime.now()
     
     def mark_current_completed(self):
         """Mark current item as completed."""
         item = self.get_current()
         if item:
-            item.state = DownloadState.COMPLETED
-            item.completed_at = datetime.now()
+            self.mark_completed(item)
+    
+    def mark_completed(self, item: DownloadItem):
+        item.state = DownloadState.COMPLETED
+        item.completed_at = datetime.now()
     
     def mark_current_failed(self, error: str):
         """Mark current item as failed."""
         item = self.get_current()
         if item:
-            item.state = DownloadState.FAILED
-            item.error = error
-            item.completed_at = datetime.now()
+            self.mark_failed(item, error)
+    
+    def mark_failed(self, item: DownloadItem, error: str):
+        item.state = DownloadState.FAILED
+        item.error = error
+        item.completed_at = datetime.now()
     
     def pause(self):
         """Pause queue processing."""
@@ -148,18 +365,82 @@ class QueueManager:
             item.state = DownloadState.CANCELLED
             item.completed_at = datetime.now()
     
+    def cancel_item(self, index: int) -> bool:
+        """Cancel an item by index if it has not finished yet.
+        
+        Args:
+            index: Index of item to cancel.
+            
+        Returns:
+            True if the item was cancelled, False if index invalid or already finished.
+        """
+        if not 0 <= index < len(self.items):
+            return False
+        item = self.items[index]
+        if item.state in (DownloadState.COMPLETED, DownloadState.FAILED, DownloadState.CANCELLED):
+            return False
+        item.state = DownloadState.CANCELLED
+        item.completed_at = datetime.now()
+        return True
+    
+    def requeue_item(self, index: int) -> bool:
+        """Move a cancelled or failed item to the end of the queue as pending.
+        
+        It keeps its priority and creation time, so aging still counts the
+        time it already waited.
+        
+        Args:
+            index: Index of item to requeue.
+            
+        Returns:
+            True if requeued, False if index invalid or item not retryable.
+        """
+        if not 0 <= index < len(self.items):
+            return False
+        item = self.items[index]
+        if item.state not in (DownloadState.CANCELLED, DownloadState.FAILED):
+            return False
+        del self.items[index]
+        if item is self._current:
+            self._current = None
+        item.state = DownloadState.PENDING
+        item.progress = 0
+        item.error = None
+        item.completed_at = None
+        self.items.append(item)
+        self._reindex()
+        self.structure_version += 1
+        self._push(item)
+        return True
+    
+    def _state_counts(self) -> Dict[DownloadState, int]:
+        """Item count per DownloadState (one pass)."""
+        counts = {state: 0 for state in DownloadState}
+        for item in self.items:
+            counts[item.state] += 1
+        return counts
+    
+    def collect_metrics(self):
+        """Publish item counts per DownloadState to the queue depth gauge.
+
+        The gauge is process-wide: only the queue's owner (the GUI window
+        or the daemon) registers this as a metrics collector.
+        """
+        for state, count in self._state_counts().items():
+            QUEUE_ITEMS.set(count, state=state.value)
+    
     def get_stats(self) -> dict:
-        """Get queue statistics."""
-        total = len(self.items)
-        completed = sum(1 for i in self.items if i.state == DownloadState.COMPLETED)
-        failed = sum(1 for i in self.items if i.state == DownloadState.FAILED)
-        pending = sum(1 for i in self.items if i.state == DownloadState.PENDING)
+        """Get queue statistics (counted from this queue, not the process-wide gauge)."""
+        counts = self._state_counts()
         
         return {
-            "total": total,
-            "completed": completed,
-            "failed": failed,
-            "pending": pending,
+            "total": len(self.items),
+            "completed": counts[DownloadState.COMPLETED],
+            "failed": counts[DownloadState.FAILED],
+            "pending": counts[DownloadState.PENDING],
+            "downloading": counts[DownloadState.DOWNLOADING],
+            "cancelled": counts[DownloadState.CANCELLED],
+            "is_paused": self.is_paused,
             "current_index": self.current_index,
         }
     
@@ -168,5 +449,5 @@ class QueueManager:
         return len(self.items) == 0
     
     def has_next(self) -> bool:
-        """Check if there's a next item."""
-        return self.current_index + 1 < len(self.items)
+        """Check if there's a pending item left to dispatch."""
+        return self._peek() is not None
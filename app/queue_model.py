@@ -0,0 +1,426 @@
+"""
+Queue table model for Download App.
+Shows QueueManager.items in a QTableView without copying them: cells are
+computed in data() only for visible rows, changed rows are coalesced into
+a few dataChanged signals per refresh tick, and state filters and the
+state sort read rows straight from sorted per-state index lists, so a
+state change moves one row instead of re-sorting.
+"""
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, QTimer, Qt, Signal, Slot
+from PySide6.QtGui import QImage, QPixmap, QPixmapCache
+
+from .prefetch import ItemMetadata, MetadataPrefetcher
+from .queue_manager import DownloadItem, DownloadState, QueueManager
+
+
+TITLE, STATE, PROGRESS, DURATION, SIZE = range(5)
+HEADERS = ("Tên", "Trạng thái", "Tiến độ", "Thời lượng", "Dung lượng")
+STATE_LABELS = {
+    DownloadState.PENDING: "Đang chờ",
+    DownloadState.DOWNLOADING: "Đang tải",
+    DownloadState.PAUSED: "Tạm dừng",
+    DownloadState.COMPLETED: "Hoàn tất",
+    DownloadState.FAILED: "Lỗi",
+    DownloadState.CANCELLED: "Đã huỷ",
+}
+# Order of the state column when sorted ascending
+STATE_ORDER = (
+    DownloadState.DOWNLOADING, DownloadState.PENDING, DownloadState.PAUSED,
+    DownloadState.FAILED, DownloadState.CANCELLED, DownloadState.COMPLETED,
+)
+DEFAULT_REFRESH_MS = 100  # at most 10 repaint batches per second, whatever the job count
+MAX_RANGES = 32  # beyond this many dirty ranges, send one span instead
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if not seconds:
+        return ""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+def format_size(nbytes: Optional[int]) -> str:
+    if not nbytes:
+        return ""
+    if nbytes >= 2**30:
+        return f"{nbytes / 2**30:.1f} GB"
+    return f"{nbytes / 2**20:.0f} MB"
+
+
+def coalesce(rows: List[int]) -> List[Tuple[int, int]]:
+    """Sorted rows -> inclusive (first, last) runs of consecutive rows."""
+    ranges: List[Tuple[int, int]] = []
+    for row in rows:
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+class QueueTableModel(QAbstractTableModel):
+    """Table model over a QueueManager, for queues of 100k+ items.
+
+    Call ``mark_dirty(item)`` whenever an item changes (GUI thread); rows
+    appended to the queue are picked up on the next refresh tick. Removing
+    or reordering items bumps ``QueueManager.structure_version``, which
+    resets the model. Sorting by a column other than state is a snapshot.
+    data() never touches the disk: thumbnails are read on a loader thread
+    and the row is repainted once they are in QPixmapCache.
+    """
+
+    # (item, metadata) from a prefetch thread, delivered on the GUI thread
+    _metadata_ready = Signal(object, object)
+    # (item, QImage) from the thumbnail loader thread
+    _thumbnail_ready = Signal(object, object)
+
+    def __init__(self, queue: QueueManager, prefetcher: Optional[MetadataPrefetcher] = None,
+                 refresh_ms: int = DEFAULT_REFRESH_MS, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        self.prefetcher = prefetcher
+        self._row_count = 0  # queue rows the view has been told about
+        self._structure = queue.structure_version
+        self._states: List[DownloadState] = []  # last state seen per queue index
+        # Sorted queue indexes per state
+        self._by_state: Dict[DownloadState, List[int]] = {state: [] for state in DownloadState}
+        self._filter: Optional[DownloadState] = None
+        self._sort: Optional[Tuple[int, Qt.SortOrder]] = None
+        # State filter / state sort: the view is these states' index lists back to back
+        self._segments: Optional[List[DownloadState]] = None
+        self._descending = False
+        # Sort by another column: view row -> queue index snapshot
+        self._rows: Optional[List[int]] = None
+        self._view_pos: Dict[int, int] = {}
+        self._dirty: Set[int] = set()
+        self._with_meta: Set[str] = set()  # URLs whose metadata is cached somewhere
+        self._loading: Set[str] = set()
+        self._no_thumbnail: Set[str] = set()
+        self._loader: Optional[ThreadPoolExecutor] = None
+        self._index_rows(0, len(queue.items))
+        self._row_count = len(queue.items)
+        self._metadata_ready.connect(self._apply_metadata)
+        self._thumbnail_ready.connect(self._apply_thumbnail)
+        self._timer = QTimer(self)
+        self._timer.setInterval(refresh_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    # ---- QAbstractTableModel ----
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        if self._segments is not None:
+            return sum(len(self._by_state[state]) for state in self._segments)
+        return self._row_count if self._rows is None else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole) -> Any:
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return str(self._source(section) + 1)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        item = self.queue.items[self._source(index.row())]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == TITLE:
+                return item.title or item.url
+            if column == STATE:
+                return STATE_LABELS[item.state]
+            if column == PROGRESS:
+                return f"{item.progress}%"
+            if column == DURATION:
+                return format_duration(item.duration)
+            if column == SIZE:
+                return format_size(item.filesize)
+        elif role == Qt.ToolTipRole:
+            return "\n".join(filter(None, (item.url, item.error or item.status_text)))
+        elif role == Qt.DecorationRole and column == TITLE:
+            return self._thumbnail(item)
+        elif role == Qt.TextAlignmentRole and column in (PROGRESS, DURATION, SIZE):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        elif role == Qt.UserRole:
+            return item
+        return None
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        """Sort by a column (the state sort comes straight from the per-state index); -1 = queue order."""
+        self._sort = (column, order) if column >= 0 else None
+        self._reset()
+
+    # ---- public API ----
+
+    def set_state_filter(self, state: Optional[DownloadState]):
+        """Show only items in state (None shows everything)."""
+        if state != self._filter:
+            self._filter = state
+            self._reset()
+
+    def item_at(self, row: int) -> DownloadItem:
+        return self.queue.items[self._source(row)]
+
+    def mark_dirty(self, item: DownloadItem):
+        """Repaint item's row on the next refresh tick (cheap; call on every update)."""
+        index = self.queue.index_of(item)
+        if index >= 0:
+            self._dirty.add(index)
+
+    def prefetch(self, item: DownloadItem):
+        """Fill in item's title, duration and size from the metadata cache (fetching it if needed)."""
+        if self.prefetcher is None:
+            return
+        meta = self.prefetcher.request(
+            item.url, item.quality, on_ready=lambda url, meta, item=item: self._metadata_ready.emit(item, meta))
+        if meta is not None:
+            self._apply_metadata(item, meta)
+
+    @Slot()
+    def flush(self):
+        """Tell the view about appended and changed rows (runs on the refresh timer)."""
+        if self.queue.structure_version != self._structure:
+            self._reset()
+            return
+        count = len(self.queue.items)
+        if count > self._row_count:
+            self._append(count)
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        items = self.queue.items
+        for index in sorted(dirty):
+            if index >= len(self._states):
+                continue
+            old, new = self._states[index], items[index].state
+            if old == new:
+                continue
+            if self._rows is not None and self._filter in (old, new):
+                # A snapshot sort cannot place rows entering the filter
+                self._reset()
+                return
+            self._change_state(index, old, new)
+        rows = sorted(row for row in map(self._view_row, dirty) if row is not None)
+        if not rows:
+            return
+        ranges = coalesce(rows)
+        if len(ranges) > MAX_RANGES:
+            ranges = [(rows[0], rows[-1])]
+        last_column = len(HEADERS) - 1
+        for first, last in ranges:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+
+    def shutdown(self):
+        """Stop the thumbnail loader and the prefetcher."""
+        if self._loader is not None:
+            self._loader.shutdown(wait=False, cancel_futures=True)
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+
+    # ---- internals ----
+
+    def _source(self, row: int) -> int:
+        if self._segments is not None:
+            for state in self._segments:
+                indexes = self._by_state[state]
+                if row < len(indexes):
+                    return indexes[-1 - row] if self._descending else indexes[row]
+                row -= len(indexes)
+            raise IndexError(row)
+        return row if self._rows is None else self._rows[row]
+
+    def _offset(self, state: DownloadState) -> int:
+        """View rows before state's segment."""
+        offset = 0
+        for other in self._segments:
+            if other == state:
+                return offset
+            offset += len(self._by_state[other])
+        return offset
+
+    def _view_row(self, index: int) -> Optional[int]:
+        if self._segments is not None:
+            if index >= len(self._states) or self._states[index] not in self._segments:
+                return None
+            state = self._states[index]
+            indexes = self._by_state[state]
+            pos = bisect.bisect_left(indexes, index)
+            return self._offset(state) + (len(indexes) - 1 - pos if self._descending else pos)
+        if self._rows is None:
+            return index if index < self._row_count else None
+        return self._view_pos.get(index)
+
+    def _index_rows(self, start: int, end: int):
+        """Record the state of queue rows start..end in the per-state index."""
+        items = self.queue.items
+        for index in range(start, end):
+            state = items[index].state
+            self._states.append(state)
+            self._by_state[state].append(index)
+
+    def _change_state(self, index: int, old: DownloadState, new: DownloadState):
+        """Move index between per-state lists, with one row signal for the view."""
+        if self._segments is None:
+            # Row order does not depend on state
+            self._set_state(index, old, new)
+            return
+        source = self._view_row(index)
+        target = None
+        if new in self._segments:
+            indexes = self._by_state[new]
+            pos = bisect.bisect_left(indexes, index)
+            target = self._offset(new) + (len(indexes) - pos if self._descending else pos)
+            if source is not None and self._segments.index(old) < self._segments.index(new):
+                target -= 1  # the row leaves a segment above
+        parent = QModelIndex()
+        if source is None and target is None or source == target:
+            self._set_state(index, old, new)
+        elif source is None:
+            self.beginInsertRows(parent, target, target)
+            self._set_state(index, old, new)
+            self.endInsertRows()
+        elif target is None:
+            self.beginRemoveRows(parent, source, source)
+            self._set_state(index, old, new)
+            self.endRemoveRows()
+        else:
+            # Qt wants the destination in pre-move rows
+            self.beginMoveRows(parent, source, source, parent, target + 1 if target > source else target)
+            self._set_state(index, old, new)
+            self.endMoveRows()
+
+    def _set_state(self, index: int, old: DownloadState, new: DownloadState):
+        self._states[index] = new
+        indexes = self._by_state[old]
+        del indexes[bisect.bisect_left(indexes, index)]
+        bisect.insort(self._by_state[new], index)
+
+    def _configure(self):
+        """Pick how view rows map to queue rows for the current filter and sort."""
+        column, order = self._sort if self._sort is not None else (None, None)
+        self._segments, self._descending, self._rows, self._view_pos = None, False, None, {}
+        if column is not None and column != STATE:
+            self._set_rows(self._compute_rows())
+        elif self._filter is not None or column == STATE:
+            self._descending = order == Qt.DescendingOrder
+            if self._filter is not None:
+                self._segments = [self._filter]
+            else:
+                self._segments = list(reversed(STATE_ORDER) if self._descending else STATE_ORDER)
+
+    def _compute_rows(self) -> List[int]:
+        """Snapshot of view rows sorted by a column other than state."""
+        if self._filter is not None:
+            rows = list(self._by_state[self._filter])
+        else:
+            rows = list(range(self._row_count))
+        column, order = self._sort
+        items = self.queue.items
+        key = {
+            TITLE: lambda i: (items[i].title or items[i].url).lower(),
+            PROGRESS: lambda i: items[i].progress,
+            DURATION: lambda i: items[i].duration or 0,
+            SIZE: lambda i: items[i].filesize or 0,
+        }.get(column, lambda i: i)
+        rows.sort(key=key, reverse=order == Qt.DescendingOrder)
+        return rows
+
+    def _set_rows(self, rows: List[int]):
+        self._rows = rows
+        self._view_pos = {index: row for row, index in enumerate(rows)}
+
+    def _reset(self):
+        """Rebuild everything (filter/sort change, or rows removed/reordered)."""
+        self.beginResetModel()
+        self._structure = self.queue.structure_version
+        self._states = []
+        self._by_state = {state: [] for state in DownloadState}
+        self._row_count = len(self.queue.items)
+        self._index_rows(0, self._row_count)
+        self._dirty.clear()
+        self._configure()
+        self.endResetModel()
+
+    def _append(self, count: int):
+        start = self._row_count
+        if self._rows is not None:
+            # New rows have to be placed by the sort key
+            self._reset()
+            return
+        if self._segments is None:
+            self.beginInsertRows(QModelIndex(), start, count - 1)
+            self._index_rows(start, count)
+            self._row_count = count
+            self.endInsertRows()
+            return
+        # New indexes are the largest, so each state's batch is one block at
+        # the end of its segment (the start, when descending)
+        items = self.queue.items
+        batches: Dict[DownloadState, List[int]] = {}
+        for index in range(start, count):
+            state = items[index].state
+            self._states.append(state)
+            batches.setdefault(state, []).append(index)
+        self._row_count = count
+        for state, indexes in batches.items():
+            if state not in self._segments:
+                self._by_state[state].extend(indexes)
+                continue
+            first = self._offset(state) + (0 if self._descending else len(self._by_state[state]))
+            self.beginInsertRows(QModelIndex(), first, first + len(indexes) - 1)
+            self._by_state[state].extend(indexes)
+            self.endInsertRows()
+
+    def _thumbnail(self, item: DownloadItem) -> Optional[QPixmap]:
+        """Cached pixmap, or None while the loader thread reads it from the metadata cache."""
+        if self.prefetcher is None:
+            return None
+        url = item.url
+        pixmap = QPixmapCache.find(url)
+        if pixmap is not None and not pixmap.isNull():
+            return pixmap
+        if url in self._with_meta and url not in self._loading and url not in self._no_thumbnail:
+            if self._loader is None:
+                self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="queue-thumbnails")
+            self._loading.add(url)
+            self._loader.submit(self._load_thumbnail, item)
+        return None
+
+    def _load_thumbnail(self, item: DownloadItem):
+        """Loader thread: metadata (memory or disk) and the thumbnail file as a QImage."""
+        meta = self.prefetcher.cache.get(item.url)
+        image = QImage(meta.thumbnail) if meta is not None and meta.thumbnail else QImage()
+        self._thumbnail_ready.emit(item, image)
+
+    @Slot(object, object)
+    def _apply_thumbnail(self, item: DownloadItem, image: QImage):
+        self._loading.discard(item.url)
+        if image.isNull():
+            self._no_thumbnail.add(item.url)
+            return
+        QPixmapCache.insert(item.url, QPixmap.fromImage(image))
+        self.mark_dirty(item)
+
+    @Slot(object, object)
+    def _apply_metadata(self, item: DownloadItem, meta: ItemMetadata):
+        if meta.error:
+            return
+        index = self.queue.index_of(item)
+        if index < 0:
+            return
+        item.title = meta.title or item.title
+        self._with_meta.add(item.url)
+        self._no_thumbnail.discard(item.url)
+        self.queue.set_estimate(index, meta.duration, meta.filesize)
+        self._dirty.add(index)
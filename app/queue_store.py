@@ -0,0 +1,418 @@
+"""
+Shared download queue for Download App worker processes.
+A SQLite file (local or on a shared volume) that several headless workers
+drain together: items are claimed under a lease kept alive by heartbeats,
+expired leases are reclaimed, and completion is idempotent.
+
+This is the queue of ``--worker`` processes only; the GUI and the daemon
+keep their own in-memory QueueManager.
+"""
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .logger import get_logger
+from .queue_manager import AGING_RATE, DEFAULT_COST
+
+
+PENDING = "pending"
+LEASED = "leased"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+DEFAULT_LEASE_SECONDS = 60.0
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 2.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    quality TEXT NOT NULL DEFAULT 'auto',
+    priority INTEGER NOT NULL DEFAULT 0,
+    duration REAL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_id TEXT,
+    worker_id TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_claim ON items (state, priority);
+"""
+
+# Same order as QueueManager: priority, then shortest estimated job with aging
+_CLAIM_ORDER = f"priority DESC, COALESCE(duration, {DEFAULT_COST}) + {AGING_RATE} * created_at, id"
+
+
+@dataclass
+class Lease:
+    """An item claimed by one worker until ``expires`` (renewed by heartbeat)."""
+    item_id: int
+    url: str
+    quality: str
+    lease_id: str
+    attempt: int
+    expires: float
+
+
+class SQLiteQueueStore:
+    """Download queue in a SQLite file shared by several processes.
+
+    Every state change is a single guarded UPDATE, so a worker whose lease
+    expired (and whose item was claimed by someone else) cannot overwrite
+    the new owner's result. Method names mirror QueueManager where they
+    overlap (add_url, add_urls, get_stats).
+
+    Hosts' clocks are never compared: ``lease_expires`` is only a version
+    that every heartbeat changes. A claimer reclaims a lease once it has
+    seen the same version for ``lease_seconds`` on its own monotonic clock,
+    so clock skew between hosts cannot take a live lease away.
+    """
+
+    def __init__(self, path: Path, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS, wal: bool = False):
+        """Open (and create) the store.
+
+        Args:
+            path: SQLite file. Several hosts may share it over a network volume.
+            lease_seconds: How long a claim lasts without a heartbeat.
+            max_attempts: Claims per item before a failure is final.
+            wal: Use WAL journaling (faster, but only safe when every process
+                runs on the same host; network filesystems need the default).
+        """
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.wal = wal
+        self._local = threading.local()
+        # item id -> (lease_id, lease_expires, monotonic time this version was first seen)
+        self._seen: Dict[int, Tuple[str, float, float]] = {}
+        self._seen_lock = threading.Lock()
+        self.logger = get_logger("QueueStore")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # executescript commits on its own; CREATE ... IF NOT EXISTS is safe to race
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+            db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that takes the database lock up front (no upgrade deadlocks)."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # ---- producers ----
+
+    def add_url(self, url: str, quality: str = "auto", priority: int = 0,
+                duration: Optional[float] = None) -> bool:
+        """Queue a URL. Returns False if it is already in the store."""
+        return self.add_urls([url], quality, priority, duration) == 1
+
+    def add_urls(self, urls: List[str], quality: str = "auto", priority: int = 0,
+                 duration: Optional[float] = None) -> int:
+        """Queue several URLs in one transaction. Returns how many were new."""
+        now = time.time()
+        rows = [(url.strip(), quality, priority, duration, now, now) for url in urls if url.strip()]
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO items (url, quality, priority, duration, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            return db.total_changes - before
+
+    def set_priority(self, item_id: int, priority: int) -> bool:
+        with self._transaction() as db:
+            cur = db.execute("UPDATE items SET priority = ?, updated_at = ? WHERE id = ?",
+                             (priority, time.time(), item_id))
+            return cur.rowcount == 1
+
+    # ---- workers ----
+
+    def _stale_leases(self, db: sqlite3.Connection) -> List[int]:
+        """Leased items whose lease this store has watched go unrenewed for lease_seconds."""
+        rows = db.execute("SELECT id, lease_id, lease_expires FROM items WHERE state = ?", (LEASED,)).fetchall()
+        now = time.monotonic()
+        stale = []
+        with self._seen_lock:
+            seen, self._seen = self._seen, {}
+            for row in rows:
+                version = (row["lease_id"], row["lease_expires"])
+                previous = seen.get(row["id"])
+                first_seen = previous[2] if previous is not None and previous[:2] == version else now
+                self._seen[row["id"]] = (*version, first_seen)
+                if now - first_seen >= self.lease_seconds:
+                    stale.append(row["id"])
+        return stale
+
+    def _watch(self, item_id: int, lease_id: str, expires: float):
+        with self._seen_lock:
+            self._seen[item_id] = (lease_id, expires, time.monotonic())
+
+    def claim(self, worker_id: str) -> Optional[Lease]:
+        """Lease the next pending item (or one whose lease expired). None if the queue is drained."""
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        with self._transaction() as db:
+            stale = self._stale_leases(db)
+            while True:
+                marks = ", ".join("?" * len(stale))
+                row = db.execute(
+                    f"SELECT id, url, quality, attempts, state FROM items "
+                    f"WHERE state = ? OR (state = ? AND id IN ({marks})) "
+                    f"ORDER BY {_CLAIM_ORDER} LIMIT 1",
+                    (PENDING, LEASED, *stale)).fetchone()
+                if row is None:
+                    return None
+                if row["state"] != LEASED:
+                    break
+                if row["attempts"] < self.max_attempts:
+                    self.logger.warning(f"Reclaiming expired lease on item {row['id']}")
+                    break
+                # Its worker keeps dying on it (crash, OOM): stop handing it out
+                self.logger.error(f"Item {row['id']} lost its lease on every attempt; marking it failed")
+                db.execute(
+                    "UPDATE items SET state = ?, error = ?, lease_id = NULL, lease_expires = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    (FAILED, f"lease expired {row['attempts']} times", now, row["id"]))
+                stale.remove(row["id"])
+            expires = now + self.lease_seconds
+            db.execute(
+                "UPDATE items SET state = ?, lease_id = ?, worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (LEASED, lease_id, worker_id, expires, now, row["id"]))
+        self._watch(row["id"], lease_id, expires)
+        return Lease(row["id"], row["url"], row["quality"], lease_id, row["attempts"] + 1, expires)
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """Extend a lease. False means it was lost (expired and reclaimed): stop working on it."""
+        now = time.time()
+        expires = now + self.lease_seconds
+        with self._transaction() as db:
+            cur = db.execute(
+                "UPDATE items SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_id = ? AND state = ?",
+                (expires, now, lease.item_id, lease.lease_id, LEASED))
+        if cur.rowcount == 1:
+            lease.expires = expires
+            return True
+        return False
+
+    def complete(self, lease: Lease, result: str) -> bool:
+        """Record success. Safe to repeat; False if the lease was lost to another worker."""
+        with self._transaction() as db:
+            cur = db.execute(
+                "UPDATE items SET state = ?, result = ?, error = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_id = ? AND state IN (?, ?)",
+                (COMPLETED, result, time.time(), lease.item_id, lease.lease_id, LEASED, COMPLETED))
+        return cur.rowcount == 1
+
+    def fail(self, lease: Lease, error: str, retry: bool = True) -> bool:
+        """Record a failure: back to pending while attempts remain, else final.
+
+        Returns:
+            False if the lease was lost (the new owner's state is kept).
+        """
+        state = PENDING if retry and lease.attempt < self.max_attempts else FAILED
+        with self._transaction() as db:
+            cur = db.execute(
+                "UPDATE items SET state = ?, error = ?, lease_id = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_id = ? AND state = ?",
+                (state, error, time.time(), lease.item_id, lease.lease_id, LEASED))
+        return cur.rowcount == 1
+
+    def release(self, lease: Lease) -> bool:
+        """Give an item back untouched (worker shutting down); the attempt is not counted."""
+        with self._transaction() as db:
+            cur = db.execute(
+                "UPDATE items SET state = ?, attempts = attempts - 1, lease_id = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ? AND lease_id = ? AND state = ?",
+                (PENDING, time.time(), lease.item_id, lease.lease_id, LEASED))
+        return cur.rowcount == 1
+
+    # ---- inspection ----
+
+    def get_stats(self) -> Dict[str, int]:
+        """Item counts per state (same keys as QueueManager.get_stats where they apply)."""
+        rows = self._connect().execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall()
+        counts = {state: count for state, count in rows}
+        return {
+            "total": sum(counts.values()),
+            "completed": counts.get(COMPLETED, 0),
+            "failed": counts.get(FAILED, 0),
+            "pending": counts.get(PENDING, 0),
+            "downloading": counts.get(LEASED, 0),
+            "cancelled": counts.get(CANCELLED, 0),
+        }
+
+    def items(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        rows = self._connect().execute("SELECT * FROM items ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class QueueStoreWorker:
+    """Headless loop: claim an item, download it while heartbeating, record the outcome."""
+
+    def __init__(self, store: SQLiteQueueStore, outdir: Path, worker_id: Optional[str] = None,
+                 job_kwargs: Optional[Dict[str, Any]] = None):
+        """Initialize the worker.
+
+        Args:
+            store: Shared queue.
+            outdir: Where this worker writes downloads.
+            worker_id: Name recorded on leases (default: host-pid).
+            job_kwargs: Extra DownloadJob arguments (archive, limiter, disk_guard, ...).
+        """
+        self.store = store
+        self.outdir = Path(outdir)
+        self.worker_id = worker_id or default_worker_id()
+        self.job_kwargs = job_kwargs or {}
+        self._stop = threading.Event()
+        self.logger = get_logger("QueueStoreWorker")
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, exit_when_empty: bool = False) -> int:
+        """Process items until stopped (or the queue is drained). Returns items handled."""
+        handled = 0
+        while not self._stop.is_set():
+            lease = self.store.claim(self.worker_id)
+            if lease is None:
+                if exit_when_empty:
+                    break
+                self._stop.wait(IDLE_POLL_SECONDS)
+                continue
+            self.process(lease)
+            handled += 1
+        return handled
+
+    def process(self, lease: Lease):
+        """Download one leased item."""
+        from .cancellation import CancelToken, DownloadCancelled
+        from .disk_space import InsufficientDiskSpace
+        from .worker import DownloadJob
+
+        token = CancelToken()
+        lost = threading.Event()
+        done = threading.Event()
+
+        def keep_alive():
+            # Renew at a third of the lease so one missed beat is harmless
+            while not done.wait(self.store.lease_seconds / 3):
+                if not self.store.heartbeat(lease):
+                    self.logger.warning(f"Lost lease on {lease.url}; abandoning it")
+                    lost.set()
+                    token.cancel()
+                    return
+
+        heart = threading.Thread(target=keep_alive, name="lease-heartbeat", daemon=True)
+        heart.start()
+        self.logger.info(f"[{self.worker_id}] Claimed {lease.url} (attempt {lease.attempt})")
+        try:
+            job = DownloadJob(lease.url, str(self.outdir), lease.quality, cancel_token=token, **self.job_kwargs)
+            final_path = job.run()
+        except DownloadCancelled:
+            if not lost.is_set():
+                self.store.release(lease)
+            return
+        except InsufficientDiskSpace as e:
+            # Another worker may have room, but the attempt counts so an item
+            # too big for every worker ends up failed instead of cycling forever
+            self.logger.warning(f"{e}; releasing {lease.url}")
+            self.store.fail(lease, str(e))
+            self._stop.wait(IDLE_POLL_SECONDS)
+            return
+        except Exception as e:
+            self.logger.error(f"Download failed: {e}")
+            self.store.fail(lease, str(e))
+            return
+        finally:
+            done.set()
+            heart.join()
+        if not self.store.complete(lease, final_path):
+            self.logger.warning(f"Lease on {lease.url} was lost before completion; result not recorded")
+
+
+def main(argv: Optional[List[str]] = None):
+    """CLI: ``add`` URLs, run a ``work``er, or print ``status`` of a shared queue."""
+    parser = argparse.ArgumentParser(description="Shared download queue (SQLite) and headless workers")
+    parser.add_argument("--db", type=Path, required=True, help="Queue database (may be on a shared volume)")
+    parser.add_argument("--wal", action="store_true", help="WAL journaling (all workers on this host only)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="Queue URLs (or '-' to read them from stdin)")
+    add.add_argument("urls", nargs="+")
+    add.add_argument("--quality", default="auto")
+    add.add_argument("--priority", type=int, default=0)
+    work = sub.add_parser("work", help="Drain the queue")
+    work.add_argument("--outdir", type=Path, required=True)
+    work.add_argument("--worker-id")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length in seconds")
+    work.add_argument("--exit-when-empty", action="store_true")
+    sub.add_parser("status", help="Print item counts per state")
+    args = parser.parse_args(argv)
+
+    if args.command == "add":
+        import sys
+        from .url_filter import UrlPrefilter, FilteredURL
+
+        raw = sys.stdin.read().splitlines() if args.urls == ["-"] else args.urls
+        accepted = [r.url for r in map(UrlPrefilter().check, raw) if isinstance(r, FilteredURL)]
+        store = SQLiteQueueStore(args.db, wal=args.wal)
+        added = store.add_urls(accepted, args.quality, args.priority)
+        print(f"added {added}, skipped {len(raw) - added}")
+    elif args.command == "work":
+        from .logger import setup_logging
+
+        setup_logging()
+        store = SQLiteQueueStore(args.db, lease_seconds=args.lease, wal=args.wal)
+        args.outdir.mkdir(parents=True, exist_ok=True)
+        worker = QueueStoreWorker(store, args.outdir, args.worker_id)
+        try:
+            handled = worker.run(exit_when_empty=args.exit_when_empty)
+        except KeyboardInterrupt:
+            handled = 0
+        print(f"{worker.worker_id}: {handled} items")
+    else:
+        store = SQLiteQueueStore(args.db, wal=args.wal)
+        for key, value in store.get_stats().items():
+            print(f"{key:12s} {value}")
+
+
+if __name__ == "__main__":
+    main()
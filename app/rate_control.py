@@ -0,0 +1,216 @@
+"""
+Per-site adaptive concurrency for Download App.
+AIMD controller: each site's download limit grows while downloads succeed
+at a healthy throughput and is cut (with a backoff pause) on HTTP 429/403,
+bot checks or collapsing throughput. Learned limits persist in settings.
+"""
+import asyncio
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from .cancellation import CancelToken
+from .extractor_routes import domain_key
+from .logger import get_logger
+from .metrics import get_metrics
+
+
+# Lower-cased fragments of yt-dlp errors that mean "slow down"
+THROTTLE_MARKERS = (
+    "http error 429", "too many requests", "http error 403", "forbidden",
+    "not a bot", "confirm you", "captcha", "rate limit", "rate-limit", "ratelimit",
+)
+SITE_LIMITS_SETTING = "site_limits"
+BACKOFF_BASE = 5.0  # seconds paused after the first throttle; doubles per repeat
+BACKOFF_MAX = 300.0
+EWMA_ALPHA = 0.3
+# Throughput below this share of the site's best means it is being throttled silently
+SLOW_RATIO = 0.5
+POLL_INTERVAL = 0.25
+
+SITE_LIMIT = get_metrics().gauge("download_site_concurrency_limit", "Learned concurrency limit per site")
+
+
+def is_throttle_error(message: str) -> bool:
+    """True if an error message looks like rate limiting or a bot check."""
+    lower = message.lower()
+    return any(marker in lower for marker in THROTTLE_MARKERS)
+
+
+def site_key(url: str) -> str:
+    """Site a URL counts against ("www.youtube.com/watch..." -> "youtube.com")."""
+    return domain_key(urllib.parse.urlsplit(url.strip()).hostname or "")
+
+
+@dataclass
+class SiteState:
+    limit: float
+    in_flight: int = 0
+    blocked_until: float = 0.0
+    throttles: int = 0  # consecutive throttle responses (drives the backoff)
+    throughput: Optional[float] = None  # EWMA bytes/s
+    best_throughput: float = 0.0
+
+
+class AdaptiveConcurrency:
+    """Per-site download slots with additive-increase / multiplicative-decrease limits.
+
+    A success at healthy throughput adds ``1 / limit`` (about +1 per full
+    window of successes). A throttle multiplies the limit by ``decrease``
+    and pauses the site for an exponential backoff; a silent slowdown
+    (throughput under half the site's best) cuts it more gently.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, float]] = None,
+        initial: float = 2.0,
+        min_limit: float = 1.0,
+        max_limit: float = 8.0,
+        decrease: float = 0.5,
+        on_change: Optional[Callable[[Dict[str, float]], None]] = None,
+    ):
+        """Initialize the controller.
+
+        Args:
+            limits: Limits learned in earlier sessions (site -> limit).
+            initial: Limit for a site seen for the first time.
+            min_limit: Floor (a site is never blocked for good).
+            max_limit: Ceiling per site.
+            decrease: Factor applied on a throttle response.
+            on_change: Called with all limits when a site's whole-number limit changes.
+        """
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.on_change = on_change
+        self._sites: Dict[str, SiteState] = {
+            site: SiteState(min(max_limit, max(min_limit, float(limit))))
+            for site, limit in (limits or {}).items()
+        }
+        self._cond = threading.Condition()
+        self.logger = get_logger("AdaptiveConcurrency")
+
+    def _state(self, site: str) -> SiteState:
+        state = self._sites.get(site)
+        if state is None:
+            state = self._sites[site] = SiteState(self.initial)
+        return state
+
+    def try_acquire(self, site: str) -> float:
+        """Take a slot if one is free.
+
+        Returns:
+            0.0 if a slot was taken, else seconds to wait before retrying.
+        """
+        with self._cond:
+            state = self._state(site)
+            wait = state.blocked_until - time.monotonic()
+            if wait > 0:
+                return wait
+            if state.in_flight >= int(state.limit):
+                return POLL_INTERVAL
+            state.in_flight += 1
+            return 0.0
+
+    def acquire(self, site: str, cancel_token: Optional[CancelToken] = None):
+        """Block until a slot for site is free.
+
+        Raises:
+            DownloadCancelled: If the token is cancelled while waiting.
+        """
+        while True:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            wait = self.try_acquire(site)
+            if wait == 0.0:
+                return
+            with self._cond:
+                self._cond.wait(min(wait, 1.0))
+
+    async def acquire_async(self, site: str):
+        """Wait for a slot without blocking the event loop."""
+        while True:
+            wait = self.try_acquire(site)
+            if wait == 0.0:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self, site: str, success: bool, elapsed: float = 0.0,
+                nbytes: int = 0, error: Optional[str] = None):
+        """Return a slot and feed the outcome into the site's limit.
+
+        Args:
+            site: Site the slot was taken for (see site_key).
+            success: Whether the download finished.
+            elapsed: Seconds the download held the slot.
+            nbytes: Bytes downloaded (for the throughput estimate).
+            error: Error message of a failed (or throttled) attempt.
+        """
+        with self._cond:
+            state = self._state(site)
+            state.in_flight = max(0, state.in_flight - 1)
+            before = int(state.limit)
+            # A job that got through only after a bot check still counts as throttled
+            if error and is_throttle_error(error):
+                self._on_throttle(site, state)
+            elif success:
+                self._on_success(site, state, elapsed, nbytes)
+            changed = int(state.limit) != before
+            SITE_LIMIT.set(round(state.limit, 2), site=site)
+            self._cond.notify_all()
+            snapshot = self.limits() if changed else None
+        if snapshot is not None and self.on_change:
+            self.on_change(snapshot)
+
+    def _on_success(self, site: str, state: SiteState, elapsed: float, nbytes: int):
+        state.throttles = 0
+        if elapsed > 0 and nbytes > 0:
+            rate = nbytes / elapsed
+            state.throughput = rate if state.throughput is None else (
+                EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * state.throughput)
+            state.best_throughput = max(state.best_throughput, state.throughput)
+            if state.throughput < SLOW_RATIO * state.best_throughput:
+                # Getting slower as we add connections: back off gently
+                state.limit = max(self.min_limit, state.limit * 0.75)
+                self.logger.info(f"{site}: throughput dropped, limit -> {state.limit:.2f}")
+                return
+        state.limit = min(self.max_limit, state.limit + 1.0 / state.limit)
+
+    def _on_throttle(self, site: str, state: SiteState):
+        state.throttles += 1
+        state.limit = max(self.min_limit, state.limit * self.decrease)
+        backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (state.throttles - 1))
+        state.blocked_until = time.monotonic() + backoff
+        self.logger.warning(f"{site}: throttled, limit -> {state.limit:.2f}, pausing {backoff:.0f}s")
+
+    def limit(self, site: str) -> float:
+        """Current (fractional) limit for site."""
+        with self._cond:
+            return self._state(site).limit
+
+    def limits(self) -> Dict[str, float]:
+        """Learned limits to persist (site -> limit)."""
+        with self._cond:
+            return {site: round(state.limit, 2) for site, state in self._sites.items()}
+
+
+def limiter_from_settings(settings) -> AdaptiveConcurrency:
+    """Controller seeded with the limits learned in earlier sessions.
+
+    Limits are written back to settings whenever a site's whole-number
+    limit changes; call ``save_limits`` on shutdown to keep the rest.
+    """
+    return AdaptiveConcurrency(
+        settings.get(SITE_LIMITS_SETTING) or {},
+        on_change=lambda limits: settings.set(SITE_LIMITS_SETTING, limits),
+    )
+
+
+def save_limits(settings, limiter: Optional[AdaptiveConcurrency]):
+    """Persist the limiter's current limits (no-op without a limiter)."""
+    if limiter is not None:
+        settings.set(SITE_LIMITS_SETTING, limiter.limits())
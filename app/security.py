@@ -3,16 +3,27 @@ Security utilities for Download App.
 Includes filename sanitization and URL validation.
 """
 import re
+import unicodedata
 import urllib.parse
 from pathlib import Path
 
 
-INVALID_CHARS_PATTERN = re.compile(r'[<>:"|?*\x00-\x1f]')
+INVALID_CHARS_PATTERN = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
 INVALID_FILENAMES = {
     "con", "prn", "aux", "nul",
     "com1", "com2", "com3", "com4", "com5", "com6", "com7", "com8", "com9",
     "lpt1", "lpt2", "lpt3", "lpt4", "lpt5", "lpt6", "lpt7", "lpt8", "lpt9",
 }
+# Longest suffix kept when a long name is truncated (".mp4", ".webm", ".opus")
+MAX_EXTENSION_BYTES = 8
+
+
+def truncate_bytes(text: str, max_bytes: int) -> str:
+    """Cut text to at most max_bytes of UTF-8 without splitting a character."""
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    return data[:max_bytes].decode("utf-8", errors="ignore")
 
 
 def sanitize_filename(filename: str, max_length: int = 255) -> str:
@@ -20,36 +31,36 @@ def sanitize_filename(filename: str, max_length: int = 255) -> str:
     
     Args:
         filename: Original filename.
-        max_length: Maximum length for the filename (default 255 for most filesystems).
+        max_length: Maximum length in UTF-8 bytes (255 is the limit of most filesystems;
+            Vietnamese letters take 2-3 bytes each).
         
     Returns:
-        Sanitized filename.
+        Sanitized filename (NFC-normalized).
     """
-    # Remove invalid characters
-    sanitized = INVALID_CHARS_PATTERN.sub("_", filename)
+    # Remove invalid characters (path separators included)
+    sanitized = INVALID_CHARS_PATTERN.sub("_", unicodedata.normalize("NFC", filename))
     
     # Remove leading/trailing spaces and dots
     sanitized = sanitized.strip(". ")
     
-    # Handle reserved names (Windows)
-    name_without_ext = sanitized.rsplit(".", 1)[0].lower()
+    # Handle reserved names (Windows reserves "con.txt" and "con.tar.gz" too)
+    name_without_ext = sanitized.split(".", 1)[0].rstrip(" ").lower()
     if name_without_ext in INVALID_FILENAMES:
         sanitized = "_" + sanitized
     
-    # Ensure not empty
-    if not sanitized:
-        sanitized = "download"
-    
     # Truncate if too long
-    if len(sanitized) > max_length:
+    if len(sanitized.encode("utf-8")) > max_length:
         # Try to preserve extension
-        parts = sanitized.rsplit(".", 1)
-        if len(parts) == 2:
-            name, ext = parts
-            max_name = max_length - len(ext) - 1
-            sanitized = name[:max_name] + "." + ext
+        name, dot, ext = sanitized.rpartition(".")
+        if dot and name and " " not in ext and len(ext.encode("utf-8")) <= MAX_EXTENSION_BYTES:
+            max_name = max_length - len(ext.encode("utf-8")) - 1
+            sanitized = truncate_bytes(name, max_name).rstrip(". ") + "." + ext
         else:
-            sanitized = sanitized[:max_length]
+            sanitized = truncate_bytes(sanitized, max_length).rstrip(". ")
+    
+    # Ensure not empty
+    if not sanitized:
+        sanitized = "download"
     
     return sanitized
 
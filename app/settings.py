@@ -2,9 +2,12 @@
 Settings manager for Download App.
 Handles loading/saving user preferences (downloads folder, dark mode, window size, etc.).
 """
+import copy
 import json
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+
+from .tracing import get_tracer
 
 
 class SettingsManager:
@@ -30,25 +33,45 @@ class SettingsManager:
         self.config_dir = Path(config_dir)
         self.config_file = self.config_dir / "settings.json"
         self.config_dir.mkdir(parents=True, exist_ok=True)
+        # (mtime_ns, size) of settings.json -> its parsed content; re-read only when the file changes
+        self._cache: Optional[Tuple[Tuple[int, int], Dict[str, Any]]] = None
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.config_file.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
 
     def load(self) -> Dict[str, Any]:
         """Load settings from file. Return defaults if file doesn't exist."""
-        if self.config_file.exists():
-            try:
+        stamp = self._stamp()
+        if stamp is None:
+            return self._default_settings()
+        cache = self._cache
+        if cache is not None and cache[0] == stamp:
+            return copy.deepcopy(cache[1])
+        try:
+            with get_tracer().span("settings.load"):
                 with open(self.config_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                pass
-        return self._default_settings()
+                    settings = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return self._default_settings()
+        self._cache = (stamp, settings)
+        return copy.deepcopy(settings)
 
     def save(self, settings: Dict[str, Any]) -> None:
         """Save settings to file."""
         try:
-            self.config_dir.mkdir(parents=True, exist_ok=True)
-            with open(self.config_file, "w", encoding="utf-8") as f:
-                json.dump(settings, f, indent=2, ensure_ascii=False)
+            with get_tracer().span("settings.save"):
+                self.config_dir.mkdir(parents=True, exist_ok=True)
+                with open(self.config_file, "w", encoding="utf-8") as f:
+                    json.dump(settings, f, indent=2, ensure_ascii=False)
         except IOError as e:
             print(f"Failed to save settings: {e}")
+            return
+        stamp = self._stamp()
+        self._cache = (stamp, copy.deepcopy(settings)) if stamp is not None else None
 
     def _default_settings(self) -> Dict[str, Any]:
         """Return default settings."""
@@ -0,0 +1,200 @@
+"""
+Lightweight tracing for Download App.
+Named timing spans per download phase, exported as JSON lines to the log directory
+(rotated, written on a background thread), with optional cProfile capture per job.
+"""
+import atexit
+import cProfile
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .logger import RotatingLogFileHandler
+from .metrics import get_metrics
+
+
+TRACE_FILE = "traces.jsonl"
+PROFILE_DIR = "profiles"
+# Set to "1" to capture a cProfile dump for every job
+PROFILE_ENV = "DOWNLOAD_APP_PROFILE"
+# Records kept in memory until configure() tells us where to write them
+MAX_BUFFERED = 1000
+
+# Every job trace also feeds the metrics registry
+PHASE_SECONDS = get_metrics().histogram("download_phase_seconds", "Time spent per download phase")
+ITEMS_TOTAL = get_metrics().counter("download_items_total", "Finished download items by status")
+FAILURES_TOTAL = get_metrics().counter("download_failures_total", "Failed download items by error class")
+
+
+class _TraceFormatter(logging.Formatter):
+    """A trace record travels as the log record's msg; the file gets it as one JSON line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False)
+
+
+class Tracer:
+    """Collect span records and append them to ``<log_dir>/traces.jsonl``.
+
+    write() only puts the record on a queue; like the log pipeline, a
+    QueueListener thread does the JSON encoding and the disk I/O, and the
+    file is rotated by size/age with the same retention as app.log.
+    Records emitted before configure() (e.g. GUI startup spans) are
+    buffered and flushed once the log directory is known.
+    """
+
+    def __init__(self):
+        self.log_dir: Optional[Path] = None
+        self.enabled = True
+        self.profile_jobs = os.environ.get(PROFILE_ENV) == "1"
+        self._buffer: List[Dict[str, Any]] = []
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._lock = threading.Lock()
+
+    def configure(self, log_dir: Path, profile_jobs: Optional[bool] = None):
+        """Set the output directory, start the writer thread and flush buffered records."""
+        self.shutdown()
+        with self._lock:
+            self.log_dir = Path(log_dir)
+            if profile_jobs is not None:
+                self.profile_jobs = profile_jobs or os.environ.get(PROFILE_ENV) == "1"
+            try:
+                self.log_dir.mkdir(parents=True, exist_ok=True)
+                handler = RotatingLogFileHandler(self.log_dir / TRACE_FILE)
+            except OSError:
+                return
+            handler.setFormatter(_TraceFormatter())
+            self._listener = logging.handlers.QueueListener(self._queue, handler)
+            self._listener.start()
+            buffered, self._buffer = self._buffer, []
+        for record in buffered:
+            self.write(record)
+
+    def write(self, record: Dict[str, Any]):
+        """Queue a record for the writer thread (never blocks on disk)."""
+        if not self.enabled:
+            return
+        record.setdefault("ts", datetime.now().isoformat(timespec="milliseconds"))
+        with self._lock:
+            if self._listener is None:
+                if len(self._buffer) < MAX_BUFFERED:
+                    self._buffer.append(record)
+                return
+        self._queue.put(logging.makeLogRecord({"msg": record}))
+
+    def shutdown(self):
+        """Write out queued records and stop the writer thread."""
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[None]:
+        """Time a standalone block (e.g. startup); not meant for per-call hot paths."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"kind": "span", "name": name, "ms": round((time.perf_counter() - start) * 1000, 3)}
+            record.update(attrs)
+            self.write(record)
+
+    def job(self, url: str) -> "JobTrace":
+        return JobTrace(self, url)
+
+
+class JobTrace:
+    """Phase timings for one download item.
+
+    Each ``span(phase)`` adds to that phase's total; ``finish(status)``
+    writes a single ``{"kind": "job", ...}`` line with every phase.
+    """
+
+    def __init__(self, tracer: Tracer, url: str):
+        self.tracer = tracer
+        self.url = url
+        self.item_id = uuid.uuid4().hex[:12]
+        self.phases: Dict[str, float] = {}
+        self._start = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.phases[phase] = round(self.phases.get(phase, 0.0) + elapsed, 3)
+            PHASE_SECONDS.observe(elapsed / 1000, phase=phase)
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        """cProfile the calling thread for the block if profiling is enabled.
+
+        The dump goes to ``<log_dir>/profiles/<item_id>.prof`` (view it with
+        ``python -m pstats`` or snakeviz).
+        """
+        if not self.tracer.profile_jobs or self.tracer.log_dir is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            out_dir = self.tracer.log_dir / PROFILE_DIR
+            try:
+                out_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(out_dir / f"{self.item_id}.prof"))
+            except OSError:
+                pass
+
+    def finish(self, status: str, **attrs):
+        """Write the job record once; later calls are ignored.
+
+        Pass ``error=<exception class name>`` for failed jobs so failures
+        are counted by class.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        ITEMS_TOTAL.inc(status=status)
+        if attrs.get("error"):
+            FAILURES_TOTAL.inc(error=attrs["error"])
+        record = {
+            "kind": "job",
+            "item_id": self.item_id,
+            "url": self.url,
+            "status": status,
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "phases": dict(self.phases),
+        }
+        record.update({k: v for k, v in attrs.items() if v is not None})
+        self.tracer.write(record)
+
+
+_tracer = Tracer()
+atexit.register(_tracer.shutdown)
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer."""
+    return _tracer
@@ -0,0 +1,247 @@
+"""
+Bulk URL pre-filter for Download App.
+Streams pasted lists or files of URLs through validation, normalization,
+non-video rejection, site classification and dedup in one pass (no network).
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+
+# Rejection reasons
+EMPTY = "empty"
+INVALID = "invalid"
+IMAGE = "image"
+TIKTOK_PHOTO = "tiktok_photo"
+DUPLICATE = "duplicate"
+
+# scheme, host[:port], path, query (fragment is dropped)
+_URL_RE = re.compile(r"(?i)(https?)://([^/?#\s@]+@)?([^/?#\s]+)([^?#\s]*)(?:\?([^#\s]*))?(?:#\S*)?")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+# Query parameters that never change which video a URL points to
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "igshid", "si", "feature", "pp", "_r", "_t",
+    "is_from_webapp", "sender_device", "web_id", "share_app_id", "ref", "ref_src",
+}
+# Cheap pre-check so clean queries skip the split/join
+_TRACKING_RE = re.compile(r"(?:^|&)(?:utm_|(?:%s)(?:=|&|$))" % "|".join(re.escape(p) for p in TRACKING_PARAMS))
+# Host aliases that serve the same pages
+HOST_ALIASES = {
+    "youtube.com": "www.youtube.com",
+    "m.youtube.com": "www.youtube.com",
+    "tiktok.com": "www.tiktok.com",
+    "m.tiktok.com": "www.tiktok.com",
+    "m.facebook.com": "www.facebook.com",
+    "facebook.com": "www.facebook.com",
+    "instagram.com": "www.instagram.com",
+}
+# Registrable domain -> site name used for routing and stats
+SITES = {
+    "youtube.com": "youtube", "youtu.be": "youtube",
+    "tiktok.com": "tiktok",
+    "facebook.com": "facebook", "fb.watch": "facebook",
+    "instagram.com": "instagram",
+    "twitter.com": "twitter", "x.com": "twitter",
+    "vimeo.com": "vimeo",
+    "dailymotion.com": "dailymotion", "dai.ly": "dailymotion",
+    "twitch.tv": "twitch",
+    "reddit.com": "reddit", "redd.it": "reddit",
+    "soundcloud.com": "soundcloud",
+    "bilibili.com": "bilibili",
+}
+GENERIC_SITE = "generic"
+
+
+@dataclass
+class FilteredURL:
+    """A URL that passed the pre-filter."""
+    url: str  # normalized URL (what gets queued)
+    original: str
+    site: str
+    extractor: Optional[str] = None  # yt-dlp ie_key, when resolved
+
+
+@dataclass
+class Rejection:
+    """A URL that was dropped, with the reason and its 1-based input position."""
+    url: str
+    reason: str
+    line: int
+
+
+@dataclass
+class PrefilterResult:
+    accepted: List[FilteredURL] = field(default_factory=list)
+    rejected: List[Rejection] = field(default_factory=list)
+
+    def reasons(self) -> Dict[str, int]:
+        """Count of rejections per reason."""
+        counts: Dict[str, int] = {}
+        for rejection in self.rejected:
+            counts[rejection.reason] = counts.get(rejection.reason, 0) + 1
+        return counts
+
+
+@lru_cache(maxsize=4096)
+def classify_site(host: str) -> str:
+    """Map a lowercase host to a site name ("youtube", "tiktok", ..., "generic")."""
+    labels = host.split(".")
+    # Try "a.b.c", then "b.c": the longest known suffix wins
+    for i in range(max(0, len(labels) - 3), len(labels) - 1):
+        site = SITES.get(".".join(labels[i:]))
+        if site:
+            return site
+    return GENERIC_SITE
+
+
+def _clean_query(query: str) -> str:
+    kept = [
+        param for param in query.split("&")
+        if param and not param.startswith("utm_") and param.split("=", 1)[0] not in TRACKING_PARAMS
+    ]
+    return "&".join(kept)
+
+
+@lru_cache(maxsize=4096)
+def _resolve_host(scheme: str, host: str) -> Optional[str]:
+    """Lowercase, drop the default port and apply HOST_ALIASES (hosts repeat a lot)."""
+    host = host.lower().rstrip(".")
+    if host.endswith(":80") and scheme == "http" or host.endswith(":443") and scheme == "https":
+        host = host.rsplit(":", 1)[0]
+    if not host or host.startswith(":"):
+        return None
+    return HOST_ALIASES.get(host, host)
+
+
+def normalize_url(url: str) -> Optional[Tuple[str, str, str]]:
+    """Validate and normalize one URL.
+
+    Lowercases scheme and host, drops default ports, credentials,
+    fragments and tracking parameters, and folds host aliases
+    (youtu.be/<id> becomes a watch URL).
+
+    Returns:
+        (normalized URL, host, path), or None if the URL is not a valid
+        http(s) URL. Same acceptance rule as security.validate_url.
+    """
+    m = _URL_RE.fullmatch(url)
+    if m is None:
+        return None
+    scheme, _, host, path, query = m.groups()
+    scheme = scheme.lower()
+    host = _resolve_host(scheme, host)
+    if host is None:
+        return None
+    if host == "youtu.be" and len(path) > 1:
+        video_id = path[1:].split("/", 1)[0]
+        host, path = "www.youtube.com", "/watch"
+        query = f"v={video_id}" + (f"&{query}" if query else "")
+    if query and _TRACKING_RE.search(query):
+        query = _clean_query(query)
+    normalized = f"{scheme}://{host}{path}" + (f"?{query}" if query else "")
+    return normalized, host, path
+
+
+def rejection_reason(host: str, path: str) -> Optional[str]:
+    """Reason a valid URL is known not to be a video, or None."""
+    if path[-5:].lower().endswith(IMAGE_EXTENSIONS):
+        return IMAGE
+    # TikTok photo posts: yt-dlp fails on them, catch them before queueing
+    if "/photo/" in path and classify_site(host) == "tiktok":
+        return TIKTOK_PHOTO
+    return None
+
+
+class UrlPrefilter:
+    """Single-pass pre-filter that remembers what it has accepted (for dedup).
+
+    Pass ``seen`` to also treat URLs already queued elsewhere as duplicates.
+    With ``resolve_extractors`` each accepted URL is also routed to its
+    yt-dlp extractor (offline, see extractor_routes; needs yt_dlp).
+    """
+
+    def __init__(self, seen: Optional[Set[str]] = None, resolve_extractors: bool = False):
+        self.seen: Set[str] = set(seen) if seen else set()
+        self._router = None
+        if resolve_extractors:
+            from .extractor_routes import get_router
+            self._router = get_router()
+
+    def check(self, url: str) -> Union[FilteredURL, str]:
+        """Filter one URL. Returns the accepted item or a rejection reason."""
+        original = url
+        url = url.strip()
+        if not url:
+            return EMPTY
+        normalized = normalize_url(url)
+        if normalized is None:
+            return INVALID
+        url, host, path = normalized
+        reason = rejection_reason(host, path)
+        if reason:
+            return reason
+        if url in self.seen:
+            return DUPLICATE
+        self.seen.add(url)
+        extractor = self._router.resolve_key(url) if self._router is not None else None
+        return FilteredURL(url, original, classify_site(host), extractor)
+
+    def iter_filter(self, urls: Iterable[str]) -> Iterator[Tuple[int, Union[FilteredURL, str]]]:
+        """Stream (1-based position, accepted item or rejection reason) per input URL."""
+        for line, url in enumerate(urls, 1):
+            yield line, self.check(url)
+
+    def filter(self, urls: Iterable[str], skip_blank: bool = True) -> PrefilterResult:
+        """Filter a list (or any iterable) of URLs.
+
+        Args:
+            urls: URLs, e.g. lines of pasted text or of a file.
+            skip_blank: Ignore empty lines instead of reporting them.
+        """
+        result = PrefilterResult()
+        accept = result.accepted.append
+        reject = result.rejected.append
+        check = self.check
+        for line, url in enumerate(urls, 1):
+            outcome = check(url)
+            if isinstance(outcome, FilteredURL):
+                accept(outcome)
+            elif outcome != EMPTY or not skip_blank:
+                reject(Rejection(url.strip(), outcome, line))
+        return result
+
+    def filter_file(self, path: Path) -> PrefilterResult:
+        """Filter a text file with one URL per line (streamed, not read whole)."""
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return self.filter(line.rstrip("\n") for line in f)
+
+
+def prefilter(urls: Iterable[str], seen: Optional[Set[str]] = None) -> PrefilterResult:
+    """Filter a batch of URLs in one pass (see UrlPrefilter)."""
+    return UrlPrefilter(seen).filter(urls)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Filter a URL file: accepted URLs to stdout, a summary of rejections to stderr."""
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Pre-filter a list of URLs (one per line)")
+    parser.add_argument("file", type=Path, help="Text file with one URL per line")
+    parser.add_argument("--rejected", action="store_true", help="Also list every rejected line")
+    args = parser.parse_args(argv)
+
+    result = UrlPrefilter().filter_file(args.file)
+    out = sys.stdout
+    for item in result.accepted:
+        out.write(item.url + "\n")
+    if args.rejected:
+        for rejection in result.rejected:
+            print(f"{rejection.line}: {rejection.reason}: {rejection.url}", file=sys.stderr)
+    print(f"accepted {len(result.accepted)}, rejected {result.reasons()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
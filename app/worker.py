@@ -0,0 +1,738 @@
+"""
+Download worker for Download App.
+Runs a single yt-dlp download plus HEVC → H.264 post-processing.
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import subprocess
+import threading
+import time
+import os
+
+from .archive import DownloadArchive
+from .dedup import ContentIndex, link_duplicate
+from .extractor_routes import GENERIC, get_router, is_routing_error
+from .cancellation import CancelToken, DownloadCancelled, CANCELLED_MESSAGE
+from .ffmpeg_tools import (
+    CREATE_NO_WINDOW, COVER_ART_CONTAINERS, find_ffmpeg, probe_command, output_is_hevc, transcode_command,
+    audio_tag_command,
+)
+from .logger import get_logger, log_context, YtDlpLogger
+from .naming import OutputNamer, get_namer
+from .tracing import get_tracer
+from .metrics import get_metrics
+from .rate_control import AdaptiveConcurrency, is_throttle_error, site_key
+from .disk_space import DiskSpaceGuard, TRANSCODE_HEADROOM, estimate_bytes, may_need_transcode
+from .format_select import FormatDecision, FormatPreferences, FormatSelector
+
+
+BYTES_TOTAL = get_metrics().counter("download_bytes_total", "Bytes downloaded by yt-dlp")
+TRANSCODES_TOTAL = get_metrics().counter("download_transcodes_total", "HEVC transcodes by result")
+ACTIVE_JOBS = get_metrics().gauge("download_active_jobs", "Download jobs currently running")
+
+TRANSCODE_STATUS = "Chuyển đổi video sang định dạng H.264 (tương thích Windows)..."
+TAG_STATUS = "Ghi thông tin bài hát và ảnh bìa..."
+THUMBNAIL_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+# yt-dlp info field -> ffmpeg metadata key written on audio files
+AUDIO_TAGS = {
+    "title": "title",
+    "artist": "artist",
+    "uploader": "artist",
+    "album": "album",
+    "upload_date": "date",
+    "webpage_url": "comment",
+}
+
+
+def warm_up(cache_dir: Optional[Path] = None):
+    """Import yt_dlp, load the extractor routing table and locate ffmpeg ahead of the first job.
+
+    Args:
+        cache_dir: Where to cache the routing table if it has to be built.
+    """
+    import yt_dlp
+
+    get_router(cache_dir)
+    find_ffmpeg()
+
+
+# Output template field set per video by _OutputName
+NAME_FIELD = "app_filename"
+
+
+class _OutputName:
+    """yt-dlp "video" pre-processor: picks a unique, sanitized name once the title is known."""
+
+    def __init__(self, job: "DownloadJob"):
+        self.job = job
+
+    def set_downloader(self, downloader):
+        pass
+
+    def add_progress_hook(self, hook):
+        pass
+
+    def run(self, info):
+        info[NAME_FIELD] = self.job.output_name(info)
+        return [], info
+
+
+class _AdmissionCheck:
+    """yt-dlp "before_dl" pre-processor: runs once formats are chosen, before any byte is fetched."""
+
+    def __init__(self, job: "DownloadJob"):
+        self.job = job
+
+    def set_downloader(self, downloader):
+        pass
+
+    def add_progress_hook(self, hook):
+        pass
+
+    def run(self, info):
+        self.job.reserve_space(info)
+        return [], info
+
+
+def audio_tags(info: Dict[str, Any]) -> Dict[str, str]:
+    """ffmpeg metadata for an audio download from its yt-dlp info dict (first source wins)."""
+    tags: Dict[str, str] = {}
+    for field, key in AUDIO_TAGS.items():
+        value = info.get(field)
+        if value and key not in tags:
+            tags[key] = str(value)
+    date = tags.get("date", "")
+    if len(date) == 8 and date.isdigit():
+        tags["date"] = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+    return tags
+
+
+class DownloadJob:
+    """Download one URL without any Qt dependency.
+
+    Progress is reported through a plain callback so the same job can be
+    driven by the GUI thread worker, the headless daemon or the asyncio
+    engine. Each phase is a separate method so callers can schedule
+    them independently.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        outdir: str,
+        quality: str = "auto",
+        on_progress: Optional[Callable[[int, str], None]] = None,
+        cancel_token: Optional[CancelToken] = None,
+        archive: Optional[DownloadArchive] = None,
+        content_index: Optional[ContentIndex] = None,
+        limiter: Optional[AdaptiveConcurrency] = None,
+        disk_guard: Optional[DiskSpaceGuard] = None,
+        format_prefs: Optional[FormatPreferences] = None,
+    ):
+        self.url = url
+        self.outdir = outdir
+        self.quality = quality  # "auto", "1080p", "720p", "audio"
+        # Audio skips the mp4 convertor and the HEVC probe: one ffmpeg pass for tags + cover
+        self.audio_only = quality == "audio"
+        self.on_progress = on_progress
+        self.cancel_token = cancel_token or CancelToken()
+        self.format_prefs = format_prefs
+        self.format_decision: Optional[FormatDecision] = None  # set once yt-dlp picked formats
+        self.archive = archive
+        self.content_index = content_index
+        # Per-site slots: download() waits for one unless the caller already took it
+        self.limiter = limiter
+        self.site = site_key(url)
+        self.slot_acquired = False
+        self._slot_lock = threading.Lock()
+        self._download_started = None
+        self._downloaded_bytes = 0
+        self._throttle_error = None  # bot/429 error a later strategy got past
+        self.disk_guard = disk_guard
+        self._reservation = None
+        # Set by extract() when a pipeline runs extraction as its own stage
+        self._ydl = None
+        self._ie_result = None
+        self._extract_error = None
+        self._source_digest = None  # full hash of the HEVC source, for the transcode cache
+        self._last_percent = 0
+        self._last_filename = None
+        self._archive_id = None  # (extractor_key, video_id) from yt-dlp info
+        self._names: Dict[str, Tuple[OutputNamer, Hashable]] = {}  # stems claimed, released after download()
+        self._tags: Dict[str, str] = {}  # audio metadata from yt-dlp info
+        # Phase timings (extract/download/probe/transcode/replace) for this item
+        self.trace = get_tracer().job(url)
+        self.logger = get_logger("DownloadWorker")
+
+    def _emit_progress(self, percent: int, text: str):
+        if self.on_progress:
+            self.on_progress(percent, text)
+
+    def _run_process(self, cmd, capture: bool, timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        """Run a child process that is killed as soon as the job is cancelled.
+
+        Returns:
+            (returncode, stdout + stderr bytes).
+
+        Raises:
+            DownloadCancelled: If the token was cancelled while the process ran.
+            subprocess.TimeoutExpired: If timeout elapsed (process is killed).
+        """
+        pipe = subprocess.PIPE if capture else subprocess.DEVNULL
+        proc = subprocess.Popen(cmd, stdout=pipe, stderr=pipe, creationflags=CREATE_NO_WINDOW)
+        self.cancel_token.register_process(proc)
+        try:
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise
+        finally:
+            self.cancel_token.unregister_process(proc)
+        self.cancel_token.raise_if_cancelled()
+        return proc.returncode, (stdout or b"") + (stderr or b"")
+
+    def probe(self, src: Path) -> bool:
+        """True if the downloaded file is HEVC and needs a transcode."""
+        return self._detect_hevc(str(src))
+
+    def _detect_hevc(self, video_path: str) -> bool:
+        """Detect if video uses HEVC codec using ffmpeg output."""
+        try:
+            ffmpeg_cmd = find_ffmpeg()
+            if not ffmpeg_cmd:
+                self.logger.warning("ffmpeg not found; cannot detect HEVC codec")
+                return False
+
+            # Use ffmpeg to probe video (parse output for hevc/h265/hvc1/bytevc1)
+            try:
+                # Get bytes, not text (avoid encoding issues)
+                with self.trace.span("probe"):
+                    _, output = self._run_process(probe_command(ffmpeg_cmd, video_path), capture=True, timeout=10)
+                is_hevc = output_is_hevc(output)
+                self.logger.info(f"Video codec check: HEVC={is_hevc}")
+                return is_hevc
+            except subprocess.TimeoutExpired:
+                self.logger.warning("Timeout detecting HEVC codec")
+                return False
+        except DownloadCancelled:
+            raise
+        except Exception as e:
+            self.logger.warning(f"Error detecting HEVC codec: {e}")
+            return False
+
+    def _progress_hook(self, d):
+        # Raising here aborts the yt-dlp transfer on the next chunk
+        self.cancel_token.raise_if_cancelled()
+        status = d.get("status")
+        if status == "downloading":
+            downloaded = d.get("downloaded_bytes", 0)
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            if total:
+                try:
+                    percent = int(downloaded * 100 / total)
+                except Exception:
+                    percent = 0
+            else:
+                percent = 0
+            if self._reservation is not None:
+                # Bytes on disk already show up in the free space
+                self._reservation.written = self._downloaded_bytes + (downloaded or 0)
+            eta = d.get("eta")
+            text = f"Đang tải... {percent}% (ETA: {eta}s)" if eta is not None else f"Đang tải... {percent}%"
+            # throttle signals if percent hasn't changed to avoid UI spam
+            if percent != self._last_percent:
+                self._last_percent = percent
+                self._emit_progress(percent, text)
+        elif status == "finished":
+            filename = d.get("filename") or ""
+            # remember downloaded filename for post-processing
+            self._last_filename = filename
+            nbytes = d.get("downloaded_bytes") or d.get("total_bytes") or 0
+            self._downloaded_bytes += nbytes
+            BYTES_TOTAL.inc(nbytes)
+            info = d.get("info_dict") or {}
+            if info.get("extractor_key") and info.get("id"):
+                self._archive_id = (info["extractor_key"], info["id"])
+            if self.audio_only:
+                self._tags = audio_tags(info)
+            # Do NOT emit a UI progress update here — conversion will run
+            # and the UI will be updated once everything (including conversion) completes.
+
+    def _postprocessor_hook(self, d):
+        self.cancel_token.raise_if_cancelled()
+
+    def build_ydl_opts(self) -> Dict[str, Any]:
+        """Build yt-dlp options for this job."""
+        # The name is filled in per video by _OutputName (sanitized, unique in outdir)
+        outtmpl = str(Path(self.outdir) / f"%({NAME_FIELD})s.%(ext)s")
+
+        ydl_opts = {
+            "outtmpl": outtmpl,
+            "progress_hooks": [self._progress_hook],
+            "postprocessor_hooks": [self._postprocessor_hook],
+            # Keep .part files on cancel/failure so the next attempt resumes them
+            "continuedl": True,
+            # Ranked per video: a progressive file or a pair that only needs a remux
+            "format": FormatSelector(self.quality, self.format_prefs, on_decision=self._on_format_decision),
+            # Route yt-dlp output through our logging pipeline instead of stdout
+            "logger": YtDlpLogger(get_logger("yt_dlp")),
+            "quiet": True,
+            "noprogress": True,
+            "no_warnings": False,
+            # Use web client only (most compatible)
+            "extractor_args": {
+                "youtube": {
+                    "player_client": ["web"],
+                }
+            },
+            # Auto-merge video and audio when needed
+            "postprocessors": [{
+                "key": "FFmpegVideoConvertor",
+                "preferedformat": "mp4"
+            }],
+        }
+        if self.audio_only:
+            # Keep the native audio container; tag_audio() embeds the thumbnail
+            ydl_opts["postprocessors"] = []
+            ydl_opts["writethumbnail"] = True
+
+        # Check if cookies.txt exists in project root
+        cookies_file = Path(__file__).resolve().parents[1] / "cookies.txt"
+        if cookies_file.exists():
+            ydl_opts["cookiefile"] = str(cookies_file)
+            self.logger.info(f"Using cookies from: {cookies_file}")
+        return ydl_opts
+
+    def output_name(self, info: Dict[str, Any]) -> str:
+        """Unique file stem in outdir for a resolved video (retries get the same one back)."""
+        from yt_dlp.utils import sanitize_filename as ydl_sanitize
+
+        # yt-dlp sanitizes template fields once more; the index keeps what ends up on disk
+        namer = get_namer(Path(self.outdir), normalize=ydl_sanitize)
+        # Per entry of this URL: generic-extractor ids alone repeat across sites
+        key = (self.url, info.get("id"))
+        stem = namer.claim(info.get("title") or info.get("id"), key)
+        self._names[stem] = (namer, key)
+        return stem
+
+    def release_names(self, completed: bool):
+        """Release the names this job claimed (kept under its key for resume if it failed)."""
+        names, self._names = self._names, {}
+        for stem, (namer, key) in names.items():
+            namer.release(stem, key, completed)
+
+    def _on_format_decision(self, decision: FormatDecision):
+        self.format_decision = decision
+
+    @property
+    def format_id(self) -> Optional[str]:
+        """yt-dlp format id(s) that were downloaded ("137+140"), once chosen."""
+        return self.format_decision.format_id if self.format_decision else None
+
+    def reserve_space(self, info: Dict[str, Any]):
+        """Reserve the estimated size of the chosen formats (plus transcode headroom).
+
+        Raises:
+            InsufficientDiskSpace: If it would eat into the free-space floor.
+        """
+        if self.disk_guard is None or self._reservation is not None:
+            return
+        size = estimate_bytes(info)
+        if size is None:
+            # No size in the metadata: only enforce the floor
+            self.disk_guard.check()
+            return
+        if may_need_transcode(info):
+            size += int(size * TRANSCODE_HEADROOM)
+        self._reservation = self.disk_guard.reserve(size)
+
+    def release_space(self):
+        """Drop this job's reservation (its files are on disk by now)."""
+        if self._reservation is not None:
+            self._reservation.release()
+            self._reservation = None
+
+    def _extract(self, ydl):
+        with self.trace.span("extract"):
+            # Routed offline: yt-dlp instantiates only this extractor instead of trying them all
+            try:
+                ie_key = get_router().resolve_key(self.url)
+            except Exception as e:
+                self.logger.warning(f"Extractor routing failed, letting yt-dlp pick: {e}")
+                ie_key = None
+            try:
+                return ydl.extract_info(self.url, download=False, process=False, ie_key=ie_key)
+            except Exception as e:
+                # A stale route (extractor renamed or no longer matching): retry the normal way.
+                # Generic routes were already confirmed by a full scan, so they are not retried.
+                if ie_key in (None, GENERIC) or self.cancel_token.cancelled or not is_routing_error(str(e)):
+                    raise
+                self.logger.warning(f"Route {ie_key} did not handle {self.url}; retrying without it")
+                return ydl.extract_info(self.url, download=False, process=False)
+
+    def _ydl_download(self, ydl):
+        """Extract then download with one YoutubeDL, timing the phases separately."""
+        ydl.add_post_processor(_OutputName(self), when="video")
+        if self.disk_guard is not None:
+            ydl.add_post_processor(_AdmissionCheck(self), when="before_dl")
+        ie_result, self._ie_result = self._ie_result, None
+        if ie_result is None:
+            ie_result = self._extract(ydl)
+        self.cancel_token.raise_if_cancelled()
+        with self.trace.span("download"):
+            ydl.process_ie_result(ie_result, download=True)
+
+    def extract(self):
+        """Run only the extraction phase, ahead of download().
+
+        The YoutubeDL (and its cookies) is kept for download(). A failure is
+        kept too: download() reports it or moves on to its fallback strategies.
+
+        Raises:
+            DownloadCancelled: If the token was cancelled.
+        """
+        import yt_dlp
+
+        self.cancel_token.raise_if_cancelled()
+        ydl = yt_dlp.YoutubeDL(self.build_ydl_opts())
+        try:
+            self._ie_result = self._extract(ydl)
+        except Exception as e:
+            ydl.close()
+            if self.cancel_token.cancelled:
+                raise DownloadCancelled() from e
+            self._extract_error = e
+            return
+        self._ydl = ydl
+
+    def close(self):
+        """Close a YoutubeDL left open by extract() (for jobs dropped before download)."""
+        ydl, self._ydl = self._ydl, None
+        self._ie_result = None
+        if ydl is not None:
+            ydl.close()
+
+    @property
+    def archive_id(self) -> Optional[Tuple[str, str]]:
+        """(extractor_key, video_id) of the downloaded video, once yt-dlp reported it."""
+        return self._archive_id
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return self._downloaded_bytes
+
+    @property
+    def throttle_error(self) -> Optional[str]:
+        """Bot check / HTTP 429 message seen on the way, even if a later strategy succeeded."""
+        return self._throttle_error
+
+    def acquire_slot(self):
+        """Wait for a download slot for this URL's site (no-op without a limiter)."""
+        if self.limiter is None or self.slot_acquired:
+            return
+        with self.trace.span("queue_wait"):
+            if self.limiter.try_acquire(self.site) > 0:
+                self._emit_progress(0, f"Đang chờ lượt tải cho {self.site}...")
+                self.limiter.acquire(self.site, self.cancel_token)
+        self.slot_acquired = True
+
+    def mark_download_started(self):
+        """Start the clock for the throughput reported on release_slot."""
+        self._download_started = time.monotonic()
+
+    def release_slot(self, success: bool = False, error: Optional[str] = None, nbytes: Optional[int] = None):
+        """Give the site slot back and report the outcome to the limiter (idempotent).
+
+        Args:
+            success: Whether the download finished.
+            error: Error message (throttle errors cut the site's limit).
+            nbytes: Bytes downloaded, when the transfer ran elsewhere (e.g. a pool process).
+        """
+        with self._slot_lock:
+            if not self.slot_acquired:
+                return
+            self.slot_acquired = False
+        elapsed = time.monotonic() - self._download_started if self._download_started else 0.0
+        nbytes = self._downloaded_bytes if nbytes is None else nbytes
+        self.limiter.release(self.site, success, elapsed, nbytes, error)
+
+    def download(self) -> Optional[Path]:
+        """Run yt-dlp with fallback strategies, holding a per-site slot.
+
+        Returns:
+            Absolute path of the downloaded file, or None if yt-dlp did not report one.
+
+        Raises:
+            DownloadCancelled: If the token was cancelled (also while waiting for a slot).
+            InsufficientDiskSpace: If the download would fill the disk.
+            Exception: The last yt-dlp error if every strategy failed.
+        """
+        if self.disk_guard is not None:
+            # Already below the floor: fail before spending time on extraction
+            self.disk_guard.check()
+        self.acquire_slot()
+        self.mark_download_started()
+        success = False
+        error = None
+        try:
+            src = self._download()
+            success = True
+            return src
+        except DownloadCancelled:
+            raise
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.release_slot(success, self._throttle_error or error)
+            self.release_names(success)
+
+    def _download(self) -> Optional[Path]:
+        # Deferred import: yt_dlp pulls in its whole extractor registry
+        import yt_dlp
+
+        ydl_opts = self.build_ydl_opts()
+        self.logger.info(f"Starting download: {self.url} (quality: {self.quality})")
+
+        # Try download with fallback strategies
+        download_success = False
+        last_error = None
+
+        # Strategy 1: Try with current format settings
+        self.cancel_token.raise_if_cancelled()
+        try:
+            if self._extract_error is not None:
+                raise self._extract_error
+            # Reuse the YoutubeDL from a separate extract() stage, if any
+            ydl = self._ydl or yt_dlp.YoutubeDL(ydl_opts)
+            self._ydl = None
+            with ydl:
+                self._ydl_download(ydl)
+            download_success = True
+        except Exception as e:
+            # yt-dlp may wrap the hook exception; the token is authoritative
+            if self.cancel_token.cancelled:
+                raise DownloadCancelled() from e
+            last_error = e
+            self.logger.warning(f"Strategy 1 (web client) failed: {e}")
+            if is_throttle_error(str(e)):
+                # Reported to the limiter even if browser cookies get past it
+                self._throttle_error = str(e)
+
+            # Strategy 2: Try with browser cookies for authentication
+            if ("Sign in" in str(e) or "bot" in str(e).lower() or "age" in str(e).lower()) and not download_success:
+                self.logger.info("Attempting to use browser cookies...")
+                for browser in ["edge", "firefox", "chrome"]:
+                    self.cancel_token.raise_if_cancelled()
+                    try:
+                        cookie_opts = ydl_opts.copy()
+                        cookie_opts["cookiesfrombrowser"] = (browser,)
+                        with yt_dlp.YoutubeDL(cookie_opts) as ydl:
+                            self._ydl_download(ydl)
+                        download_success = True
+                        self.logger.info(f"Success with {browser} cookies!")
+                        break
+                    except Exception as browser_error:
+                        if self.cancel_token.cancelled:
+                            raise DownloadCancelled() from browser_error
+                        self.logger.debug(f"Failed with {browser}: {browser_error}")
+                        continue
+
+        if not download_success:
+            raise last_error or Exception("Download failed with all strategies")
+
+        if self.archive is not None and self._archive_id:
+            self.archive.add(self._archive_id[0], self._archive_id[1], self.quality)
+
+        if not self._last_filename:
+            return None
+        src = Path(self._last_filename)
+        # ensure absolute path
+        if not src.is_absolute():
+            src = Path(self.outdir) / src.name
+        return src
+
+    def replace_with_transcoded(self, tmp: Path, src: Path) -> str:
+        """Atomically replace src with the transcoded tmp file and return the final path."""
+        with self.trace.span("replace"):
+            return self._replace(tmp, src)
+
+    def _replace(self, tmp: Path, src: Path) -> str:
+        try:
+            tmp.replace(src)
+            self.logger.info(f"HEVC to H.264 transcode complete: {src}")
+            return str(src)
+        except Exception:
+            try:
+                # fallback to os.replace
+                os.replace(str(tmp), str(src))
+                self.logger.info(f"HEVC to H.264 transcode complete (via os.replace): {src}")
+                return str(src)
+            except Exception as e:
+                # if replace fails, keep tmp as final
+                self.logger.warning(f"Could not replace original, using temp file: {e}")
+                return str(tmp)
+
+    def cached_transcode(self, src: Path) -> Optional[str]:
+        """Reuse an earlier H.264 output of an identical source, if one exists.
+
+        Returns:
+            Final path if src was replaced by a link to the cached output, else None.
+        """
+        if self.content_index is None:
+            return None
+        with self.trace.span("cache_lookup"):
+            self._source_digest = self.content_index.source_hash(src)
+        if not self._source_digest:
+            return None
+        cached = self.content_index.lookup_transcode(self._source_digest)
+        if cached is None or cached == src:
+            return None
+        if link_duplicate(cached, src):
+            self.logger.info(f"Reusing cached H.264 transcode {cached.name} for {src.name}")
+            TRANSCODES_TOTAL.inc(result="cached")
+            return str(src)
+        return None
+
+    def remember_transcode(self, final_path: str):
+        if self.content_index is not None and self._source_digest:
+            self.content_index.record_transcode(self._source_digest, Path(final_path))
+
+    def transcode(self, src: Path) -> str:
+        """Transcode an HEVC file to H.264 in place; keep the original on failure."""
+        cached = self.cached_transcode(src)
+        if cached:
+            return cached
+        tmp = src.with_suffix('.tmp.mp4')
+        try:
+            self._emit_progress(0, TRANSCODE_STATUS)
+            self.logger.info(f"Transcoding HEVC to H.264: {src.name}")
+
+            ffmpeg_cmd = find_ffmpeg()
+            if not ffmpeg_cmd:
+                # If ffmpeg is not found, log and skip transcode (keep original)
+                self.logger.warning("ffmpeg not found; skipping HEVC transcode and keeping original file.")
+                return str(src)
+
+            self.logger.info(f"FFmpeg found at: {ffmpeg_cmd}")
+            with self.trace.span("transcode"):
+                returncode, _ = self._run_process(transcode_command(ffmpeg_cmd, str(src), str(tmp)), capture=False)
+            if returncode != 0:
+                # ffmpeg failed — keep original
+                self.logger.error(f"FFmpeg HEVC transcode failed with exit code {returncode}")
+                TRANSCODES_TOTAL.inc(result="failed")
+                tmp.unlink(missing_ok=True)
+                return str(src)
+            self.logger.info(f"HEVC transcode successful, replacing original file")
+            TRANSCODES_TOTAL.inc(result="ok")
+            final_path = self.replace_with_transcoded(tmp, src)
+            self.remember_transcode(final_path)
+            return final_path
+        except DownloadCancelled:
+            # Drop the half-written output; the downloaded source stays in place
+            tmp.unlink(missing_ok=True)
+            raise
+        except Exception as e:
+            self.logger.error(f"Unexpected error during HEVC transcode: {e}")
+            return str(src)
+
+    def tag_audio(self, src: Path) -> str:
+        """Write tags (and the thumbnail as cover, where the container allows) in one ffmpeg pass.
+
+        The audio stream is copied, never re-encoded; on any failure the
+        untagged download is kept. The thumbnail is deleted either way.
+        """
+        cover = next((c for c in (src.with_suffix(ext) for ext in THUMBNAIL_EXTENSIONS) if c.exists()), None)
+        try:
+            return self._tag_audio(src, cover)
+        finally:
+            # Fetched only to become the cover: never leave it next to the audio file
+            if cover is not None:
+                try:
+                    cover.unlink(missing_ok=True)
+                except OSError as e:
+                    self.logger.warning(f"Could not remove thumbnail {cover.name}: {e}")
+
+    def _tag_audio(self, src: Path, cover: Optional[Path]) -> str:
+        ffmpeg_cmd = find_ffmpeg()
+        if not ffmpeg_cmd:
+            self.logger.warning("ffmpeg not found; keeping audio file without tags.")
+            return str(src)
+        embed_cover = cover is not None and src.suffix.lower() in COVER_ART_CONTAINERS
+        tmp = src.with_name(f"{src.stem}.tmp{src.suffix}")
+        try:
+            self._emit_progress(100, TAG_STATUS)
+            with self.trace.span("tag"):
+                cmd = audio_tag_command(ffmpeg_cmd, str(src), str(tmp), self._tags,
+                                        str(cover) if embed_cover else None)
+                returncode, output = self._run_process(cmd, capture=True)
+            if returncode != 0:
+                self.logger.error(f"FFmpeg audio tagging failed with exit code {returncode}: "
+                                  f"{output[-300:].decode('utf-8', errors='ignore')}")
+                tmp.unlink(missing_ok=True)
+                return str(src)
+            os.replace(str(tmp), str(src))
+            return str(src)
+        except DownloadCancelled:
+            tmp.unlink(missing_ok=True)
+            raise
+        except Exception as e:
+            self.logger.error(f"Unexpected error while tagging audio: {e}")
+            tmp.unlink(missing_ok=True)
+            return str(src)
+
+    def run(self) -> str:
+        """Download and post-process the URL.
+
+        Returns:
+            Path of the final file (or the output directory if unknown).
+
+        Raises:
+            DownloadCancelled: If the cancel token was triggered.
+            Exception: The last yt-dlp error if every strategy failed.
+        """
+        status = "failed"
+        error = None
+        ACTIVE_JOBS.inc()
+        try:
+            with log_context(self.trace.item_id), self.trace.profile():
+                final_path = self._run_phases()
+            status = "ok"
+            return final_path
+        except DownloadCancelled:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.release_space()
+            ACTIVE_JOBS.dec()
+            self.trace.finish(status, quality=self.quality, error=error, format=self.format_id)
+
+    def _run_phases(self) -> str:
+        src = self.download()
+        self.cancel_token.raise_if_cancelled()
+        if src is None or not src.exists():
+            return str(Path(self.outdir))
+
+        if self.audio_only:
+            final_path = self.tag_audio(src)
+        # Check if we should transcode this video
+        elif self._detect_hevc(str(src)):
+            # Auto-transcode HEVC to H.264 for Windows compatibility
+            final_path = self.transcode(src)
+        else:
+            # Video is not HEVC; no transcode needed
+            self.logger.info(f"Video is not HEVC; keeping original: {src}")
+            final_path = str(src)
+        self.index_output(final_path)
+        return final_path
+
+    def index_output(self, final_path: str):
+        """Hand the finished file to the content index for background dedup."""
+        if self.content_index is not None:
+            self.content_index.add_file(Path(final_path))
+
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local fake media server for Download App benchmarks.
+Serves synthetic progressive MP4, HLS and DASH media with configurable
+latency, bandwidth and failure injection.
+
+Routes (n = item number, any integer):
+    /progressive/<n>.mp4          single file (Range requests supported)
+    /hls/<n>/index.m3u8           media playlist -> /hls/<n>/seg<i>.ts
+    /dash/<n>/manifest.mpd        SegmentTemplate -> /dash/<n>/init.mp4, seg<i>.m4s
+
+Usage:
+    python benchmarks/fake_media_server.py --port 8800 --latency-ms 50 --bandwidth-mbps 100
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+CHUNK = 64 * 1024
+TS_PACKET = 188
+SEGMENT_SECONDS = 4
+
+
+class ServerConfig:
+    """Knobs shared by every request handler."""
+
+    def __init__(self, size_mb: float = 5.0, segments: int = 5, latency_ms: float = 0.0,
+                 bandwidth_mbps: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.size = int(size_mb * 1024 * 1024)
+        self.segments = max(1, segments)
+        self.latency = latency_ms / 1000
+        # Per-connection throttle in bytes/s (0 = unlimited)
+        self.bandwidth = bandwidth_mbps * 1024 * 1024 / 8
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+
+def _payload(size: int, header: bytes = b"") -> bytes:
+    """Deterministic filler of exactly ``size`` bytes, starting with ``header``."""
+    body = header + bytes(range(256)) * (size // 256 + 1)
+    return body[:size]
+
+
+def _mp4_bytes(size: int) -> bytes:
+    # ftyp box so sniffers (and yt-dlp's generic extractor) see an MP4
+    return _payload(size, b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2")
+
+
+def _ts_bytes(size: int) -> bytes:
+    packets = max(1, size // TS_PACKET)
+    packet = b"\x47\x1f\xff\x10" + b"\xff" * (TS_PACKET - 4)  # null packets with sync byte
+    return packet * packets
+
+
+def _hls_playlist(n: int, segments: int) -> str:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}",
+             "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for i in range(segments):
+        lines += [f"#EXTINF:{SEGMENT_SECONDS}.0,", f"seg{i}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def _dash_manifest(n: int, segments: int) -> str:
+    duration = segments * SEGMENT_SECONDS
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011"
+     minBufferTime="PT2S" mediaPresentationDuration="PT{duration}S">
+  <Period id="0" duration="PT{duration}S">
+    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="video-{n}" codecs="avc1.64001f" width="1280" height="720" bandwidth="2000000">
+        <SegmentTemplate timescale="1" duration="{SEGMENT_SECONDS}" startNumber="0"
+                         initialization="init.mp4" media="seg$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    config: ServerConfig  # set on the subclass by FakeMediaServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _route(self) -> Optional[Tuple[bytes, str]]:
+        cfg = self.config
+        segment_size = max(TS_PACKET, cfg.size // cfg.segments)
+        path = self.path.split("?", 1)[0]
+        if re.fullmatch(r"/progressive/\d+\.mp4", path):
+            return _mp4_bytes(cfg.size), "video/mp4"
+        m = re.fullmatch(r"/hls/(\d+)/(index\.m3u8|seg\d+\.ts)", path)
+        if m:
+            if m.group(2) == "index.m3u8":
+                return _hls_playlist(int(m.group(1)), cfg.segments).encode(), "application/vnd.apple.mpegurl"
+            return _ts_bytes(segment_size), "video/mp2t"
+        m = re.fullmatch(r"/dash/(\d+)/(manifest\.mpd|init\.mp4|seg\d+\.m4s)", path)
+        if m:
+            if m.group(2) == "manifest.mpd":
+                return _dash_manifest(int(m.group(1)), cfg.segments).encode(), "application/dash+xml"
+            if m.group(2) == "init.mp4":
+                return _mp4_bytes(1024), "video/mp4"
+            return _payload(segment_size), "video/iso.segment"
+        return None
+
+    def _range(self, length: int) -> Tuple[int, int]:
+        header = self.headers.get("Range", "")
+        m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+        if not m or not (m.group(1) or m.group(2)):
+            return 0, length - 1
+        if not m.group(1):
+            return max(0, length - int(m.group(2))), length - 1
+        return int(m.group(1)), min(length - 1, int(m.group(2)) if m.group(2) else length - 1)
+
+    def _respond(self, send_body: bool):
+        cfg = self.config
+        if cfg.latency:
+            time.sleep(cfg.latency)
+        routed = self._route()
+        if routed is None:
+            self.send_error(404)
+            return
+        if cfg.should_fail():
+            self.send_error(503, "injected failure")
+            return
+        body, content_type = routed
+        start, end = self._range(len(body))
+        partial = "Range" in self.headers
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        self.end_headers()
+        if send_body:
+            self._write_throttled(memoryview(body)[start:end + 1])
+
+    def _write_throttled(self, data: memoryview):
+        cfg = self.config
+        for offset in range(0, len(data), CHUNK):
+            self.wfile.write(data[offset:offset + CHUNK])
+            if cfg.bandwidth:
+                time.sleep(min(CHUNK, len(data) - offset) / cfg.bandwidth)
+
+    def do_GET(self):
+        try:
+            self._respond(send_body=True)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+
+class FakeMediaServer:
+    """ThreadingHTTPServer on localhost running in a background thread."""
+
+    def __init__(self, config: ServerConfig, host: str = "127.0.0.1", port: int = 0):
+        handler = type("ConfiguredFakeMediaHandler", (FakeMediaHandler,), {"config": config})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, kind: str, n: int) -> str:
+        """URL of item ``n`` for kind "progressive", "hls" or "dash"."""
+        if kind == "progressive":
+            return f"{self.base_url}/progressive/{n}.mp4"
+        if kind == "hls":
+            return f"{self.base_url}/hls/{n}/index.m3u8"
+        if kind == "dash":
+            return f"{self.base_url}/dash/{n}/manifest.mpd"
+        raise ValueError(f"unknown media kind: {kind}")
+
+    def start(self) -> "FakeMediaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-media", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--size-mb", type=float, default=5.0, help="Media size per item (MB)")
+    parser.add_argument("--segments", type=int, default=5, help="Segments per HLS/DASH item")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before every response")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="Per-connection throttle (0 = unlimited)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for failure injection")
+
+
+def config_from_args(args) -> ServerConfig:
+    return ServerConfig(args.size_mb, args.segments, args.latency_ms,
+                        args.bandwidth_mbps, args.failure_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic media for benchmarks")
+    parser.add_argument("--port", type=int, default=8800)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = FakeMediaServer(config_from_args(args), port=args.port)
+    print(f"Fake media server on {server.base_url}")
+    print(f"  {server.url('progressive', 1)}\n  {server.url('hls', 1)}\n  {server.url('dash', 1)}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
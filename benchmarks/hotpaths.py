@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks for Download App's pure-Python hot paths.
+Times QueueManager.add_urls/get_stats, SettingsManager.get/set,
+sanitize_filename, OutputNamer.claim, validate_url and is_safe_path at 1k, 100k and 1M
+items, with a regression gate against a stored baseline.
+
+Usage:
+    python benchmarks/hotpaths.py                      # report
+    python benchmarks/hotpaths.py --scales 1000,100000 # smaller run
+    python benchmarks/hotpaths.py --save-baseline      # write benchmarks/baseline_hotpaths.json
+    python benchmarks/hotpaths.py --check              # exit 1 on >25% slowdown vs baseline
+
+Baselines are machine-specific, so none is committed: generate one with
+--save-baseline on the machine (or CI runner) that runs --check, and again
+after changing that machine. --check exits 2 when there is no baseline.
+
+A plain script rather than pytest-benchmark or pyperf: neither is a
+dependency, and the gate needs only best-of-N timings per size plus a
+JSON baseline compare.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.naming import OutputNamer  # noqa: E402
+from app.queue_manager import QueueManager  # noqa: E402
+from app.security import sanitize_filename, validate_url, is_safe_path  # noqa: E402
+from app.settings import SettingsManager  # noqa: E402
+from app.url_filter import prefilter  # noqa: E402
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline_hotpaths.json"
+DEFAULT_SCALES = (1_000, 100_000, 1_000_000)
+# settings.set rewrites settings.json on every call: 1M of them take minutes
+SLOW_CASE_LIMIT = 100_000
+MIN_TIME = 0.5  # seconds measured per case before taking the best run
+MAX_RUNS = 200
+
+# A case takes n and returns the timed callable (setup happens outside the timing)
+Case = Callable[[int], Callable[[], None]]
+
+
+def _urls(n: int) -> List[str]:
+    return [f"https://www.youtube.com/watch?v={i:011d}" for i in range(n)]
+
+
+def _titles(n: int) -> List[str]:
+    base = ['Video: "Part" <1>?', "  .hidden title. ", "CON.mp4", "Bình thường * tiêu đề | 4K", "x" * 300]
+    return [f"{base[i % len(base)]} {i}" for i in range(n)]
+
+
+def case_add_urls(n: int):
+    urls = _urls(n)
+    queue = QueueManager()
+    return lambda: queue.add_urls(urls)
+
+
+def case_get_stats(n: int):
+    queue = QueueManager()
+    queue.add_urls(_urls(n))
+    return queue.get_stats
+
+
+_settings_dir: Optional[tempfile.TemporaryDirectory] = None
+
+
+def _settings() -> SettingsManager:
+    """Fresh settings.json in a temp dir shared by all settings cases."""
+    global _settings_dir
+    if _settings_dir is None:
+        _settings_dir = tempfile.TemporaryDirectory(prefix="bench-settings-")
+    settings = SettingsManager(Path(_settings_dir.name))
+    settings.save(settings._default_settings())
+    return settings
+
+
+def case_settings_get(n: int):
+    settings = _settings()
+
+    def run():
+        for _ in range(n):
+            settings.get("downloads_dir")
+    return run
+
+
+def case_settings_set(n: int):
+    settings = _settings()
+
+    def run():
+        for i in range(n):
+            settings.set("window_x", i)
+    return run
+
+
+def case_sanitize_filename(n: int):
+    titles = _titles(n)
+
+    def run():
+        for title in titles:
+            sanitize_filename(title)
+    return run
+
+
+def case_output_names(n: int):
+    # Few distinct titles: most claims collide and need a " (n)" counter
+    titles = [f"Tập {i % 100} - Bình thường" for i in range(n)]
+    # Every claim appends to the directory's name journal; the directory goes away with the closure
+    directory = tempfile.TemporaryDirectory(prefix="download-app-bench-")
+    namer = OutputNamer(Path(directory.name))
+
+    def run(directory=directory):
+        for title in titles:
+            namer.claim(title)
+    return run
+
+
+def case_validate_url(n: int):
+    urls = _urls(n)
+    urls[::7] = ["not a url"] * len(urls[::7])
+
+    def run():
+        for url in urls:
+            validate_url(url)
+    return run
+
+
+def case_is_safe_path(n: int):
+    base = Path(tempfile.gettempdir())
+    targets = [base / f"file_{i}.mp4" if i % 5 else base / ".." / f"escape_{i}" for i in range(n)]
+
+    def run():
+        for target in targets:
+            is_safe_path(base, target)
+    return run
+
+
+def case_prefilter(n: int):
+    urls = _urls(n)
+    urls[::7] = ["not a url"] * len(urls[::7])
+    return lambda: prefilter(urls)
+
+
+CASES: Dict[str, Case] = {
+    "queue.add_urls": case_add_urls,
+    "queue.get_stats": case_get_stats,
+    "settings.get": case_settings_get,
+    "settings.set": case_settings_set,
+    "security.sanitize_filename": case_sanitize_filename,
+    "naming.claim": case_output_names,
+    "security.validate_url": case_validate_url,
+    "security.is_safe_path": case_is_safe_path,
+    "url_filter.prefilter": case_prefilter,
+}
+SLOW_CASES = {"settings.set"}
+
+
+def measure(case: Case, n: int, repeat: int) -> float:
+    """Best seconds for one run of the case at size n (fresh setup each time).
+
+    Runs at least ``repeat`` times and, for fast cases, keeps going until
+    MIN_TIME seconds were measured so small sizes are not dominated by noise.
+    """
+    best = float("inf")
+    spent = 0.0
+    runs = 0
+    while runs < repeat or (spent < MIN_TIME and runs < MAX_RUNS):
+        run = case(n)
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        spent += elapsed
+        runs += 1
+    return best
+
+
+def run_all(scales, repeat: int, only: Optional[List[str]] = None, include_slow: bool = False) -> Dict[str, dict]:
+    """Return {"<case>@<n>": {"seconds", "ns_per_item"}} for every case and scale."""
+    results = {}
+    for name, case in CASES.items():
+        if only and name not in only:
+            continue
+        for n in scales:
+            if name in SLOW_CASES and n > SLOW_CASE_LIMIT and not include_slow:
+                print(f"[SKIP] {name}@{n}: slow case, add --include-slow to run it", file=sys.stderr)
+                continue
+            # One repeat is enough at 1M; small sizes are noisier
+            seconds = measure(case, n, repeat if n < 1_000_000 else 1)
+            results[f"{name}@{n}"] = {"seconds": round(seconds, 6), "ns_per_item": round(seconds / n * 1e9, 1)}
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Names of results slower than baseline by more than ``threshold`` (0.25 = 25%)."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or not base.get("seconds"):
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{key}: {result['seconds'] * 1000:.2f} ms vs {base['seconds'] * 1000:.2f} ms "
+                               f"baseline ({(ratio - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark Download App hot paths")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="Comma-separated item counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (best is kept)")
+    parser.add_argument("--only", help="Comma-separated case names")
+    parser.add_argument("--include-slow", action="store_true",
+                        help=f"Also run {', '.join(sorted(SLOW_CASES))} above {SLOW_CASE_LIMIT} items")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE_FILE.name}")
+    parser.add_argument("--check", action="store_true", help="Fail if slower than the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown for --check")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    only = [s.strip() for s in args.only.split(",")] if args.only else None
+    results = run_all(scales, args.repeat, only, args.include_slow)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, result in results.items():
+            print(f"{key:40s} {result['seconds'] * 1000:10.2f} ms  {result['ns_per_item']:10.1f} ns/item")
+
+    if args.save_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+
+    if args.check:
+        if not args.baseline.exists():
+            print(f"[ERROR] no baseline at {args.baseline}; nothing to compare against. "
+                  f"Create one on this machine with --save-baseline", file=sys.stderr)
+            sys.exit(2)
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"[REGRESSION] {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Download pipeline benchmark for Download App.
+Drives QueueManager + DownloadWorker against the local fake media server
+(yt-dlp's generic extractor on localhost) and reports items/s, MB/s,
+p50/p99 per-item latency and peak RSS. Needs yt-dlp and PySide6; no network.
+
+Usage:
+    python benchmarks/pipeline.py --items 20 --kind progressive
+    python benchmarks/pipeline.py --kind hls --latency-ms 30 --bandwidth-mbps 200 --concurrency 4
+    python benchmarks/pipeline.py --kind dash --failure-rate 0.05 --json
+    python benchmarks/pipeline.py --items 40 --staged       # app.pipeline stages instead of whole jobs
+    python benchmarks/pipeline.py --items 40 --processes 4  # one job per pool process (app.process_pool)
+"""
+import argparse
+import json
+import math
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_media_server import FakeMediaServer, add_server_arguments, config_from_args  # noqa: E402
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None if unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil  # Windows: optional
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run_staged(queue, outdir: Path, latencies: List[float], processes: int = 0):
+    """Run the queue through PipelineExecutor stages, or a ProcessPoolEngine if processes > 0."""
+    from app.pipeline import PipelineExecutor
+    from app.process_pool import ProcessPoolEngine
+    from app.queue_manager import DownloadState
+    from app.worker import DownloadJob
+
+    executor = ProcessPoolEngine(processes) if processes > 0 else PipelineExecutor()
+    done = threading.Semaphore(0)
+    lock = threading.Lock()
+
+    def on_done(path, error, item, start):
+        with lock:
+            if error is None:
+                item.state = DownloadState.COMPLETED
+                latencies.append(time.perf_counter() - start)
+            else:
+                item.state = DownloadState.FAILED
+                item.error = str(error)
+        done.release()
+
+    for item in queue.items:
+        item.state = DownloadState.DOWNLOADING
+        start = time.perf_counter()
+        executor.submit(DownloadJob(item.url, str(outdir)),
+                        on_done=lambda path, error, item=item, start=start: on_done(path, error, item, start))
+    for _ in queue.items:
+        done.acquire()
+    executor.shutdown()
+
+
+def run_benchmark(server: FakeMediaServer, kind: str, items: int, concurrency: int, outdir: Path,
+                  staged: bool = False, processes: int = 0) -> dict:
+    """Download ``items`` URLs of one kind and return the report dict."""
+    from app.queue_manager import QueueManager, DownloadState
+    from app.qt_worker import DownloadWorker
+
+    queue = QueueManager()
+    queue.add_urls([server.url(kind, n) for n in range(items)])
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def download(item):
+        worker = DownloadWorker(item.url, str(outdir))
+        result = {}
+        # No event loop on this thread: the signal calls the slot directly
+        worker.finished.connect(lambda ok, msg: result.update(ok=ok, msg=msg))
+        item.state = DownloadState.DOWNLOADING
+        start = time.perf_counter()
+        worker.run()
+        elapsed = time.perf_counter() - start
+        with lock:
+            if result.get("ok"):
+                item.state = DownloadState.COMPLETED
+                latencies.append(elapsed)
+            else:
+                item.state = DownloadState.FAILED
+                item.error = result.get("msg")
+
+    start = time.perf_counter()
+    if staged or processes > 0:
+        run_staged(queue, outdir, latencies, processes)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(download, queue.items))
+    wall = time.perf_counter() - start
+
+    total_bytes = sum(f.stat().st_size for f in outdir.iterdir() if f.is_file())
+    stats = queue.get_stats()
+    return {
+        "kind": kind,
+        "items": items,
+        "concurrency": f"{processes} processes" if processes > 0 else "staged" if staged else concurrency,
+        "completed": stats["completed"],
+        "failed": stats["failed"],
+        "wall_s": round(wall, 3),
+        "items_per_s": round(stats["completed"] / wall, 3) if wall else 0.0,
+        "mb_per_s": round(total_bytes / (1024 * 1024) / wall, 3) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+        "errors": sorted({i.error for i in queue.items if i.error})[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the download pipeline offline")
+    parser.add_argument("--kind", choices=["progressive", "hls", "dash"], default="progressive")
+    parser.add_argument("--items", type=int, default=10, help="Number of items to download")
+    parser.add_argument("--concurrency", type=int, default=1, help="Parallel DownloadWorkers")
+    parser.add_argument("--staged", action="store_true", help="Use the staged PipelineExecutor (ignores --concurrency)")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Use a ProcessPoolEngine with N worker processes (ignores --concurrency)")
+    parser.add_argument("--json", action="store_true", help="Print one JSON line (for CI)")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    from app.logger import setup_logging, shutdown_logging
+
+    server = FakeMediaServer(config_from_args(args)).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="download-bench-") as tmp:
+            setup_logging(Path(tmp) / "logs")
+            outdir = Path(tmp) / "downloads"
+            outdir.mkdir()
+            try:
+                report = run_benchmark(server, args.kind, args.items, args.concurrency, outdir, args.staged,
+                                       args.processes)
+            finally:
+                # Close the log file before the temp dir is removed
+                shutdown_logging()
+    finally:
+        server.stop()
+
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"{report['kind']}: {report['completed']}/{report['items']} ok, {report['failed']} failed "
+          f"in {report['wall_s']:.2f} s (concurrency {report['concurrency']})")
+    print(f"  throughput: {report['items_per_s']:.2f} items/s, {report['mb_per_s']:.1f} MB/s")
+    print(f"  latency:    p50 {report['p50_ms']:.0f} ms, p99 {report['p99_ms']:.0f} ms")
+    print(f"  peak RSS:   {report['peak_rss_mb']:.0f} MB")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark for Download App.
+Measures `python -X importtime` for the GUI module and time to first show.
+
+Usage:
+    python benchmarks/startup.py                 # human-readable report
+    python benchmarks/startup.py --json          # one JSON line for CI
+    python benchmarks/startup.py --max-show-ms 1500   # exit 1 if slower
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Child process: build the window, report ms from interpreter start to first paint
+FIRST_SHOW_SNIPPET = r"""
+import time
+t0 = time.perf_counter()
+import sys
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer
+from app.gui import MainWindow
+app = QApplication(sys.argv)
+window = MainWindow()
+window.show()
+def done():
+    print(f"{(time.perf_counter() - t0) * 1000:.1f}")
+    app.quit()
+QTimer.singleShot(0, done)
+app.exec()
+"""
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    # Headless CI has no display
+    if sys.platform.startswith("linux") and not env.get("DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def measure_importtime(module: str = "app.gui", top: int = 15) -> dict:
+    """Run `python -X importtime -c 'import <module>'` and summarize the output.
+
+    Returns:
+        Dict with the total cumulative import time (µs) and the slowest
+        top-level imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=str(ROOT), env=_child_env(),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    # Top-level entries are the ones without leading indentation in the name column
+    top_level = [r for r in rows if not r[2].startswith("  ", 1)]
+    total = sum(r[0] for r in top_level)
+    slowest = sorted(top_level, reverse=True)[:top]
+    return {
+        "import_total_us": total,
+        "slowest_imports": [{"module": n.strip(), "cumulative_us": c} for c, _, n in slowest],
+        "yt_dlp_imported": any(n.strip() == "yt_dlp" for _, _, n in rows),
+    }
+
+
+def measure_first_show(runs: int = 3) -> float:
+    """Best-of-N milliseconds from interpreter start to the window's first event-loop tick."""
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", FIRST_SHOW_SNIPPET],
+            capture_output=True, text=True, cwd=str(ROOT), env=_child_env(),
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "GUI start failed")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Download App startup time")
+    parser.add_argument("--json", action="store_true", help="Print one JSON line (for CI)")
+    parser.add_argument("--runs", type=int, default=3, help="First-show runs (best is reported)")
+    parser.add_argument("--max-show-ms", type=float, help="Fail if time to first show exceeds this")
+    args = parser.parse_args()
+
+    report = measure_importtime()
+    report["first_show_ms"] = measure_first_show(args.runs)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"Import app.gui:   {report['import_total_us'] / 1000:.1f} ms "
+              f"(yt_dlp imported: {report['yt_dlp_imported']})")
+        for row in report["slowest_imports"]:
+            print(f"  {row['cumulative_us'] / 1000:8.1f} ms  {row['module']}")
+        print(f"Time to first show: {report['first_show_ms']:.1f} ms")
+
+    if args.max_show_ms is not None and report["first_show_ms"] > args.max_show_ms:
+        print(f"[ERROR] first show {report['first_show_ms']:.1f} ms > {args.max_show_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ Usage:
     python build.py --macos
     python build.py --linux
 """
+import os
 import sys
 import subprocess
 from pathlib import Path
@@ -17,6 +18,11 @@ import shutil
 import argparse
 
 
+ROOT = Path(__file__).resolve().parent
+SPEC_FILE = ROOT / "download_app.spec"
+ROUTES_DATA = ROOT / "app" / "extractor_routes.json"
+
+
 def check_dependencies():
     """Check if required build tools are installed."""
     try:
@@ -27,6 +33,48 @@ def check_dependencies():
         sys.exit(1)
 
 
+def generate_extractor_routes():
+    """Precompute the host -> extractor routing table bundled with the app.
+
+    Written to app/extractor_routes.json; the app falls back to building
+    it on first run if the file is missing or made for another yt-dlp.
+    """
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    try:
+        from app.extractor_routes import BUNDLED_ROUTES, build_routes, save_routes
+        data = build_routes()
+    except ImportError as e:
+        print(f"  Warning: could not generate extractor routes: {e}")
+        return
+    save_routes(data, BUNDLED_ROUTES)
+    print(f"[OK] Extractor routes: {len(data['routes'])} domains, "
+          f"{len(data['wildcard'])} wildcard extractors (yt-dlp {data['version']})")
+
+
+def pyinstaller_command():
+    """PyInstaller invocation that bundles the extractor routing table next to app/*.py.
+
+    download_app.spec is used when present (PyInstaller ignores --add-data
+    with a spec, so it must list the table in ``datas`` itself); otherwise
+    the app is built from run.py with the data files passed on the command line.
+    """
+    cmd = [sys.executable, "-m", "PyInstaller", "--distpath", "dist", "--workpath", "build"]
+    if SPEC_FILE.exists():
+        if ROUTES_DATA.exists() and ROUTES_DATA.name not in SPEC_FILE.read_text(encoding="utf-8"):
+            print(f"  Warning: {SPEC_FILE.name} does not bundle {ROUTES_DATA.name}; add "
+                  f"('app/{ROUTES_DATA.name}', 'app') to datas or the app rebuilds routes on first run")
+        return cmd + [str(SPEC_FILE)]
+    cmd += ["--name", "DownloadApp", "--windowed", "--noconfirm"]
+    icon = ROOT / "app" / "icon.ico"
+    if sys.platform == "win32" and icon.exists():
+        cmd += ["--icon", str(icon)]
+    for data in (ROUTES_DATA, ROOT / "app" / "icon.png", ROOT / "app" / "icon.ico"):
+        if data.exists():
+            # Lands next to app/extractor_routes.py, where BUNDLED_ROUTES looks for it
+            cmd += ["--add-data", f"{data}{os.pathsep}app"]
+    return cmd + [str(ROOT / "run.py")]
+
+
 def build_windows():
     """Build Windows executable using PyInstaller."""
     print("\n" + "="*60)
@@ -34,12 +82,7 @@ def build_windows():
     print("="*60)
     
     # Run PyInstaller
-    result = subprocess.run([
-        sys.executable, "-m", "PyInstaller",
-        "download_app.spec",
-        "--distpath", "dist",
-        "--workpath", "build",
-    ])
+    result = subprocess.run(pyinstaller_command())
     
     if result.returncode == 0:
         print("\n[OK] Windows build complete!")
@@ -77,12 +120,7 @@ def build_macos():
         return
     
     # Run PyInstaller
-    result = subprocess.run([
-        sys.executable, "-m", "PyInstaller",
-        "download_app.spec",
-        "--distpath", "dist",
-        "--workpath", "build",
-    ])
+    result = subprocess.run(pyinstaller_command())
     
     if result.returncode == 0:
         print("\n[OK] macOS build complete!")
@@ -99,12 +137,7 @@ def build_linux():
     print("="*60)
     
     # Run PyInstaller
-    result = subprocess.run([
-        sys.executable, "-m", "PyInstaller",
-        "download_app.spec",
-        "--distpath", "dist",
-        "--workpath", "build",
-    ])
+    result = subprocess.run(pyinstaller_command())
     
     if result.returncode == 0:
         print("\n[OK] Linux build complete!")
@@ -154,6 +187,8 @@ def main():
         clean()
         return
     
+    generate_extractor_routes()
+
     # Build for current platform if no platform specified
     if not (args.windows or args.macos or args.linux):
         if sys.platform == "win32":
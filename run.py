@@ -1,7 +1,18 @@
-"""Run the GUI app from project root: `python run.py`"""
+"""Run the GUI app from project root: `python run.py`
 
-from app.app import main
+Run the headless HTTP daemon instead: `python run.py --daemon [--port 8765]`
+Drain a shared queue as a headless worker: `python run.py --worker --db queue.db work --outdir downloads`
+"""
+import sys
 
 
 if __name__ == "__main__":
-    main()
+    if "--daemon" in sys.argv[1:]:
+        from app.daemon import main as daemon_main
+        daemon_main([arg for arg in sys.argv[1:] if arg != "--daemon"])
+    elif "--worker" in sys.argv[1:]:
+        from app.queue_store import main as worker_main
+        worker_main([arg for arg in sys.argv[1:] if arg != "--worker"])
+    else:
+        from app.app import main
+        main()
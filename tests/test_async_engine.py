@@ -0,0 +1,40 @@
+"""AsyncDownloadEngine releases a cancelled job's resources only once its thread has stopped."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("PySide6")  # AsyncJobHandle lives in the same module
+
+from app.async_engine import AsyncDownloadEngine  # noqa: E402
+from app.cancellation import DownloadCancelled  # noqa: E402
+from app.worker import DownloadJob  # noqa: E402
+
+
+def test_cancel_waits_for_the_download_thread(monkeypatch, tmp_path):
+    started, stopped = threading.Event(), threading.Event()
+    released = []
+
+    def download(self):
+        started.set()
+        while not self.cancel_token.cancelled:
+            time.sleep(0.01)
+        time.sleep(0.2)  # e.g. yt-dlp finishing its current chunk
+        stopped.set()
+        raise DownloadCancelled()
+
+    monkeypatch.setattr(DownloadJob, "download", download)
+    monkeypatch.setattr(DownloadJob, "release_space", lambda self: released.append(stopped.is_set()))
+
+    async def main():
+        engine = AsyncDownloadEngine()
+        task = asyncio.ensure_future(engine.run_job("https://example.com/v.mp4", str(tmp_path)))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await engine.shutdown()
+
+    asyncio.run(main())
+    assert released == [True]
@@ -0,0 +1,39 @@
+"""DownloadJob.tag_audio never leaves the downloaded thumbnail behind."""
+import pytest
+
+import app.worker as worker
+from app.worker import DownloadJob
+
+
+def _ffmpeg_ok(self, cmd, capture=False):
+    with open(cmd[-1], "wb") as f:
+        f.write(b"tagged")
+    return 0, b""
+
+
+def _ffmpeg_fails(self, cmd, capture=False):
+    return 1, b"Invalid data"
+
+
+def _ffmpeg_crashes(self, cmd, capture=False):
+    raise OSError("ffmpeg vanished")
+
+
+@pytest.mark.parametrize("suffix, ffmpeg, run, content", [
+    (".m4a", "ffmpeg", _ffmpeg_ok, b"tagged"),  # cover embedded
+    (".opus", "ffmpeg", _ffmpeg_ok, b"tagged"),  # container without cover art
+    (".m4a", None, _ffmpeg_ok, b"audio"),  # no ffmpeg
+    (".m4a", "ffmpeg", _ffmpeg_fails, b"audio"),
+    (".mp3", "ffmpeg", _ffmpeg_crashes, b"audio"),
+])
+def test_cover_is_removed_on_every_path(tmp_path, monkeypatch, suffix, ffmpeg, run, content):
+    monkeypatch.setattr(worker, "find_ffmpeg", lambda: ffmpeg)
+    monkeypatch.setattr(DownloadJob, "_run_process", run)
+    src = tmp_path / f"Song{suffix}"
+    src.write_bytes(b"audio")
+    (tmp_path / "Song.webp").write_bytes(b"cover")
+    job = DownloadJob("https://example.com/song", str(tmp_path), "audio")
+
+    assert job.tag_audio(src) == str(src)
+    assert src.read_bytes() == content
+    assert sorted(p.name for p in tmp_path.iterdir()) == [src.name]
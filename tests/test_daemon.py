@@ -0,0 +1,109 @@
+"""Daemon HTTP API: session token, Host/Origin checks, body validation and item ids."""
+import http.client
+import json
+import threading
+
+import pytest
+
+from app.daemon import DownloadDaemon, create_server, write_token
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def server(tmp_path):
+    # The drain thread is never started: queued items just stay pending
+    server = create_server(DownloadDaemon(tmp_path), "127.0.0.1", 0, TOKEN)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, body=None, headers=None, returns_body=False):
+    port = server.server_address[1]
+    sent = {"Host": f"127.0.0.1:{port}", "Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+    sent.update(headers or {})
+    sent = {k: v for k, v in sent.items() if v is not None}
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request(method, path, body=body, headers=sent)
+    response = conn.getresponse()
+    status = response.status
+    payload = response.read()
+    conn.close()
+    if returns_body:
+        return status, json.loads(payload)
+    return status
+
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 200),
+    ({"Host": "localhost:8765"}, 200),
+    ({"Host": "[::1]:8765"}, 200),
+    ({"Origin": "http://localhost:3000"}, 200),
+    ({"Authorization": None}, 401),
+    ({"Authorization": "Bearer wrong"}, 401),
+    ({"Authorization": f"Basic {TOKEN}"}, 401),
+    ({"Host": "evil.example:8765"}, 403),
+    ({"Origin": "https://evil.example"}, 403),
+    ({"Origin": "null"}, 403),
+])
+def test_get_requires_token_and_local_host(server, headers, status):
+    assert request(server, "GET", "/api/queue", headers=headers) == status
+
+
+@pytest.mark.parametrize("body, headers, status", [
+    ({"urls": ["https://example.com/v.mp4"]}, {}, 200),
+    ({"urls": ["https://example.com/v.mp4"], "quality": "720p"}, {}, 200),
+    ({"urls": ["https://example.com/v.mp4"]}, {"Content-Type": "text/plain"}, 415),
+    ({"urls": ["https://example.com/v.mp4"]}, {"Content-Type": None}, 415),
+    ([1], {}, 400),
+    ("urls", {}, 400),
+    ({"urls": "https://example.com/v.mp4"}, {}, 400),
+    ({"urls": [1, None]}, {}, 400),
+    ({"urls": ["https://example.com/v.mp4"], "quality": "4k"}, {}, 400),
+    ({"urls": ["https://example.com/v.mp4"], "expand": "yes"}, {}, 400),
+    ({"urls": ["https://example.com/v.mp4"], "priority": "high"}, {}, 400),
+])
+def test_enqueue_validates_body(server, body, headers, status):
+    assert request(server, "POST", "/api/queue", json.dumps(body), headers) == status
+
+
+def test_priority_rejects_non_object_body(server):
+    assert request(server, "POST", "/api/items/0/priority", "[5]") == 400
+
+
+def test_allow_host_extends_accepted_names(tmp_path):
+    server = create_server(DownloadDaemon(tmp_path), "127.0.0.1", 0, TOKEN, ["nas.local"])
+    try:
+        assert "nas.local" in server.allowed_hosts
+        assert "127.0.0.1" in server.allowed_hosts
+    finally:
+        server.server_close()
+
+
+def test_write_token_is_owner_only(tmp_path):
+    path = tmp_path / "daemon.token"
+    token = write_token(path)
+    assert path.read_text(encoding="utf-8") == token
+    assert path.stat().st_mode & 0o077 == 0
+    assert write_token(path) != token
+
+
+def test_items_are_addressed_by_id_after_a_retry(server):
+    urls = [f"https://example.com/{n}.mp4" for n in range(3)]
+    assert request(server, "POST", "/api/queue", json.dumps({"urls": urls, "expand": False})) == 200
+    _, snapshot = request(server, "GET", "/api/queue", returns_body=True)
+    first = snapshot["items"][0]["id"]
+
+    assert request(server, "POST", f"/api/items/{first}/cancel") == 200
+    assert request(server, "POST", f"/api/items/{first}/retry") == 200
+    _, snapshot = request(server, "GET", "/api/queue", returns_body=True)
+    assert [item["url"] for item in snapshot["items"]] == urls[1:] + urls[:1]
+
+    # The id still names the retried item, not whatever moved into its slot
+    assert request(server, "POST", f"/api/items/{first}/priority", json.dumps({"priority": 5})) == 200
+    _, snapshot = request(server, "GET", "/api/queue", returns_body=True)
+    assert {item["url"]: item["priority"] for item in snapshot["items"]} == {urls[0]: 5, urls[1]: 0, urls[2]: 0}
+    assert request(server, "POST", "/api/items/999/cancel") == 404
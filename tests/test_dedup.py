@@ -0,0 +1,47 @@
+"""Content index: only finished media files are hashed and linked."""
+import pytest
+
+from app.dedup import ContentIndex, is_media_file
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Song.m4a", True),
+    ("Clip.MP4", True),
+    ("Live at 9.30.mkv", True),
+    ("Clip.mp4.part", False),
+    ("Clip.mp4.ytdl", False),
+    ("Clip.mp4.dedup", False),
+    ("Clip.tmp.mp4", False),
+    ("Song.tmp.m4a", False),
+    ("Clip.f137.mp4", False),
+    ("Clip.mp4.claim", False),
+    ("Song.jpg", False),
+    ("Song.webp", False),
+    (".download-app-names", False),
+    (".hidden.mp4", False),
+])
+def test_is_media_file(tmp_path, name, expected):
+    assert is_media_file(tmp_path / name) is expected
+
+
+def test_scan_links_media_but_not_work_files(tmp_path):
+    body = b"x" * 4096
+    for name in ("a.mp4", "b.mp4", "a.tmp.mp4", "b.mp4.part", "a.jpg", "b.jpg", "a.mp4.claim", "b.mp4.claim"):
+        (tmp_path / name).write_bytes(b"" if name.endswith(".claim") else body)
+    index = ContentIndex(tmp_path / "index" / "content_index.json")
+    index.scan(tmp_path)
+    index._executor.shutdown(wait=True)
+
+    assert set(index._files) == {str(tmp_path / "a.mp4"), str(tmp_path / "b.mp4")}
+    assert (tmp_path / "a.mp4").stat().st_ino == (tmp_path / "b.mp4").stat().st_ino
+    for name in ("a.tmp.mp4", "b.mp4.part", "a.jpg", "b.jpg"):
+        assert (tmp_path / name).stat().st_nlink == 1
+
+
+def test_load_forgets_indexed_work_files(tmp_path):
+    index = ContentIndex(tmp_path / "content_index.json")
+    for name in ("a.mp4", "a.jpg", "a.mp4.claim"):
+        (tmp_path / name).write_bytes(b"x")
+        index._entry(tmp_path / name)
+    index.save()
+    assert set(ContentIndex(tmp_path / "content_index.json")._files) == {str(tmp_path / "a.mp4")}
@@ -0,0 +1,83 @@
+"""FormatRanker.choose on yt-dlp style format lists."""
+import pytest
+
+from app.format_select import FormatPreferences, FormatRanker
+
+
+def video(fid, height, vcodec="avc1.640028", ext="mp4", fps=30, tbr=1000, acodec="none"):
+    return {"format_id": fid, "height": height, "vcodec": vcodec, "acodec": acodec,
+            "ext": ext, "fps": fps, "tbr": tbr}
+
+
+def audio(fid, acodec="mp4a.40.2", abr=128, ext="m4a"):
+    return {"format_id": fid, "vcodec": "none", "acodec": acodec, "abr": abr, "ext": ext}
+
+
+YOUTUBE = [
+    video("18", 360, acodec="mp4a.40.2"),
+    video("137", 1080),
+    video("248", 1080, vcodec="vp9", ext="webm"),
+    video("399", 1080, vcodec="av01.0.08M.08"),
+    video("136", 720),
+    video("401", 2160, vcodec="av01.0.12M.08"),
+    video("313", 2160, vcodec="vp9", ext="webm"),
+    audio("140"),
+    audio("251", acodec="opus", abr=160, ext="webm"),
+    {"format_id": "sb0", "vcodec": "none", "acodec": "none", "ext": "mhtml"},
+]
+
+
+@pytest.mark.parametrize("quality, formats, format_id, ext, remux_only", [
+    ("auto", YOUTUBE, "313+140", "mp4", True),  # 4K only in vp9/av1: vp9 wins, aac before opus
+    ("1080p", YOUTUBE, "137+140", "mp4", True),
+    ("720p", YOUTUBE, "136+140", "mp4", True),
+    ("audio", YOUTUBE, "140", "m4a", True),
+    # Progressive wins over a pair of the same height
+    ("720p", [video("22", 720, acodec="mp4a.40.2"), video("136", 720), audio("140")], "22", "mp4", True),
+    # Nothing under the cap: the smallest one above it
+    ("720p", [video("137", 1080), video("271", 1440), audio("140")], "137+140", "mp4", True),
+    # Avoided codecs only as a last resort
+    ("1080p", [video("hevc", 1080, vcodec="hvc1"), video("avc", 480), audio("a")], "avc+a", "mp4", True),
+    ("1080p", [video("hevc", 1080, vcodec="hvc1"), audio("a")], "hevc+a", "mp4", True),
+    # Pairs that cannot go into mp4 are merged into mkv and converted later
+    ("auto", [video("v", 480, vcodec="vp8", ext="webm"), audio("a", acodec="vorbis", ext="webm")],
+     "v+a", "mkv", False),
+    # Audio preset without audio-only streams: the smallest file with sound
+    ("audio", [video("hi", 1080, acodec="aac"), video("lo", 240, acodec="aac"), video("mute", 144)],
+     "lo", "mp4", True),
+    # No video at all
+    ("auto", [audio("a", abr=64), audio("b", abr=128)], "b", "m4a", True),
+])
+def test_choose(quality, formats, format_id, ext, remux_only):
+    decision = FormatRanker(quality).choose(formats)
+    assert (decision.format_id, decision.ext, decision.remux_only) == (format_id, ext, remux_only)
+
+
+@pytest.mark.parametrize("formats", [
+    [],
+    [{"format_id": "sb0", "vcodec": "none", "acodec": "none", "ext": "mhtml"}],
+    [dict(video("137", 1080), has_drm=True)],
+    [{"vcodec": "avc1", "acodec": "mp4a"}],  # no format_id
+])
+def test_choose_nothing_usable(formats):
+    assert FormatRanker().choose(formats) is None
+
+
+def test_audio_bitrate_is_capped():
+    formats = [video("v", 720), audio("enough", abr=192), audio("huge", abr=320), audio("low", abr=64)]
+    assert FormatRanker("720p").choose(formats).audio["format_id"] == "enough"
+
+
+def test_avoid_codecs_preference():
+    formats = [video("hevc", 1080, vcodec="hvc1"), video("avc", 720), audio("a")]
+    assert FormatRanker("1080p").choose(formats).format_id == "avc+a"
+    prefs = FormatPreferences(avoid_codecs=())
+    assert FormatRanker("1080p", prefs).choose(formats).format_id == "hevc+a"
+
+
+def test_pair_info_for_yt_dlp():
+    formats = [dict(video("137", 1080), filesize=1000), dict(audio("140"), filesize=100)]
+    info = FormatRanker("1080p").choose(formats).to_info()
+    assert info["format_id"] == "137+140"
+    assert [f["format_id"] for f in info["requested_formats"]] == ["137", "140"]
+    assert (info["height"], info["filesize_approx"], info["ext"]) == (1080, 1100, "mp4")
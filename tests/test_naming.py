@@ -0,0 +1,172 @@
+"""sanitize_filename and OutputNamer.claim, within one process and across several."""
+import multiprocessing
+import os
+import unicodedata
+
+import pytest
+
+from app.naming import JOURNAL_NAME, STEM_MAX_BYTES, OutputNamer, numbered, stem_of
+from app.security import sanitize_filename
+
+
+@pytest.mark.parametrize("title, expected", [
+    ("Normal title", "Normal title"),
+    ('Video: "Part" <1>?', "Video_ _Part_ _1__"),
+    ("a/b\\c|d*e", "a_b_c_d_e"),
+    ("  .hidden title. ", "hidden title"),
+    ("CON", "_CON"),
+    ("con.tar.gz", "_con.tar.gz"),
+    ("console", "console"),
+    ("...", "download"),
+    ("", "download"),
+    ("tab\there", "tab_here"),
+    (unicodedata.normalize("NFD", "Tiếng Việt"), unicodedata.normalize("NFC", "Tiếng Việt")),
+])
+def test_sanitize_filename(title, expected):
+    assert sanitize_filename(title) == expected
+
+
+@pytest.mark.parametrize("title, limit", [
+    ("x" * 300, 255),
+    ("ệ" * 200, 100),  # 3 bytes each: never split inside a character
+    ("y" * 300 + ".mp4", 50),
+])
+def test_sanitize_filename_fits_in_bytes(title, limit):
+    name = sanitize_filename(title, limit)
+    assert len(name.encode("utf-8")) <= limit
+    name.encode("utf-8").decode("utf-8")
+    if title.endswith(".mp4"):
+        assert name.endswith(".mp4")
+
+
+@pytest.mark.parametrize("filename, stem", [
+    ("Title.mp4", "Title"),
+    ("Title.mp4.part", "Title"),
+    ("Title.mp4.part.ytdl", "Title"),
+    ("Title (2).claim", "Title (2)"),
+    ("no extension", "no extension"),
+])
+def test_stem_of(filename, stem):
+    assert stem_of(filename) == stem
+
+
+def test_numbered_names_fit():
+    assert numbered("Title", 3) == "Title (3)"
+    assert len(numbered("é" * 200, 12345).encode("utf-8")) <= STEM_MAX_BYTES
+
+
+@pytest.mark.parametrize("existing, title, expected", [
+    ([], "Title", "Title"),
+    (["Title.mp4"], "Title", "Title (1)"),
+    (["title.MP4"], "Title", "Title (1)"),  # case-insensitive filesystems
+    (["Title.mp4", "Title (1).webm"], "Title", "Title (2)"),
+    (["Title.mp4.part", "Title.mp4.ytdl"], "Title", "Title"),  # partials do not take a name
+    (["Title.claim"], "Title", "Title"),  # orphaned placeholder of an older version
+    (["Title.claim", "Title.mp4.part"], "Title", "Title (1)"),  # ... kept for the download it guards
+    (["Other.mp4"], 'Bad: "name"?', "Bad_ _name__"),
+    ([], None, "download"),
+])
+def test_claim_against_directory(tmp_path, existing, title, expected):
+    for name in existing:
+        (tmp_path / name).write_bytes(b"")
+    assert OutputNamer(tmp_path).claim(title) == expected
+
+
+def test_claims_are_unique_and_keyed(tmp_path):
+    namer = OutputNamer(tmp_path)
+    stems = [namer.claim("Untitled") for _ in range(50)]
+    assert len(set(stems)) == 50
+    assert stems[:3] == ["Untitled", "Untitled (1)", "Untitled (2)"]
+    first = namer.claim("Same", key="a")
+    assert namer.claim("Same", key="a") == first
+    assert namer.claim("Same", key="b") != first
+    assert sorted(p.name for p in tmp_path.iterdir()) == [JOURNAL_NAME]
+
+
+def test_normalize_is_applied_before_indexing(tmp_path):
+    (tmp_path / "A_B.mp4").write_bytes(b"")
+    namer = OutputNamer(tmp_path, normalize=lambda stem: stem.replace("#", "_"))
+    assert namer.claim("A#B") == "A#B (1)"
+
+
+def test_two_namers_on_one_directory_do_not_collide(tmp_path):
+    # Two processes that both scanned the directory while it was empty
+    first, second = OutputNamer(tmp_path), OutputNamer(tmp_path)
+    assert first.claim("Clip") == "Clip"
+    assert second.claim("Clip") == "Clip (1)"
+
+
+def test_finished_file_from_another_process_is_seen(tmp_path):
+    other, namer = OutputNamer(tmp_path), OutputNamer(tmp_path)
+    stem = other.claim("Clip")
+    (tmp_path / f"{stem}.mp4").write_bytes(b"video")
+    other.release(stem, completed=True)
+    assert namer.claim("Clip") == "Clip (1)"
+    assert OutputNamer(tmp_path).claim("Clip") == "Clip (2)"
+
+
+def test_failed_download_keeps_its_name_for_a_retry(tmp_path):
+    key = ("https://example.com/v", "v1")
+    namer = OutputNamer(tmp_path)
+    stem = namer.claim("Clip", key=str(key))
+    (tmp_path / f"{stem}.mp4.part").write_bytes(b"half")
+    namer.release(stem, str(key), completed=False)
+    assert namer.claim("Clip", key=str(key)) == stem
+
+    # After a restart (or in another worker) the same video resumes; others stay off the name
+    namer.release(stem, str(key), completed=False)
+    restarted = OutputNamer(tmp_path)
+    assert restarted.claim("Clip", key="someone else") == "Clip (1)"
+    assert restarted.claim("Clip", key=str(key)) == stem
+
+
+def test_failed_download_without_files_is_freed_at_the_next_scan(tmp_path):
+    namer = OutputNamer(tmp_path)
+    stem = namer.claim("Clip", key="k")
+    namer.release(stem, "k", completed=False)
+    assert namer.is_taken(stem)
+    restarted = OutputNamer(tmp_path)
+    assert not restarted.is_taken(stem)
+    assert restarted.claim("Clip", key="other") == "Clip"
+
+
+def test_claims_of_a_dead_process_are_freed(tmp_path):
+    journal = tmp_path / JOURNAL_NAME
+    OutputNamer(tmp_path).claim("Clip", key="k")
+    # Same claim, but held by a pid that no longer runs on this host
+    lines = journal.read_text(encoding="utf-8").splitlines()
+    lines[-1] = lines[-1].replace(f":{os.getpid()}", ":999999999")
+    journal.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    assert OutputNamer(tmp_path).claim("Clip", key="other") == "Clip"
+
+
+def test_scan_compacts_the_journal(tmp_path):
+    namer = OutputNamer(tmp_path)
+    for n in range(20):
+        stem = namer.claim("Clip", key=n)
+        (tmp_path / f"{stem}.mp4").write_bytes(b"")
+        namer.release(stem, n)
+    live = namer.claim("Live", key="live")
+    OutputNamer(tmp_path)
+    lines = (tmp_path / JOURNAL_NAME).read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2 and live in lines[1]
+    # The first namer notices the new generation and keeps working
+    assert namer.claim("Clip") == "Clip (20)"
+    assert namer.claim("Live", key="live") == live
+
+
+def _claim_many(directory, count, results):
+    namer = OutputNamer(directory)
+    results.put([namer.claim("Tập 1") for _ in range(count)])
+
+
+def test_processes_never_share_a_name(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_claim_many, args=(tmp_path, 40, results)) for _ in range(3)]
+    for proc in procs:
+        proc.start()
+    stems = [stem for _ in procs for stem in results.get(timeout=60)]
+    for proc in procs:
+        proc.join(30)
+    assert len(stems) == len(set(stems)) == 120
@@ -0,0 +1,33 @@
+"""MetadataPrefetcher.fetch waits for, and returns, the site's download slot."""
+import threading
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from app.prefetch import MetadataCache, MetadataPrefetcher  # noqa: E402
+from app.rate_control import AdaptiveConcurrency, site_key  # noqa: E402
+from benchmarks.fake_media_server import FakeMediaServer, ServerConfig  # noqa: E402
+
+
+def test_fetch_takes_a_site_slot(tmp_path):
+    server = FakeMediaServer(ServerConfig(size_mb=0.5)).start()
+    limiter = AdaptiveConcurrency(initial=1.0, max_limit=1.0)
+    prefetcher = MetadataPrefetcher(MetadataCache(tmp_path), workers=1, limiter=limiter)
+    url = server.url("progressive", 1)
+    site = site_key(url)
+    try:
+        assert limiter.try_acquire(site) == 0.0  # a download holds the only slot
+        done = threading.Event()
+        result = {}
+        fetcher = threading.Thread(target=lambda: (result.update(meta=prefetcher.fetch(url)), done.set()))
+        fetcher.start()
+        assert not done.wait(0.5)
+        limiter.release(site, True)
+        assert done.wait(30)
+        assert result["meta"].error is None
+        assert limiter.try_acquire(site) == 0.0  # the prefetch gave it back
+        assert limiter.limit(site) == 1.0
+    finally:
+        prefetcher.shutdown()
+        server.stop()
@@ -0,0 +1,103 @@
+"""ProcessPoolEngine: recovery from a dead pool process, disk-space admission in the parent."""
+import os
+import queue
+import signal
+import threading
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from app.disk_space import DiskSpaceGuard, InsufficientDiskSpace  # noqa: E402
+from app.process_pool import ProcessPoolEngine  # noqa: E402
+from app.worker import DownloadJob  # noqa: E402
+from benchmarks.fake_media_server import FakeMediaServer, ServerConfig  # noqa: E402
+
+
+@pytest.fixture
+def engine():
+    engine = ProcessPoolEngine(processes=1, queue_size=0)
+    yield engine
+    engine.shutdown()
+
+
+class _RefusingGuard(DiskSpaceGuard):
+    """Admits the parent's pre-submit check, refuses the child's check at download start."""
+
+    def __init__(self, path):
+        super().__init__(path, 0)
+        self.checks = 0
+
+    def check(self, nbytes=0):
+        self.checks += 1
+        if self.checks > 1:
+            raise InsufficientDiskSpace(nbytes, 0, self.path)
+
+
+def _run(engine, url, outdir, on_progress=None, disk_guard=None):
+    done = threading.Event()
+    outcome = {}
+
+    def on_done(path, error):
+        outcome.update(path=path, error=error)
+        done.set()
+
+    engine.submit(DownloadJob(url, str(outdir), on_progress=on_progress, disk_guard=disk_guard), on_done)
+    return done, outcome
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_killed_child_fails_its_job_and_frees_the_pool(engine, tmp_path):
+    slow = FakeMediaServer(ServerConfig(size_mb=20, bandwidth_mbps=8)).start()
+    fast = FakeMediaServer(ServerConfig(size_mb=0.5)).start()
+    try:
+        started = threading.Event()
+        done, outcome = _run(engine, slow.url("progressive", 1), tmp_path,
+                             on_progress=lambda percent, text: started.set())
+        assert started.wait(60)
+        for process in list(engine._pool._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        assert done.wait(30)
+        assert outcome["path"] is None and "died" in str(outcome["error"])
+        assert engine._jobs == {} and engine._cancel_events == {}
+
+        # The slot came back and a fresh pool takes the next job
+        done, outcome = _run(engine, fast.url("progressive", 2), tmp_path)
+        assert done.wait(60)
+        assert outcome["error"] is None and os.path.isfile(outcome["path"])
+    finally:
+        slow.stop()
+        fast.stop()
+
+
+def test_child_disk_checks_run_against_the_parent_guard(engine, tmp_path):
+    server = FakeMediaServer(ServerConfig(size_mb=0.5)).start()
+    try:
+        guard = _RefusingGuard(tmp_path)
+        done, outcome = _run(engine, server.url("progressive", 1), tmp_path, disk_guard=guard)
+        assert done.wait(60)
+        assert isinstance(outcome["error"], InsufficientDiskSpace)
+        assert guard.checks == 2
+    finally:
+        server.stop()
+
+
+def test_reservations_are_held_by_the_parent(engine, tmp_path):
+    guard = DiskSpaceGuard(tmp_path, 0)
+    replies = queue.Queue()
+    engine._jobs[7] = DownloadJob("https://example.com/v.mp4", str(tmp_path), disk_guard=guard)
+    engine._disk_replies[7] = replies
+
+    engine._answer_disk(7, "reserve", 100 * 2**20)
+    assert replies.get_nowait() is None
+    assert engine._reservations[7].outstanding == 100 * 2**20
+    engine._answer_disk(7, "written", 40 * 2**20)
+    assert engine._reservations[7].outstanding == 60 * 2**20
+
+    # Another job's reservation sees what this one still holds
+    engine._jobs[8] = DownloadJob("https://example.com/w.mp4", str(tmp_path), disk_guard=guard)
+    engine._disk_replies[8] = replies
+    engine._answer_disk(8, "reserve", guard.available() + 1)
+    assert isinstance(replies.get_nowait(), InsufficientDiskSpace)
+    assert 8 not in engine._reservations
+    engine._jobs.clear()
@@ -0,0 +1,106 @@
+"""QueueManager dispatch order: priority, shortest job first, aging."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.queue_manager import AGING_RATE, DEFAULT_COST, QueueManager
+
+
+def _drain(queue):
+    order = []
+    while True:
+        item = queue.next()
+        if item is None:
+            return order
+        queue.mark_completed(item)
+        order.append(item.url)
+
+
+def _queue(*specs):
+    """Queue of (url, priority, duration, seconds_ago) items, ages from one clock reading."""
+    queue = QueueManager()
+    now = datetime.now()
+    for url, priority, duration, ago in specs:
+        queue.add_url(url, priority=priority, duration=duration)
+        item = queue.items[-1]
+        item.created_at = now - timedelta(seconds=ago)
+        queue.set_priority(len(queue.items) - 1, priority)  # reschedule with the new age
+    return queue
+
+
+@pytest.mark.parametrize("specs, expected", [
+    # shortest first
+    ([("long", 0, 3000, 0), ("short", 0, 60, 0), ("mid", 0, 600, 0)], ["short", "mid", "long"]),
+    # priority beats cost
+    ([("short", 0, 60, 0), ("urgent", 5, 3000, 0)], ["urgent", "short"]),
+    # unknown duration costs DEFAULT_COST
+    ([("unknown", 0, None, 0), ("shorter", 0, DEFAULT_COST - 1, 0)], ["shorter", "unknown"]),
+    # a long item that waited long enough is not overtaken by newer short ones
+    ([("old-long", 0, 3000, 3000 / AGING_RATE), ("new-short", 0, 60, 0)], ["old-long", "new-short"]),
+    ([("old-long", 0, 3000, 60), ("new-short", 0, 60, 0)], ["new-short", "old-long"]),
+    # equal keys keep insertion order
+    ([("a", 0, 100, 0), ("b", 0, 100, 0)], ["a", "b"]),
+])
+def test_dispatch_order(specs, expected):
+    assert _drain(_queue(*specs)) == expected
+
+
+def test_reprioritize_and_estimate_reschedule():
+    queue = _queue(("a", 0, 100, 0), ("b", 0, 200, 0), ("c", 0, 300, 0))
+    queue.set_priority(2, 1)
+    queue.set_estimate(1, duration=10)
+    assert _drain(queue) == ["c", "b", "a"]
+
+
+def test_removed_and_cancelled_items_are_skipped():
+    queue = _queue(("a", 0, 100, 0), ("b", 0, 200, 0), ("c", 0, 300, 0))
+    queue.cancel_item(0)
+    queue.remove_item(queue.index_of(queue.items[1]))
+    assert _drain(queue) == ["c"]
+    assert queue.has_next() is False
+
+
+def test_requeued_item_keeps_its_age():
+    queue = _queue(("old", 0, 600, 1000), ("new", 0, 100, 0))
+    first = queue.next()
+    assert first.url == "old"
+    queue.mark_failed(first, "boom")
+    queue.requeue_item(queue.index_of(first))
+    queue.add_url("newer", duration=100)
+    assert _drain(queue) == ["old", "new", "newer"]
+
+
+def test_item_ids_survive_requeue_and_removal():
+    queue = _queue(("a", 0, 100, 0), ("b", 0, 200, 0), ("c", 0, 300, 0))
+    a, b, c = queue.items
+    assert [item.id for item in queue.items] == [1, 2, 3]
+    queue.cancel_item(0)
+    queue.requeue_item(0)
+    queue.remove_item(queue.index_of(b))
+    assert [item.url for item in queue.items] == ["c", "a"]
+    assert queue.get_item(a.id) is a and queue.get_item(c.id) is c
+    assert queue.get_item(b.id) is None
+    queue.add_url("d")
+    assert queue.items[-1].id == 4
+    assert queue.items[-1].to_dict()["id"] == 4
+
+
+def test_stale_heap_entries_are_compacted():
+    queue = _queue(*[(f"u{i}", 0, 100 + i, 0) for i in range(100)])
+    for _ in range(5):
+        for index in range(len(queue.items)):
+            queue.set_priority(index, 0)
+    assert len(queue._heap) <= 2 * len(queue.items)
+    assert _drain(queue) == [f"u{i}" for i in range(100)]
+
+
+def test_only_the_owner_reports_queue_depth():
+    from app.metrics import get_metrics
+    from app.queue_manager import QUEUE_ITEMS
+
+    owned = QueueManager()
+    owned.add_urls([f"https://example.com/{n}" for n in range(3)])
+    get_metrics().add_collector(owned.collect_metrics)
+    QueueManager()  # e.g. a benchmark or a second window's scratch queue
+    get_metrics().collect()
+    assert QUEUE_ITEMS.value(state="pending") == 3
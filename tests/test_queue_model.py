@@ -0,0 +1,108 @@
+"""QueueTableModel keeps filtered and state-sorted views in step with the queue."""
+import random
+import time
+
+import pytest
+
+pytest.importorskip("PySide6")
+
+from PySide6.QtCore import Qt  # noqa: E402
+from PySide6.QtGui import QColor, QImage  # noqa: E402
+from PySide6.QtTest import QAbstractItemModelTester  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from app.prefetch import ItemMetadata, MetadataCache, MetadataPrefetcher  # noqa: E402
+from app.queue_manager import DownloadState, QueueManager  # noqa: E402
+from app.queue_model import STATE, STATE_ORDER, TITLE, QueueTableModel  # noqa: E402
+
+STATES = list(DownloadState)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def _expected(queue, state_filter, sort):
+    indexes = [i for i, item in enumerate(queue.items) if state_filter is None or item.state == state_filter]
+    if sort is not None and sort[0] == STATE:
+        indexes.sort(key=lambda i: STATE_ORDER.index(queue.items[i].state))
+        if sort[1] == Qt.DescendingOrder:
+            indexes.reverse()
+    return indexes
+
+
+def _view(model):
+    return [model.queue.index_of(model.item_at(row)) for row in range(model.rowCount())]
+
+
+@pytest.mark.parametrize("state_filter", [None, DownloadState.PENDING, DownloadState.COMPLETED])
+@pytest.mark.parametrize("sort", [None, (STATE, Qt.AscendingOrder), (STATE, Qt.DescendingOrder)])
+def test_state_changes_and_appends_move_single_rows(app, state_filter, sort):
+    rng = random.Random(7)
+    queue = QueueManager()
+    for i in range(300):
+        queue.add_url(f"https://example.com/{i}")
+        queue.items[-1].state = rng.choice(STATES)
+    model = QueueTableModel(queue, refresh_ms=60_000)
+    QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+    model.set_state_filter(state_filter)
+    if sort is not None:
+        model.sort(*sort)
+    resets = []
+    model.modelReset.connect(lambda: resets.append(True))
+
+    for tick in range(30):
+        for item in rng.sample(queue.items, 10):
+            item.state = rng.choice(STATES)
+            model.mark_dirty(item)
+        for i in range(rng.randint(0, 5)):
+            queue.add_url(f"https://example.com/{tick}-{i}")
+            queue.items[-1].state = rng.choice(STATES)
+        model.flush()
+        assert _view(model) == _expected(queue, state_filter, sort)
+    assert not resets
+
+
+def test_snapshot_sort_keeps_rows_on_state_change(app):
+    queue = QueueManager()
+    for title in ("b", "c", "a"):
+        queue.add_url(f"https://example.com/{title}")
+        queue.items[-1].title = title
+    model = QueueTableModel(queue, refresh_ms=60_000)
+    model.sort(TITLE, Qt.AscendingOrder)
+    queue.items[0].state = DownloadState.COMPLETED
+    model.mark_dirty(queue.items[0])
+    model.flush()
+    assert [model.item_at(row).title for row in range(3)] == ["a", "b", "c"]
+
+
+def test_metadata_and_thumbnail_load_off_the_gui_thread(app, tmp_path, monkeypatch):
+    url = "https://example.com/cached"
+    cache = MetadataCache(tmp_path)
+    thumbnail = cache.thumbnail_path(url)
+    image = QImage(16, 9, QImage.Format_RGB32)
+    image.fill(QColor("red"))
+    image.save(str(thumbnail))
+    cache.put(ItemMetadata(url, title="Cached", duration=60, thumbnail=str(thumbnail)))
+
+    cache = MetadataCache(tmp_path)  # fresh process: only the disk level has it
+    disk_reads = []
+    get = cache.get
+    monkeypatch.setattr(cache, "get", lambda u: disk_reads.append(u) or get(u))
+    prefetcher = MetadataPrefetcher(cache, workers=1)
+    monkeypatch.setattr(prefetcher, "fetch", lambda *a: pytest.fail("disk cache hit must not fetch"))
+    queue = QueueManager()
+    queue.add_url(url)
+    model = QueueTableModel(queue, prefetcher, refresh_ms=60_000)
+    index = model.index(0, TITLE)
+
+    model.prefetch(queue.items[0])  # GUI thread: memory lookup only
+    assert disk_reads == [] and queue.items[0].title is None
+    deadline = time.monotonic() + 10
+    while model.data(index, Qt.DecorationRole) is None and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert queue.items[0].title == "Cached"
+    assert model.data(index, Qt.DecorationRole).width() == 16
+    model.shutdown()
@@ -0,0 +1,150 @@
+"""SQLiteQueueStore shared by several worker processes."""
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from app.queue_store import COMPLETED, FAILED, LEASED, PENDING, SQLiteQueueStore
+
+LEASE_SECONDS = 0.5
+ITEMS = 60
+
+
+def _drain(db_path, worker_id, results):
+    """Stub job: claim until drained, "download" by sleeping, report each completion."""
+    store = SQLiteQueueStore(db_path, lease_seconds=LEASE_SECONDS)
+    while True:
+        lease = store.claim(worker_id)
+        if lease is None:
+            # Leases of dead workers may still be running out
+            if store.get_stats()["downloading"] == 0:
+                return
+            time.sleep(LEASE_SECONDS / 5)
+            continue
+        time.sleep(0.005)
+        if store.complete(lease, f"{worker_id}:{lease.item_id}"):
+            results.put((lease.item_id, worker_id))
+
+
+def _claim_and_die(db_path, claimed):
+    """Worker that crashes mid-download, holding its lease."""
+    store = SQLiteQueueStore(db_path, lease_seconds=LEASE_SECONDS)
+    lease = store.claim("doomed")
+    claimed.put(lease.item_id)
+    claimed.close()
+    claimed.join_thread()
+    os._exit(1)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "queue.db"
+
+
+def _urls(count):
+    return [f"https://example.com/watch?v={i}" for i in range(count)]
+
+
+def test_workers_complete_every_item_exactly_once(db_path):
+    store = SQLiteQueueStore(db_path, lease_seconds=LEASE_SECONDS)
+    assert store.add_urls(_urls(ITEMS)) == ITEMS
+
+    ctx = multiprocessing.get_context("spawn")
+    claimed = ctx.Queue()
+    doomed = ctx.Process(target=_claim_and_die, args=(db_path, claimed))
+    doomed.start()
+    doomed.join(30)
+    dead_item = claimed.get(timeout=5)
+    assert store.get_stats()["downloading"] == 1
+
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_drain, args=(db_path, f"w{n}", results)) for n in range(3)]
+    for proc in workers:
+        proc.start()
+    done = [results.get(timeout=60) for _ in range(ITEMS)]
+    for proc in workers:
+        proc.join(30)
+        assert proc.exitcode == 0
+
+    ids = [item_id for item_id, _ in done]
+    assert len(ids) == len(set(ids)) == ITEMS
+    assert store.get_stats()["completed"] == ITEMS
+    rows = {row["id"]: row for row in store.items()}
+    assert all(row["state"] == COMPLETED for row in rows.values())
+    # The crashed worker's lease expired and someone else finished the item
+    assert rows[dead_item]["attempts"] == 2
+    assert not rows[dead_item]["result"].startswith("doomed")
+
+
+def test_complete_is_idempotent_and_stale_lease_is_rejected(db_path):
+    store = SQLiteQueueStore(db_path, lease_seconds=0.05)
+    store.add_url("https://example.com/a")
+    first = store.claim("w1")
+    time.sleep(0.1)
+    second = store.claim("w2")
+    assert second.item_id == first.item_id and second.attempt == 2
+
+    assert not store.heartbeat(first)
+    assert not store.complete(first, "stale")
+    assert store.complete(second, "done")
+    assert store.complete(second, "done")
+    row = store.items()[0]
+    assert (row["state"], row["result"], row["worker_id"]) == (COMPLETED, "done", "w2")
+
+
+def test_expired_lease_past_max_attempts_fails(db_path):
+    store = SQLiteQueueStore(db_path, lease_seconds=0.05, max_attempts=2)
+    store.add_urls(["https://example.com/crashy", "https://example.com/fine"])
+    store.set_priority(1, 10)
+    for _ in range(2):
+        assert store.claim("w").item_id == 1
+        time.sleep(0.1)
+    lease = store.claim("w")
+    assert lease.item_id == 2
+    row = store.items()[0]
+    assert row["state"] == FAILED and "expired" in row["error"]
+    assert store.get_stats()["failed"] == 1
+
+
+@pytest.mark.parametrize("retry, attempts, expected", [
+    (True, 1, PENDING),
+    (True, 3, FAILED),
+    (False, 1, FAILED),
+])
+def test_fail_retries_until_max_attempts(db_path, retry, attempts, expected):
+    store = SQLiteQueueStore(db_path, lease_seconds=0.05, max_attempts=3)
+    store.add_url("https://example.com/a")
+    for _ in range(attempts - 1):
+        store.claim("w")
+        time.sleep(0.1)
+    lease = store.claim("w")
+    assert lease.attempt == attempts
+    assert store.fail(lease, "boom", retry=retry)
+    assert store.items()[0]["state"] == expected
+
+
+def test_release_does_not_spend_an_attempt(db_path):
+    store = SQLiteQueueStore(db_path)
+    store.add_url("https://example.com/a")
+    assert store.release(store.claim("w"))
+    row = store.items()[0]
+    assert (row["state"], row["attempts"]) == (PENDING, 0)
+    assert store.claim("w").attempt == 1
+    assert store.items()[0]["state"] == LEASED
+
+
+def test_clock_skew_does_not_expire_a_live_lease(db_path):
+    worker = SQLiteQueueStore(db_path, lease_seconds=0.3)
+    other = SQLiteQueueStore(db_path, lease_seconds=0.3)
+    worker.add_url("https://example.com/a")
+    lease = worker.claim("slow-clock")
+    for _ in range(4):
+        # A host an hour behind writes expiry times that look long past to everyone else
+        with worker._transaction() as db:
+            db.execute("UPDATE items SET lease_expires = ? WHERE id = ?", (time.time() - 3600 + _, lease.item_id))
+        assert other.claim("w") is None
+        time.sleep(0.1)
+    # Heartbeats stop: the lease runs out on the other store's own clock
+    time.sleep(0.35)
+    assert other.claim("w").item_id == lease.item_id
@@ -0,0 +1,35 @@
+"""SettingsManager: settings.json is parsed again only when it changes."""
+import json
+import os
+
+from app.settings import SettingsManager
+from app.tracing import get_tracer
+
+
+def test_load_returns_copies(tmp_path):
+    settings = SettingsManager(tmp_path)
+    settings.set("pipeline_workers", {"download": 3})
+    settings.load()["pipeline_workers"]["download"] = 99
+    assert settings.get("pipeline_workers") == {"download": 3}
+
+
+def test_external_edits_are_seen(tmp_path):
+    settings = SettingsManager(tmp_path)
+    settings.set("dark_mode", False)
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"dark_mode": True, "language": "en"}), encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert settings.get("dark_mode") is True
+
+
+def test_only_disk_reads_are_traced(tmp_path, monkeypatch):
+    tracer = get_tracer()
+    spans = []
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setattr(tracer, "write", spans.append)
+    settings = SettingsManager(tmp_path)
+    settings.set("language", "en")
+    for _ in range(5):
+        settings.get("language")
+    assert [span["name"] for span in spans] == ["settings.save"]
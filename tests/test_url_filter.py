@@ -0,0 +1,64 @@
+"""UrlPrefilter: validation, normalization, rejection and dedup."""
+import pytest
+
+from app.url_filter import (
+    DUPLICATE, EMPTY, IMAGE, INVALID, TIKTOK_PHOTO, FilteredURL, UrlPrefilter, classify_site, prefilter,
+)
+
+
+@pytest.mark.parametrize("url, normalized, site", [
+    ("https://www.youtube.com/watch?v=abc", "https://www.youtube.com/watch?v=abc", "youtube"),
+    ("  HTTPS://YouTube.com/watch?v=abc  ", "https://www.youtube.com/watch?v=abc", "youtube"),
+    ("https://m.youtube.com:443/watch?v=abc#t=10", "https://www.youtube.com/watch?v=abc", "youtube"),
+    ("https://youtu.be/abc?si=xyz&t=5", "https://www.youtube.com/watch?v=abc&t=5", "youtube"),
+    ("https://www.youtube.com/watch?v=abc&utm_source=x&feature=share",
+     "https://www.youtube.com/watch?v=abc", "youtube"),
+    ("https://user:pw@vimeo.com/123", "https://vimeo.com/123", "vimeo"),
+    ("http://example.com:80/v.mp4", "http://example.com/v.mp4", "generic"),
+    ("https://tiktok.com/@me/video/1?is_from_webapp=1", "https://www.tiktok.com/@me/video/1", "tiktok"),
+    ("https://fb.watch/xyz/", "https://fb.watch/xyz/", "facebook"),
+])
+def test_accepted_urls_are_normalized(url, normalized, site):
+    outcome = UrlPrefilter().check(url)
+    assert isinstance(outcome, FilteredURL)
+    assert (outcome.url, outcome.site, outcome.original) == (normalized, site, url)
+
+
+@pytest.mark.parametrize("url, reason", [
+    ("", EMPTY),
+    ("   ", EMPTY),
+    ("ftp://example.com/v.mp4", INVALID),
+    ("not a url", INVALID),
+    ("https://", INVALID),
+    ("https://:8080/x", INVALID),
+    ("https://example.com/cover.JPG", IMAGE),
+    ("https://cdn.example.com/thumb.webp?w=100", IMAGE),
+    ("https://www.tiktok.com/@me/photo/123", TIKTOK_PHOTO),
+])
+def test_rejected_urls(url, reason):
+    assert UrlPrefilter().check(url) == reason
+
+
+def test_duplicates_after_normalization():
+    prefilter_ = UrlPrefilter(seen={"https://www.youtube.com/watch?v=queued"})
+    assert prefilter_.check("https://youtu.be/queued") == DUPLICATE
+    assert isinstance(prefilter_.check("https://youtu.be/new"), FilteredURL)
+    assert prefilter_.check("https://m.youtube.com/watch?v=new&utm_medium=x") == DUPLICATE
+
+
+def test_filter_reports_positions_and_skips_blank_lines():
+    result = prefilter(["https://vimeo.com/1", "", "bad", "https://vimeo.com/1#x"])
+    assert [item.url for item in result.accepted] == ["https://vimeo.com/1"]
+    assert [(r.line, r.reason) for r in result.rejected] == [(3, INVALID), (4, DUPLICATE)]
+    assert result.reasons() == {INVALID: 1, DUPLICATE: 1}
+
+
+@pytest.mark.parametrize("host, site", [
+    ("www.youtube.com", "youtube"),
+    ("music.youtube.com", "youtube"),
+    ("x.com", "twitter"),
+    ("notyoutube.com", "generic"),
+    ("youtube.com.evil.net", "generic"),
+])
+def test_classify_site(host, site):
+    assert classify_site(host) == site